@@ -6,22 +6,213 @@ from app.repository import UserRepository
 # Inisialisasi LoginManager untuk mengelola sesi pengguna
 login_manager = LoginManager()
 
-def create_app():
+def create_app(config=None):
     """
     Factory Function untuk membuat instance aplikasi Flask.
     Ini memungkinkan konfigurasi dan setup yang fleksibel.
+
+    `config` (opsional) menimpa nilai default di bawah, misalnya untuk
+    load test atau beberapa instance lokal.
     """
     
-    # Membuat instance aplikasi Flask
-    app = Flask(__name__)
+    # Membuat instance aplikasi Flask. INSTANCE_PATH (config/environment)
+    # memisahkan folder instance tiap node saat beberapa node berjalan di
+    # satu mesin.
+    instance_path = (config or {}).get('INSTANCE_PATH') or os.environ.get('INSTANCE_PATH')
+    app = Flask(__name__, instance_path=os.path.abspath(instance_path) if instance_path else None)
     
     # Mengatur secret key untuk keamanan sesi.
     # Di produksi, ini harus berupa nilai acak yang kompleks dan
     # diambil dari environment variable.
     app.config['SECRET_KEY'] = 'kunci-rahasia-yang-sangat-aman-ganti-di-produksi'
+    app.config.update(config or {})
+
+    # Folder 'instance' menyimpan file runtime (jurnal antrean, log audit, dll.)
+    os.makedirs(app.instance_path, exist_ok=True)
+
+    # File database node ini; default database.json di folder proyek
+    app.config.setdefault('DATABASE_FILE', os.environ.get('DATABASE_FILE'))
+    if app.config['DATABASE_FILE']:
+        from .repository import set_database_file
+        set_database_file(app.config['DATABASE_FILE'])
+
+    # Sharding per cabang/area (lihat app/sharding.py). Tanpa tabel routing
+    # semua data berada di satu node seperti biasa.
+    app.config.setdefault('SHARD_ROUTING_FILE', os.environ.get('SHARD_ROUTING_FILE'))
+    app.config.setdefault('SHARD_ID', os.environ.get('SHARD_ID'))
+    app.config.setdefault('SHARD_TOKEN', os.environ.get('SHARD_TOKEN'))
+    app.config.setdefault('SHARD_TIMEOUT', 10)
+    # Cek email ke shard lain saat login/registrasi: timeout pendek per
+    # shard & lama cache email yang ditemukan (detik)
+    app.config.setdefault('SHARD_EMAIL_TIMEOUT', 2)
+    app.config.setdefault('SHARD_EMAIL_CACHE_TTL', 300)
+    app.config.setdefault('SHARD_SYNC_INTERVAL', 300)
+
+    # Konfigurasi antrean pekerjaan latar belakang (lihat app/jobs.py).
+    # JOB_QUEUE_FILE bisa dikosongkan (None) untuk antrean tanpa jurnal.
+    app.config.setdefault('JOB_WORKERS', 2)
+    app.config.setdefault('JOB_MAX_RETRIES', 3)
+    app.config.setdefault('JOB_RETRY_DELAY', 1.0)
+    app.config.setdefault('JOB_QUEUE_FILE', os.path.join(app.instance_path, 'job_queue.jsonl'))
+    app.config.setdefault('AUDIT_LOG_FILE', os.path.join(app.instance_path, 'audit.log'))
+
+    # Kebijakan sanksi: pelanggaran ke-N memicu shadow ban selama X hari.
+    # Sweep pencabutan ban kedaluwarsa berjalan setiap interval (detik).
+    app.config.setdefault('SHADOW_BAN_THRESHOLD', 2)
+    app.config.setdefault('SHADOW_BAN_DAYS', 7)
+    app.config.setdefault('SANCTION_SWEEP_INTERVAL', 3600)
+    # Sinkronisasi indeks sanksi dengan database (sanksi dari worker lain)
+    app.config.setdefault('SANCTION_SYNC_INTERVAL', 60)
+
+    # Pembatas laju login/registrasi: (kapasitas bucket, token per menit).
+    # Gunakan backend 'sqlite' agar bucket dipakai bersama antar-worker
+    # (gunicorn.conf.py memilihnya otomatis jika worker lebih dari satu).
+    app.config.setdefault('RATELIMIT_BACKEND', os.environ.get('RATELIMIT_BACKEND', 'memory'))
+    app.config.setdefault('RATELIMIT_SQLITE_PATH', os.path.join(app.instance_path, 'ratelimit.sqlite3'))
+    app.config.setdefault('LOGIN_IP_RATE', (20, 20))
+    app.config.setdefault('LOGIN_EMAIL_RATE', (5, 5))
+    app.config.setdefault('REGISTER_IP_RATE', (5, 1))
+    app.config.setdefault('LOCKOUT_THRESHOLD', 5)
+    app.config.setdefault('LOCKOUT_BASE_SECONDS', 30)
+    app.config.setdefault('LOCKOUT_MAX_SECONDS', 3600)
+    # Interval (detik) pembersihan bucket & lockout yang sudah kedaluwarsa
+    app.config.setdefault('RATELIMIT_PRUNE_INTERVAL', 3600)
+
+    # Hashing password: 'pbkdf2' (PBKDF2_ITERATIONS) atau 'scrypt' (N, r, p).
+    # Hashing berjalan di pool terbatas; lihat benchmarks/bench_password_hash.py
+    # untuk memilih work factor sesuai kapasitas CPU.
+    app.config.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2')
+    app.config.setdefault('PBKDF2_ITERATIONS', 600000)
+    app.config.setdefault('SCRYPT_COST', (32768, 8, 1))
+    app.config.setdefault('PASSWORD_HASH_WORKERS', os.cpu_count() or 2)
+    app.config.setdefault('PASSWORD_HASH_QUEUE_FACTOR', 4)
+    app.config.setdefault('PASSWORD_HASH_QUEUE_TIMEOUT', 5.0)
+
+    # Ledger poin: tail dilipat ke snapshot setiap N event per pengguna,
+    # dan semua tail dilipat berkala setiap interval (detik).
+    app.config.setdefault('LEDGER_SNAPSHOT_EVERY', 50)
+    app.config.setdefault('LEDGER_SNAPSHOT_INTERVAL', 3600)
+
+    # Feed tugas pengepul (SSE). 'memory' hanya untuk satu worker; 'sqlite'
+    # meneruskan event antar worker gunicorn lewat file SQLite bersama dan
+    # menjaga id event (Last-Event-ID) tetap konsisten. gunicorn.conf.py
+    # memilih 'sqlite' otomatis jika worker lebih dari satu.
+    app.config.setdefault('FEED_BACKEND', os.environ.get('FEED_BACKEND', 'memory'))
+    app.config.setdefault('FEED_SQLITE_PATH', os.path.join(app.instance_path, 'feed.sqlite3'))
+    app.config.setdefault('FEED_POLL_INTERVAL', 0.5)
+    app.config.setdefault('FEED_RETENTION', 3600)
+    app.config.setdefault('FEED_MEMORY_EVENTS', 500)
+    app.config.setdefault('FEED_QUEUE_SIZE', 100)
+    app.config.setdefault('FEED_HEARTBEAT', 15)
+
+    # Kapasitas slot penjemputan: jendela waktu (menit), jumlah pickup per
+    # pengepul per jendela, jam operasional, dan saran slot alternatif.
+    app.config.setdefault('SLOT_WINDOW_MINUTES', 120)
+    app.config.setdefault('SLOT_PICKUPS_PER_COLLECTOR', 4)
+    app.config.setdefault('SLOT_DAY_START', '06:00')
+    app.config.setdefault('SLOT_DAY_END', '18:00')
+    app.config.setdefault('SLOT_SEARCH_DAYS', 7)
+    app.config.setdefault('SLOT_SUGGESTIONS', 3)
+    app.config.setdefault('SLOT_PRUNE_INTERVAL', 86400)
+    # Interval sinkronisasi counter slot & jumlah pengepul dengan database
+    # (menangkap booking, pembatalan, & perubahan pengepul dari worker lain)
+    app.config.setdefault('SLOT_SYNC_INTERVAL', 30)
+
+    # Stok reward: interval sinkronisasi counter memori dengan database
+    # (menangkap penukaran/isi ulang stok dari worker lain)
+    app.config.setdefault('REWARD_SYNC_INTERVAL', 30)
+
+    # Leaderboard: interval penghitungan ulang bulan berjalan dari database
+    # (menangkap setoran yang dikonfirmasi di worker lain)
+    app.config.setdefault('LEADERBOARD_REFRESH_INTERVAL', 60)
+
+    # Arsip bulanan (gzip) untuk pickup selesai & transaksi yang lebih tua
+    # dari ARCHIVE_AFTER_DAYS; dijalankan setiap ARCHIVE_INTERVAL detik.
+    app.config.setdefault('ARCHIVE_DIR', os.path.join(app.instance_path, 'archive'))
+    app.config.setdefault('ARCHIVE_AFTER_DAYS', 180)
+    app.config.setdefault('ARCHIVE_INTERVAL', 86400)
+    app.config.setdefault('ARCHIVE_CACHE_PARTITIONS', 4)
+
+    # Backup online (snapshot hard link + inkremental gzip) setiap interval
+    # detik (0 untuk mematikan); backup penuh setiap BACKUP_FULL_EVERY
+    # inkremental, BACKUP_KEEP_FULL rantai disimpan, laju tulis dibatasi.
+    app.config.setdefault('BACKUP_DIR', os.path.join(app.instance_path, 'backups'))
+    app.config.setdefault('BACKUP_INTERVAL', 900)
+    app.config.setdefault('BACKUP_FULL_EVERY', 24)
+    app.config.setdefault('BACKUP_KEEP_FULL', 7)
+    app.config.setdefault('BACKUP_MAX_BYTES_PER_SEC', 4 * 1024 * 1024)
+
+    # Penghapusan pengguna: 'anonim' (record diganti tombstone, riwayat
+    # tetap utuh) atau 'kaskade' (pickup, transaksi, notifikasi, & arsip
+    # milik pengguna ikut dihapus).
+    app.config.setdefault('USER_DELETE_MODE', 'anonim')
+
+    # Impor pengguna CSV: jumlah baris per penulisan database dan thread
+    # hashing (password impor memakai work factor normal).
+    app.config.setdefault('IMPORT_BATCH_SIZE', 1000)
+    app.config.setdefault('IMPORT_HASH_WORKERS', os.cpu_count() or 2)
+    app.config.setdefault('IMPORT_MAX_BYTES', 16 * 1024 * 1024)
+
+    # Kompresi respons HTML/JSON (brotli jika paket `brotli` terpasang,
+    # selain itu gzip) untuk respons minimal COMPRESS_MIN_SIZE byte
+    app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.config.setdefault('COMPRESS_BROTLI_QUALITY', 5)
+    app.config.setdefault('COMPRESS_MIMETYPES', ('text/html', 'application/json', 'text/css',
+                                                 'text/javascript', 'application/javascript', 'text/csv'))
+
+    # Analitik admin: kolom NumPy yang di-memory-map & rentang query maksimal (hari)
+    app.config.setdefault('ANALYTICS_DIR', os.path.join(app.instance_path, 'analytics'))
+    app.config.setdefault('ANALYTICS_MAX_DAYS', 3660)
+    # Interval (detik) pencatatan transaksi yang terlewat (worker berhenti
+    # setelah commit database, sebelum baris analitik ditambahkan)
+    app.config.setdefault('ANALYTICS_CATCH_UP_INTERVAL', 60)
+
+    # Interval (detik) pengecekan harga jenis sampah yang mulai berlaku
+    app.config.setdefault('PRICE_ROLL_INTERVAL', 3600)
+
+    # Login Google (Flask-Dance) hanya dimuat jika client id diisi
+    app.config.setdefault('GOOGLE_CLIENT_ID', os.environ.get('GOOGLE_CLIENT_ID'))
+    app.config.setdefault('GOOGLE_CLIENT_SECRET', os.environ.get('GOOGLE_CLIENT_SECRET'))
+    app.config.setdefault('GOOGLE_OAUTH_ENABLED', bool(app.config['GOOGLE_CLIENT_ID']))
+
+    # Startup cepat (lihat app/startup.py & gunicorn.conf.py):
+    # - JINJA_BYTECODE_CACHE_DIR: template terkompilasi disimpan di disk dan
+    #   dipakai ulang oleh worker baru (None untuk mematikan).
+    # - STARTUP_PRELOAD: app dimuat di master gunicorn; thread latar belakang
+    #   baru dinyalakan di tiap worker setelah fork.
+    # - STARTUP_WARMUP: kompilasi semua template & warm-up data sebelum fork.
+    app.config.setdefault('JINJA_BYTECODE_CACHE_DIR', os.path.join(app.instance_path, 'jinja_cache'))
+    app.config.setdefault('STARTUP_PRELOAD', os.environ.get('STARTUP_PRELOAD') == '1')
+    app.config.setdefault('STARTUP_WARMUP',
+                          app.config['STARTUP_PRELOAD'] or os.environ.get('STARTUP_WARMUP') == '1')
+
+    # Bytecode cache harus dipasang sebelum jinja_env pertama kali dibuat
+    if app.config['JINJA_BYTECODE_CACHE_DIR']:
+        from jinja2 import FileSystemBytecodeCache
+        os.makedirs(app.config['JINJA_BYTECODE_CACHE_DIR'], exist_ok=True)
+        app.jinja_options = {
+            **app.jinja_options,
+            'bytecode_cache': FileSystemBytecodeCache(app.config['JINJA_BYTECODE_CACHE_DIR']),
+        }
 
     # Inisialisasi LoginManager dengan aplikasi
     login_manager.init_app(app)
+
+    # Inisialisasi pembatas laju login & registrasi
+    from .ratelimit import login_guard
+    login_guard.init_app(app)
+
+    # Inisialisasi pool hashing password
+    from .passwords import password_hasher
+    password_hasher.init_app(app)
+
+    from .user_import import user_importer
+    user_importer.init_app(app)
+
+    # Pub/sub feed tugas pengepul
+    from .feed import task_feed
+    task_feed.init_app(app, start=not app.config['STARTUP_PRELOAD'])
     
     # Menentukan view (route) untuk halaman login.
     # Jika pengguna yang belum login mencoba mengakses halaman yang dilindungi,
@@ -35,14 +226,96 @@ def create_app():
     # Menggunakan 'with app.app_context()' untuk memastikan
     # kita berada dalam konteks aplikasi saat mendaftarkan blueprint.
     with app.app_context():
+        # Mendaftarkan handler pekerjaan latar belakang lalu menyalakan antrean
+        from .tasks import job_queue
+        job_queue.init_app(app, start=not app.config['STARTUP_PRELOAD'])
+        job_queue.every(app.config['RATELIMIT_PRUNE_INTERVAL'], 'prune_rate_limits')
+
+        # Tabel routing shard & replikasi data master dari node pusat
+        from .sharding import shard_router
+        shard_router.init_app(app)
+        if not shard_router.is_master:
+            job_queue.enqueue('sync_master_data', durable=False)
+
+        # Menyiapkan folder arsip bulanan & jadwal pengarsipan
+        from .archive import archive_store
+        archive_store.init_app(app)
+        job_queue.every(app.config['ARCHIVE_INTERVAL'], 'archive_old_records')
+
+        # Jadwal backup online database & arsip
+        from .backup import backup_manager
+        backup_manager.init_app(app)
+
+        # Migrasi transaksi lama ke ledger poin & jadwal snapshot saldo
+        from .ledger import point_ledger
+        point_ledger.init_app(app)
+
+        # Indeks balik pengguna -> record untuk penghapusan pengguna
+        from .integrity import integrity_checker
+        integrity_checker.init_app(app)
+
+        # Memuat kolom analitik (dibangun ulang jika belum ada)
+        from .analytics import analytics_store
+        analytics_store.init_app(app)
+
+        # Menjadwalkan pemberlakuan harga sampah sesuai tanggal berlaku
+        from .pricing import repricing_engine
+        repricing_engine.init_app(app)
+
+        # Membangun indeks sanksi pengguna (shadow ban & verifikasi foto)
+        from .sanctions import sanction_index
+        sanction_index.init_app(app)
+
+        # Membangun daftar riwayat penjemputan & transaksi per pengguna
+        from .history import history_index
+        history_index.init_app(app)
+
+        # Membangun leaderboard per area & bulan dari riwayat setoran
+        from .leaderboard import leaderboard
+        leaderboard.init_app(app)
+
+        # Membangun counter kapasitas slot penjemputan
+        from .slots import slot_planner
+        slot_planner.init_app(app)
+
+        # Memuat stok reward & counter penukaran per pengguna
+        from .inventory import reward_inventory
+        reward_inventory.init_app(app)
+
+        # Membangun indeks pencarian pengguna untuk halaman admin
+        from .search import user_search_index
+        user_search_index.init_app(app)
+
         # Mendaftarkan Blueprint untuk rute otentikasi (login, register, logout)
         from . import auth
         app.register_blueprint(auth.auth_bp, url_prefix='/auth')
+        auth.init_google_oauth(app)
 
         # Mendaftarkan Blueprint untuk rute utama aplikasi
         from . import routes
         app.register_blueprint(routes.main_bp)
 
+        # Endpoint antar-node (laporan lintas shard, replikasi data master)
+        from .sharding import shard_bp
+        app.register_blueprint(shard_bp, url_prefix='/internal/shard')
+
+        # API JSON untuk klien mobile
+        from . import api
+        app.register_blueprint(api.api_bp, url_prefix='/api/v1')
+
+        # Kompresi respons (semua blueprint)
+        from .compression import response_compressor
+        response_compressor.init_app(app)
+
+        # Mendaftarkan perintah CLI (flask reconcile-ledger, dll.)
+        from . import commands
+        commands.init_app(app)
+
+    # Kompilasi template & warm-up data (di master gunicorn sebelum fork)
+    if app.config['STARTUP_WARMUP']:
+        from .startup import warm_up
+        warm_up(app)
+
     return app
 
 @login_manager.user_loader
@@ -0,0 +1,572 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+import numpy as np
+
+try:
+    import fcntl # Kunci antar-worker saat menambah baris
+except ImportError:
+    fcntl = None
+
+# Versi format file; berbeda -> dibangun ulang dari database
+VERSI = 1
+EPOCH = date(1970, 1, 1)
+# Kode tipe transaksi poin di kolom 'tipe'
+TIPE_POIN = ('setor_sampah', 'redeem_reward', 'penyesuaian_harga', 'lainnya')
+# Kode status pickup di kolom 'status'
+STATUS_SELESAI = 1
+STATUS_PELANGGARAN = 2
+# Indeks pengepul untuk baris tanpa pengepul yang diketahui (data lama)
+TANPA_PENGEPUL = -1
+
+# Skema tabel: nama kolom -> dtype
+TABLES = {
+    'poin': {'day': np.int32, 'tipe': np.int8, 'poin_fp': np.int64},
+    'setoran': {'day': np.int32, 'jenis': np.int32, 'berat': np.float64, 'pengepul': np.int32},
+    'pickup': {'day': np.int32, 'pengepul': np.int32, 'status': np.int8},
+}
+KAPASITAS_AWAL = 1024
+# Jumlah baris per blok zone map (min/max hari per blok)
+BLOK = 16384
+
+
+def day_number(tanggal):
+    """'YYYY-MM-DD' -> nomor hari sejak epoch."""
+    return (datetime.strptime(tanggal, '%Y-%m-%d').date() - EPOCH).days
+
+
+def day_string(day):
+    return (EPOCH + timedelta(days=int(day))).strftime('%Y-%m-%d')
+
+
+class ColumnTable:
+    """
+    Satu tabel kolom: setiap kolom adalah file biner terpisah yang
+    di-memory-map dengan np.memmap. Kapasitas file tumbuh dua kali lipat
+    saat penuh; jumlah baris yang valid disimpan di meta.json.
+    """
+    def __init__(self, directory, name, columns):
+        self.directory = directory
+        self.name = name
+        self.columns = columns
+        self.capacity = 0
+        self._maps = {}
+
+    def path(self, column):
+        return os.path.join(self.directory, f"{self.name}.{column}.bin")
+
+    def open(self, capacity):
+        """Memetakan ulang file jika kapasitasnya berubah (misal diperbesar worker lain)."""
+        if capacity == self.capacity and self._maps:
+            return
+        self._maps = {
+            column: np.memmap(self.path(column), dtype=dtype, mode='r+', shape=(capacity,))
+            for column, dtype in self.columns.items()
+        }
+        self.capacity = capacity
+
+    def existing_capacity(self):
+        """Kapasitas file kolom yang sudah ada di disk (0 jika belum lengkap)."""
+        sizes = []
+        for column, dtype in self.columns.items():
+            try:
+                sizes.append(os.path.getsize(self.path(column)) // np.dtype(dtype).itemsize)
+            except FileNotFoundError:
+                return 0
+        return min(sizes)
+
+    def ensure_capacity(self, needed):
+        """Memperbesar file kolom sampai muat `needed` baris. Mengembalikan kapasitas baru."""
+        capacity = max(self.capacity, KAPASITAS_AWAL)
+        while capacity < needed:
+            capacity *= 2
+        if capacity != self.capacity:
+            for column, dtype in self.columns.items():
+                with open(self.path(column), 'ab') as f:
+                    f.truncate(capacity * np.dtype(dtype).itemsize)
+            self._maps = {}
+            self.open(capacity)
+        return capacity
+
+    def write(self, start, values):
+        """Menulis kolom-kolom `values` mulai baris `start`."""
+        count = len(next(iter(values.values())))
+        for column, array in self._maps.items():
+            array[start:start + count] = values[column]
+            array.flush()
+        return count
+
+    def view(self, rows):
+        return {column: array[:rows] for column, array in self._maps.items()}
+
+
+class AnalyticsStore:
+    """
+    Agregat analitik admin dari kolom NumPy yang di-memory-map dari disk:
+    - 'poin'    : satu baris per transaksi ledger (hari, tipe, poin_fp)
+    - 'setoran' : satu baris per item setoran (hari, jenis, berat, pengepul)
+    - 'pickup'  : satu baris per pickup yang ditutup (hari, pengepul, status)
+
+    Baris ditambahkan saat konfirmasi/penukaran/pelanggaran tercatat, dan
+    query rentang tanggal berupa mask + np.bincount (group-by tervektorisasi)
+    tanpa membaca dict transaksi. Penambahan dari beberapa worker
+    diserialkan dengan flock; jumlah baris valid & kamus id (jenis sampah,
+    pengepul) ada di meta.json yang dibaca ulang setiap query.
+    """
+    def __init__(self):
+        self.directory = None
+        self.max_days = 3660
+        self._lock = threading.Lock()
+        self._tables = {}
+        self._zones = {}
+
+    def init_app(self, app):
+        self.directory = app.config['ANALYTICS_DIR']
+        self.max_days = app.config['ANALYTICS_MAX_DAYS']
+        os.makedirs(self.directory, exist_ok=True)
+        self._tables = {name: ColumnTable(self.directory, name, columns) for name, columns in TABLES.items()}
+
+        meta = self._read_meta()
+        if meta is None or meta.get('versi') != VERSI:
+            self.rebuild()
+        else:
+            self.catch_up()
+
+        from app.tasks import job_queue
+        job_queue.every(app.config['ANALYTICS_CATCH_UP_INTERVAL'], 'catch_up_analytics')
+
+    # --- Pembangunan & penambahan baris ---
+
+    def rebuild(self):
+        """Membangun ulang semua kolom dari database utama dan arsip."""
+        from app.repository import DataRepository
+
+        data_repo = DataRepository()
+        transactions = sorted(data_repo.get_all_transactions(include_archive=True), key=lambda t: t.get('seq', 0))
+        pickups = data_repo.get_all_pickups(include_archive=True)
+        waste_types = data_repo.get_all_waste_types()
+
+        with self._writing(reset=True) as meta:
+            rows = self._empty_rows()
+            for pickup in pickups:
+                status = {'selesai': STATUS_SELESAI, 'pelanggaran': STATUS_PELANGGARAN}.get(pickup.get('status'))
+                if status and pickup.get('tanggal'):
+                    rows['pickup'].append((day_number(pickup['tanggal']),
+                                           self._collector_index(meta, pickup.get('pengepul_id')), status))
+            matched = self._match_legacy_pickups(transactions, pickups)
+            for transaction in transactions:
+                pickup = matched.get(transaction['id'])
+                self._transaction_rows(meta, rows, transaction, waste_types, pickup, with_pickup=False)
+            self._append_rows(meta, rows)
+            meta['ledger_seq'] = max((t.get('seq', 0) for t in transactions), default=0)
+            meta['seq_tercatat'] = []
+        return {name: meta['tables'][name]['rows'] for name in TABLES}
+
+    @staticmethod
+    def _match_legacy_pickups(transactions, pickups):
+        """
+        Pasangan transaksi setoran -> pickup. Transaksi baru menyimpan
+        'pickup_id'; transaksi lama dipasangkan ke pickup selesai milik
+        pengguna yang sama dengan tanggal terdekat sebelum (atau pada)
+        tanggal transaksi, atau pickup berikutnya jika tidak ada; masing-
+        masing pickup paling banyak sekali.
+        """
+        by_id = {pickup['id']: pickup for pickup in pickups}
+        used = {t['pickup_id'] for t in transactions if t.get('pickup_id') in by_id}
+        open_pickups = {}
+        for pickup in sorted(pickups, key=lambda p: p.get('tanggal') or ''):
+            if pickup.get('status') == 'selesai' and pickup['id'] not in used:
+                open_pickups.setdefault(pickup['user_id'], []).append(pickup)
+
+        matched = {}
+        for transaction in sorted(transactions, key=lambda t: t.get('tanggal') or ''):
+            if transaction.get('tipe') != 'setor_sampah':
+                continue
+            if transaction.get('pickup_id') in by_id:
+                matched[transaction['id']] = by_id[transaction['pickup_id']]
+                continue
+            candidates = open_pickups.get(transaction['user_id'], [])
+            earlier = [p for p in candidates if (p.get('tanggal') or '') <= (transaction.get('tanggal') or '')]
+            # Pickup bisa dikonfirmasi sebelum tanggal jadwalnya
+            pickup = earlier[-1] if earlier else (candidates[0] if candidates else None)
+            if pickup:
+                candidates.remove(pickup)
+                matched[transaction['id']] = pickup
+        return matched
+
+    def catch_up(self):
+        """
+        Menambahkan transaksi ledger yang belum tercatat: yang masuk saat
+        aplikasi tidak berjalan, atau yang hilang karena worker berhenti di
+        antara commit database dan `record_transaction`. Dijalankan saat
+        start dan berkala (ANALYTICS_CATCH_UP_INTERVAL).
+        """
+        from app.repository import DataRepository
+
+        data_repo = DataRepository()
+        transactions = data_repo.get_all_transactions()
+        meta = self._read_meta() or self._empty_meta()
+        recorded = set(meta.get('seq_tercatat', []))
+        pending = sorted(
+            (t for t in transactions
+             if t.get('seq', 0) > meta.get('ledger_seq', 0) and t['seq'] not in recorded),
+            key=lambda t: t['seq']
+        )
+        # Semua seq <= seq tertinggi di pembacaan ini sudah ter-commit di
+        # database, jadi watermark boleh maju sampai sini setelah pending dicatat
+        until = max((t.get('seq', 0) for t in transactions), default=0)
+        waste_types = data_repo.get_all_waste_types() if pending else []
+        return self._record(pending, waste_types, until=until)
+
+    def record_transaction(self, transaction, pickup=None):
+        """Dipanggil service setelah transaksi ledger tersimpan."""
+        from app.repository import DataRepository
+
+        waste_types = DataRepository().get_all_waste_types() if transaction.get('tipe') == 'setor_sampah' else []
+        self._record([transaction], waste_types, pickup)
+
+    def record_pickup(self, pickup):
+        """Dipanggil saat pickup ditutup tanpa transaksi (pelanggaran)."""
+        if pickup.get('status') != 'pelanggaran' or not pickup.get('tanggal'):
+            return
+        with self._writing() as meta:
+            rows = self._empty_rows()
+            rows['pickup'].append((day_number(pickup['tanggal']),
+                                   self._collector_index(meta, pickup.get('pengepul_id')), STATUS_PELANGGARAN))
+            self._append_rows(meta, rows)
+
+    # --- Query ---
+
+    def summary(self, mulai, sampai):
+        """
+        Agregat harian untuk rentang [mulai, sampai] ('YYYY-MM-DD'):
+        kg per jenis sampah per hari, poin masuk/keluar/penyesuaian per
+        hari, dan produktivitas serta tingkat pelanggaran per pengepul.
+        ValueError jika rentang tidak valid.
+        """
+        started = time.perf_counter()
+        start, end = day_number(mulai), day_number(sampai)
+        if end < start:
+            raise ValueError("Tanggal akhir sebelum tanggal mulai.")
+        if end - start + 1 > self.max_days:
+            raise ValueError(f"Rentang maksimal {self.max_days} hari.")
+        ndays = end - start + 1
+
+        meta, columns = self._snapshot()
+        jenis_ids = meta['jenis']
+        pengepul_ids = meta['pengepul']
+        nj = max(len(jenis_ids), 1)
+        # Slot 0 untuk baris tanpa pengepul, pengepul ke-i di slot i + 1
+        np_ = len(pengepul_ids) + 1
+
+        generation = meta.get('generasi', 0)
+        setoran = self._select('setoran', columns['setoran'], generation, start, end)
+        berat = setoran['berat']
+        kg = np.bincount((setoran['day'] - start) * nj + setoran['jenis'], weights=berat,
+                         minlength=ndays * nj).reshape(ndays, nj)
+        kg_pengepul = np.bincount(setoran['pengepul'] + 1, weights=berat, minlength=np_)
+
+        poin = self._select('poin', columns['poin'], generation, start, end)
+        ntipe = len(TIPE_POIN)
+        poin_hari = np.bincount((poin['day'] - start) * ntipe + poin['tipe'],
+                                weights=poin['poin_fp'], minlength=ndays * ntipe).reshape(ndays, ntipe)
+
+        pickup = self._select('pickup', columns['pickup'], generation, start, end)
+        slot = pickup['pengepul'] + 1
+        status = pickup['status']
+        selesai = np.bincount(slot[status == STATUS_SELESAI], minlength=np_)
+        pelanggaran = np.bincount(slot[status == STATUS_PELANGGARAN], minlength=np_)
+
+        masuk_fp = np.where(poin_hari > 0, poin_hari, 0)
+        keluar_fp = np.where(poin_hari < 0, -poin_hari, 0)
+        collectors = []
+        for i in np.flatnonzero(selesai + pelanggaran + (kg_pengepul > 0)):
+            total = int(selesai[i] + pelanggaran[i])
+            collectors.append({
+                "pengepul_id": pengepul_ids[i - 1] if i else None,
+                "selesai": int(selesai[i]),
+                "pelanggaran": int(pelanggaran[i]),
+                "kg": round(float(kg_pengepul[i]), 3),
+                "tingkat_pelanggaran": round(pelanggaran[i] / total, 4) if total else 0.0,
+            })
+        collectors.sort(key=lambda row: (-row['kg'], -row['selesai']))
+
+        return {
+            "mulai": mulai,
+            "sampai": sampai,
+            "hari": [day_string(start + i) for i in range(ndays)],
+            "jenis_ids": jenis_ids,
+            "kg_per_jenis": [[round(float(v), 3) for v in kg[:, j]] for j in range(len(jenis_ids))],
+            "poin_masuk_fp": [int(v) for v in masuk_fp[:, TIPE_POIN.index('setor_sampah')]],
+            "poin_keluar_fp": [int(v) for v in keluar_fp[:, TIPE_POIN.index('redeem_reward')]],
+            "penyesuaian_fp": [int(v) for v in poin_hari[:, TIPE_POIN.index('penyesuaian_harga')]],
+            "total": {
+                "kg": round(float(kg.sum()), 3),
+                "poin_masuk_fp": int(masuk_fp.sum()),
+                "poin_keluar_fp": int(keluar_fp.sum()),
+                "pickup_selesai": int(selesai.sum()),
+                "pickup_pelanggaran": int(pelanggaran.sum()),
+            },
+            "pengepul": collectors,
+            "durasi_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    def stats(self):
+        meta = self._read_meta() or {}
+        return {name: info['rows'] for name, info in meta.get('tables', {}).items()}
+
+    # --- Internal ---
+
+    def _select(self, name, columns, generation, start, end):
+        """
+        Baris dengan hari di [start, end]. Kolom dibagi per BLOK baris dengan
+        min/max hari tiap blok (zone map): blok di luar rentang dilewati,
+        blok yang seluruhnya di dalam rentang diambil tanpa mask. Baris
+        ditambahkan kurang lebih berurutan waktu, sehingga query satu tahun
+        hanya menyentuh blok-blok tahun itu.
+        """
+        day = columns['day']
+        mins, maxs = self._zone_map(name, generation, day)
+        pieces = []
+        for b in np.flatnonzero((mins <= end) & (maxs >= start)):
+            lo, hi = b * BLOK, min((b + 1) * BLOK, len(day))
+            if mins[b] >= start and maxs[b] <= end:
+                if pieces and isinstance(pieces[-1], slice) and pieces[-1].stop == lo:
+                    pieces[-1] = slice(pieces[-1].start, hi)
+                else:
+                    pieces.append(slice(lo, hi))
+            else:
+                block = day[lo:hi]
+                pieces.append(lo + np.flatnonzero((block >= start) & (block <= end)))
+        if len(pieces) == 1:
+            return {column: values[pieces[0]] for column, values in columns.items()}
+        return {
+            column: np.concatenate([values[piece] for piece in pieces]) if pieces else values[:0]
+            for column, values in columns.items()
+        }
+
+    def _zone_map(self, name, generation, day):
+        """min/max hari per blok; blok penuh di-cache karena baris hanya ditambah."""
+        full = len(day) // BLOK
+        with self._lock:
+            cached = self._zones.get(name)
+        if cached and cached[0] == generation and len(cached[1]) <= full:
+            mins, maxs = cached[1], cached[2]
+        else:
+            mins, maxs = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+        if len(mins) < full:
+            blocks = day[len(mins) * BLOK:full * BLOK].reshape(-1, BLOK)
+            mins = np.concatenate([mins, blocks.min(axis=1)])
+            maxs = np.concatenate([maxs, blocks.max(axis=1)])
+            with self._lock:
+                self._zones[name] = (generation, mins, maxs)
+        if len(day) > full * BLOK:
+            tail = day[full * BLOK:]
+            mins = np.append(mins, tail.min())
+            maxs = np.append(maxs, tail.max())
+        return mins, maxs
+
+    def _meta_path(self):
+        return os.path.join(self.directory, 'meta.json')
+
+    def _read_meta(self):
+        try:
+            with open(self._meta_path(), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError, TypeError):
+            return None
+
+    def _write_meta(self, meta):
+        tmp_path = f"{self._meta_path()}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path())
+
+    @staticmethod
+    def _empty_meta():
+        return {
+            "versi": VERSI,
+            "generasi": 0,
+            "ledger_seq": 0,
+            "seq_tercatat": [],
+            "jenis": [],
+            "pengepul": [],
+            "tables": {name: {"rows": 0, "capacity": 0} for name in TABLES},
+        }
+
+    @contextmanager
+    def _writing(self, reset=False):
+        """Satu siklus penambahan baris di bawah kunci thread + flock."""
+        with self._lock:
+            lock_fd = open(os.path.join(self.directory, '.lock'), 'a') if fcntl else None
+            try:
+                if lock_fd:
+                    fcntl.flock(lock_fd, fcntl.LOCK_EX)
+                meta = self._read_meta()
+                if reset or meta is None:
+                    # File kolom tidak dipotong (worker lain mungkin masih
+                    # memetakannya); cukup jumlah barisnya yang dinolkan.
+                    # 'generasi' naik agar cache zone map dibuang.
+                    generation = (meta or {}).get('generasi', 0) + 1
+                    meta = self._empty_meta()
+                    meta['generasi'] = generation
+                    for name, table in self._tables.items():
+                        meta['tables'][name]['capacity'] = table.existing_capacity()
+                yield meta
+                self._write_meta(meta)
+            finally:
+                if lock_fd:
+                    fcntl.flock(lock_fd, fcntl.LOCK_UN)
+                    lock_fd.close()
+
+    def _snapshot(self):
+        """meta terbaru + view kolom sebanyak baris yang valid."""
+        meta = self._read_meta() or self._empty_meta()
+        columns = {}
+        with self._lock:
+            for name, table in self._tables.items():
+                info = meta['tables'][name]
+                if info['capacity']:
+                    table.open(info['capacity'])
+                    columns[name] = {column: np.asarray(values) for column, values in table.view(info['rows']).items()}
+                else:
+                    columns[name] = {column: np.zeros(0, dtype=dtype) for column, dtype in table.columns.items()}
+        return meta, columns
+
+    def _record(self, transactions, waste_types, pickup=None, until=0):
+        """
+        Menambahkan baris transaksi yang seq-nya belum tercatat. Penyaringan
+        dilakukan di bawah kunci terhadap meta terbaru, sehingga dua worker
+        yang mengejar ketinggalan bersamaan tidak menambahkan transaksi yang
+        sama dua kali. meta menyimpan 'ledger_seq' (semua seq <= nilai ini
+        sudah tercatat) dan 'seq_tercatat' (seq di atasnya yang sudah
+        tercatat); celah di antaranya diisi `catch_up`.
+        """
+        with self._writing() as meta:
+            recorded = set(meta.setdefault('seq_tercatat', []))
+            rows = self._empty_rows()
+            added = 0
+            for transaction in transactions:
+                seq = transaction.get('seq', 0)
+                if seq and (seq <= meta['ledger_seq'] or seq in recorded):
+                    continue
+                self._transaction_rows(meta, rows, transaction, waste_types, pickup)
+                recorded.add(seq)
+                added += 1
+            self._append_rows(meta, rows)
+            watermark = max(meta['ledger_seq'], until)
+            while watermark + 1 in recorded:
+                watermark += 1
+            meta['ledger_seq'] = watermark
+            meta['seq_tercatat'] = sorted(seq for seq in recorded if seq > watermark)
+        return added
+
+    @staticmethod
+    def _empty_rows():
+        return {name: [] for name in TABLES}
+
+    def _transaction_rows(self, meta, rows, transaction, waste_types, pickup=None, with_pickup=True):
+        from app.pricing import parse_legacy_items
+
+        if not transaction.get('tanggal'):
+            return
+        day = day_number(transaction['tanggal'])
+        tipe = transaction.get('tipe')
+        code = TIPE_POIN.index(tipe) if tipe in TIPE_POIN else TIPE_POIN.index('lainnya')
+        rows['poin'].append((day, code, transaction.get('jumlah_poin_fp', 0)))
+        if tipe != 'setor_sampah':
+            return
+
+        collector_id = transaction.get('pengepul_id') or (pickup or {}).get('pengepul_id')
+        collector = self._collector_index(meta, collector_id)
+        items = transaction.get('rincian')
+        if items is None:
+            items = parse_legacy_items(transaction.get('deskripsi'), {wt['nama']: wt['id'] for wt in waste_types})
+        for item in items:
+            rows['setoran'].append((day, self._type_index(meta, item['waste_type_id']), item['berat'], collector))
+        if with_pickup:
+            rows['pickup'].append((day, collector, STATUS_SELESAI))
+
+    @staticmethod
+    def _type_index(meta, waste_type_id):
+        if waste_type_id not in meta['jenis']:
+            meta['jenis'].append(waste_type_id)
+        return meta['jenis'].index(waste_type_id)
+
+    @staticmethod
+    def _collector_index(meta, collector_id):
+        if not collector_id:
+            return TANPA_PENGEPUL
+        if collector_id not in meta['pengepul']:
+            meta['pengepul'].append(collector_id)
+        return meta['pengepul'].index(collector_id)
+
+    def _append_rows(self, meta, rows):
+        for name, records in rows.items():
+            if not records:
+                continue
+            info = meta['tables'][name]
+            table = self._tables[name]
+            if info['capacity']:
+                table.open(info['capacity'])
+            info['capacity'] = table.ensure_capacity(info['rows'] + len(records))
+            values = {
+                column: np.array([record[i] for record in records], dtype=dtype)
+                for i, (column, dtype) in enumerate(table.columns.items())
+            }
+            info['rows'] += table.write(info['rows'], values)
+
+
+def merge_summaries(parts):
+    """
+    Menggabungkan hasil `summary()` beberapa shard untuk rentang tanggal
+    yang sama: kg per jenis disejajarkan menurut id jenis, deret poin dan
+    total dijumlahkan, dan baris pengepul dengan id sama dijumlahkan.
+    """
+    parts = list(parts)
+    merged = {key: parts[0][key] for key in ('mulai', 'sampai', 'hari')}
+    ndays = len(merged['hari'])
+
+    kg = {}
+    for part in parts:
+        for jenis_id, series in zip(part['jenis_ids'], part['kg_per_jenis']):
+            total = kg.setdefault(jenis_id, [0.0] * ndays)
+            for i, value in enumerate(series):
+                total[i] = round(total[i] + value, 3)
+    merged['jenis_ids'] = list(kg)
+    merged['kg_per_jenis'] = list(kg.values())
+
+    for key in ('poin_masuk_fp', 'poin_keluar_fp', 'penyesuaian_fp'):
+        merged[key] = [sum(values) for values in zip(*(part[key] for part in parts))]
+    merged['total'] = {
+        key: sum(part['total'][key] for part in parts) for key in parts[0]['total']
+    }
+    merged['total']['kg'] = round(merged['total']['kg'], 3)
+
+    collectors = {}
+    for part in parts:
+        for row in part['pengepul']:
+            current = collectors.get(row['pengepul_id'])
+            if current is None:
+                collectors[row['pengepul_id']] = dict(row)
+                continue
+            # Nama hanya diketahui shard tempat akun pengepul disimpan
+            if 'nama' in row:
+                current.setdefault('nama', row['nama'])
+            for key in ('selesai', 'pelanggaran'):
+                current[key] += row[key]
+            current['kg'] = round(current['kg'] + row['kg'], 3)
+    for row in collectors.values():
+        total = row['selesai'] + row['pelanggaran']
+        row['tingkat_pelanggaran'] = round(row['pelanggaran'] / total, 4) if total else 0.0
+    merged['pengepul'] = sorted(collectors.values(), key=lambda row: (-row['kg'], -row['selesai']))
+    # Shard dihitung paralel; durasi total mengikuti shard paling lambat
+    merged['durasi_ms'] = max(part['durasi_ms'] for part in parts)
+    return merged
+
+
+# Instance tunggal yang dipakai service & dasbor admin
+analytics_store = AnalyticsStore()
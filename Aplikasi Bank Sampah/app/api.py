@@ -0,0 +1,143 @@
+import math
+from functools import wraps
+from flask import Blueprint, request, jsonify
+from flask_login import current_user
+from app.services import PenggunaService, PengepulService
+
+# Blueprint API JSON untuk klien mobile (didaftarkan di /api/v1)
+api_bp = Blueprint('api', __name__)
+
+user_service = PenggunaService()
+collector_service = PengepulService()
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Field yang boleh diminta lewat ?fields=... (default: semuanya). Field
+# internal seperti seq, jumlah_poin_fp, atau password tidak pernah dikirim.
+FIELDS = {
+    "pickups": ('id', 'tanggal', 'waktu', 'lokasi', 'status', 'pengepul_id', 'notes'),
+    "transactions": ('id', 'tanggal', 'tipe', 'deskripsi', 'jumlah_poin', 'rincian'),
+    "rewards": ('id', 'nama', 'deskripsi', 'poin_dibutuhkan', 'ketersediaan'),
+    "tasks": ('id', 'user_id', 'tanggal', 'waktu', 'lokasi', 'status', 'pengepul_id', 'notes', 'photo_path'),
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@api_bp.errorhandler(ApiError)
+def handle_api_error(error):
+    return jsonify({"error": error.message}), error.status
+
+
+@api_bp.after_request
+def add_etag(response):
+    """
+    ETag (weak) dari isi JSON: klien yang mengirim If-None-Match dengan
+    ETag yang sama mendapat 304 tanpa body. Kompresi dilakukan sesudahnya
+    oleh app/compression.py.
+    """
+    if request.method == 'GET' and response.status_code == 200 and response.is_json:
+        response.add_etag(weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.make_conditional(request)
+    return response
+
+
+def api_role_required(role_name):
+    """Seperti auth.role_required, tetapi membalas JSON 401/403 alih-alih redirect."""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not current_user.is_authenticated:
+                raise ApiError("Silakan login terlebih dahulu.", 401)
+            if not current_user.is_role(role_name):
+                raise ApiError(f"Akses ditolak. Endpoint ini khusus untuk {role_name}.", 403)
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+def select_fields(resource, items):
+    """Sparse fieldset: ?fields=id,tanggal,status hanya mengirim field itu."""
+    allowed = FIELDS[resource]
+    requested = request.args.get('fields')
+    if requested:
+        fields = [name.strip() for name in requested.split(',') if name.strip()]
+        unknown = [name for name in fields if name not in allowed]
+        if unknown:
+            raise ApiError(f"Field tidak dikenal: {', '.join(unknown)}. Pilihan: {', '.join(allowed)}.")
+    else:
+        fields = allowed
+    return [{name: item[name] for name in fields if name in item} for item in items]
+
+
+def page_args():
+    limit = min(max(request.args.get('limit', DEFAULT_LIMIT, type=int), 1), MAX_LIMIT)
+    page = max(request.args.get('page', 1, type=int), 1)
+    return page, limit
+
+
+def paginate(resource, items):
+    """Pagination halaman (?page=&limit=) untuk daftar yang kecil & sudah terurut."""
+    page, limit = page_args()
+    total = len(items)
+    pages = max(1, math.ceil(total / limit))
+    start = (page - 1) * limit
+    return jsonify({
+        "data": select_fields(resource, items[start:start + limit]),
+        "meta": {"page": page, "pages": pages, "limit": limit, "total": total},
+    })
+
+
+def history(resource, jenis):
+    """Riwayat dengan keyset pagination (?cursor=&limit=) dari indeks riwayat."""
+    _, limit = page_args()
+    result, error = user_service.get_user_history(current_user.id, jenis, request.args.get('cursor'), limit)
+    if error:
+        raise ApiError(error)
+    return jsonify({
+        "data": select_fields(resource, result['items']),
+        "meta": {"limit": limit, "next_cursor": result['next_cursor']},
+    })
+
+
+# --- Pengguna ---
+
+@api_bp.route('/balance')
+@api_role_required('pengguna')
+def balance():
+    return jsonify({"data": {"user_id": current_user.id, "saldo": user_service.get_user_balance(current_user.id)}})
+
+
+@api_bp.route('/pickups')
+@api_role_required('pengguna')
+def pickups():
+    return history('pickups', 'pickups')
+
+
+@api_bp.route('/transactions')
+@api_role_required('pengguna')
+def transactions():
+    return history('transactions', 'transaksi')
+
+
+@api_bp.route('/rewards')
+@api_role_required('pengguna')
+def rewards():
+    catalog = user_service.get_rewards_catalog(current_user.id)
+    catalog.sort(key=lambda reward: (reward.get('poin_dibutuhkan', 0), reward['id']))
+    return paginate('rewards', catalog)
+
+
+# --- Pengepul ---
+
+@api_bp.route('/tasks')
+@api_role_required('pengepul')
+def tasks():
+    return paginate('tasks', collector_service.get_collector_tasks(current_user.id))
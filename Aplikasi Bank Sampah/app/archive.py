@@ -0,0 +1,227 @@
+import gzip
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# Jenis data yang diarsipkan, masing-masing dipartisi per bulan
+KINDS = ('pickups', 'transactions')
+# Pickup yang sudah ditutup dan boleh dipindahkan ke arsip
+CLOSED_STATUSES = ('selesai', 'pelanggaran')
+# Partisi untuk record tanpa tanggal
+BULAN_KOSONG = '0000-00'
+
+
+def month_of(record):
+    """'2025-10-18' -> '2025-10'."""
+    tanggal = record.get('tanggal') or ''
+    return tanggal[:7] if len(tanggal) >= 7 else BULAN_KOSONG
+
+
+class ArchiveStore:
+    """
+    Arsip pickup dan transaksi lama dalam file gzip per bulan
+    (misal `transactions-2025-10.json.gz`) ditambah satu `index.json` kecil
+    berisi ringkasan tiap partisi: jumlah record, rentang tanggal, dan
+    jumlah record per pengguna. Dengan indeks itu pencarian riwayat satu
+    pengguna hanya membuka partisi yang memang berisi datanya.
+
+    Penulisan terjadi dari repository di bawah kunci database, sehingga
+    antar worker tidak ada dua penulis pada saat yang sama. Partisi yang
+    sudah dibaca disimpan di cache LRU kecil (dikunci dengan mtime file).
+    """
+    def __init__(self):
+        self.directory = None
+        self.cache_size = 4
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+
+    def init_app(self, app):
+        self.directory = app.config['ARCHIVE_DIR']
+        self.cache_size = app.config['ARCHIVE_CACHE_PARTITIONS']
+        os.makedirs(self.directory, exist_ok=True)
+
+    # --- Penulisan ---
+
+    def write(self, kind, records):
+        """
+        Menambahkan record ke partisi bulanannya. Record yang sudah ada
+        (id sama) ditimpa, sehingga pengarsipan ulang setelah gagal di
+        tengah jalan tetap aman. Mengembalikan jumlah record yang ditulis.
+        """
+        if not records or not self.directory:
+            return 0
+        by_month = {}
+        for record in records:
+            by_month.setdefault(month_of(record), []).append(record)
+
+        index = self.read_index()
+        for month, month_records in by_month.items():
+            partition = dict(self.load_partition(kind, month))
+            for record in month_records:
+                partition[record['id']] = record
+            self._write_json(self._path(kind, month), partition, compress=True)
+            index[kind][month] = self._summarize(partition)
+        self._write_json(self._index_path(), index)
+        return len(records)
+
+    def remove_user(self, user_id):
+        """
+        Menghapus record milik `user_id` dari arsip dan mengosongkan
+        `pengepul_id` pada pickup yang ia tangani. Hanya partisi yang menurut
+        indeks berisi pengguna itu yang ditulis ulang (partisi lama tanpa
+        ringkasan 'pengepul' diperiksa semuanya). Mengembalikan jumlah
+        record yang dihapus.
+        """
+        if not self.directory:
+            return 0
+        index = self.read_index()
+        removed = 0
+        for kind in KINDS:
+            for month, info in list(index[kind].items()):
+                owns = user_id in info.get('pengguna', {})
+                handles = kind == 'pickups' and ('pengepul' not in info or user_id in info['pengepul'])
+                if not owns and not handles:
+                    continue
+                partition = dict(self.load_partition(kind, month))
+                changed = False
+                for record_id, record in list(partition.items()):
+                    if record.get('user_id') == user_id:
+                        del partition[record_id]
+                        removed += 1
+                        changed = True
+                    elif record.get('pengepul_id') == user_id:
+                        partition[record_id] = dict(record, pengepul_id=None)
+                        changed = True
+                if not changed:
+                    continue
+                if partition:
+                    self._write_json(self._path(kind, month), partition, compress=True)
+                    index[kind][month] = self._summarize(partition)
+                else:
+                    os.remove(self._path(kind, month))
+                    del index[kind][month]
+        self._write_json(self._index_path(), index)
+        return removed
+
+    # --- Pembacaan ---
+
+    def read_index(self):
+        try:
+            with open(self._index_path(), 'r') as f:
+                index = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError, TypeError):
+            index = {}
+        for kind in KINDS:
+            index.setdefault(kind, {})
+        return index
+
+    def months(self, kind, user_id=None):
+        """Bulan-bulan yang punya arsip (terbaru lebih dulu), opsional per pengguna."""
+        partitions = self.read_index()[kind]
+        return sorted(
+            (month for month, info in partitions.items()
+             if user_id is None or user_id in info.get('pengguna', {})),
+            reverse=True
+        )
+
+    def load_partition(self, kind, month):
+        """Isi satu partisi sebagai dict {id: record}; kosong jika belum ada."""
+        path = self._path(kind, month)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except (FileNotFoundError, TypeError):
+            return {}
+        key = (kind, month)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] == mtime:
+                self._cache.move_to_end(key)
+                return cached[1]
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            partition = json.load(f)
+        with self._lock:
+            self._cache[key] = (mtime, partition)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return partition
+
+    def iter_records(self, kind, user_id=None):
+        """Semua record arsip, partisi terlama lebih dulu."""
+        for month in reversed(self.months(kind, user_id)):
+            for record in self.load_partition(kind, month).values():
+                if user_id is None or record.get('user_id') == user_id:
+                    # Salinan agar pemanggil tidak mengubah isi cache partisi
+                    yield dict(record)
+
+    def find(self, kind, ids, user_id=None):
+        """
+        Mencari record arsip berdasarkan id. Jika `user_id` diberikan, hanya
+        partisi yang berisi pengguna itu yang dibuka (terbaru lebih dulu,
+        sesuai urutan halaman riwayat).
+        """
+        wanted = set(ids)
+        found = {}
+        for month in self.months(kind, user_id):
+            if not wanted:
+                break
+            partition = self.load_partition(kind, month)
+            for record_id in list(wanted):
+                if record_id in partition:
+                    found[record_id] = dict(partition[record_id])
+                    wanted.discard(record_id)
+        return found
+
+    def stats(self):
+        index = self.read_index()
+        return {
+            kind: {
+                "partisi": len(index[kind]),
+                "record": sum(info.get('jumlah', 0) for info in index[kind].values()),
+            }
+            for kind in KINDS
+        }
+
+    # --- Internal ---
+
+    def _path(self, kind, month):
+        if not self.directory:
+            return None
+        return os.path.join(self.directory, f"{kind}-{month}.json.gz")
+
+    def _index_path(self):
+        return os.path.join(self.directory, 'index.json') if self.directory else None
+
+    @staticmethod
+    def _summarize(partition):
+        dates = [record.get('tanggal') or '' for record in partition.values()]
+        per_user = {}
+        per_collector = {}
+        for record in partition.values():
+            per_user[record['user_id']] = per_user.get(record['user_id'], 0) + 1
+            if record.get('pengepul_id'):
+                per_collector[record['pengepul_id']] = per_collector.get(record['pengepul_id'], 0) + 1
+        return {
+            "jumlah": len(partition),
+            "tanggal_awal": min(dates) if dates else '',
+            "tanggal_akhir": max(dates) if dates else '',
+            "pengguna": per_user,
+            "pengepul": per_collector,
+        }
+
+    @staticmethod
+    def _write_json(path, payload, compress=False):
+        # Sama seperti database.json: tulis ke file sementara lalu ganti atomik
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        if compress:
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                json.dump(payload, f, separators=(',', ':'))
+        else:
+            with open(tmp_path, 'w') as f:
+                json.dump(payload, f, indent=2)
+        os.replace(tmp_path, path)
+
+
+# Instance tunggal yang dipakai repository
+archive_store = ArchiveStore()
@@ -0,0 +1,22 @@
+# Area dipakai untuk mengelompokkan pengguna dan pengepul (leaderboard,
+# tugas pengepul, dsb.). Pengepul memakai 'area_tugas'; pengguna memakai
+# bagian terakhir alamat, misal "Jl. Merdeka No. 12, Depok" -> "Depok".
+AREA_LAINNYA = 'Lainnya'
+
+
+def normalize_area(value):
+    """Menyeragamkan penulisan nama area ("  depok " -> "Depok")."""
+    value = ' '.join((value or '').split())
+    return value.title() if value else AREA_LAINNYA
+
+
+def area_of(user):
+    """Area seorang pengguna atau pengepul."""
+    if not user:
+        return AREA_LAINNYA
+    if user.get('area_tugas'):
+        return normalize_area(user['area_tugas'])
+    alamat = user.get('alamat') or ''
+    if ',' not in alamat:
+        return AREA_LAINNYA
+    return normalize_area(alamat.rsplit(',', 1)[-1])
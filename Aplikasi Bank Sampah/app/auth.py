@@ -1,14 +1,9 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from functools import wraps
 
-# --- Tambahan untuk Google OAuth (Flask-Dance) ---
-from flask_dance.contrib.google import make_google_blueprint, google
-from requests.exceptions import ConnectionError, HTTPError
-import os
-# --- Akhir Tambahan ---
-
 from app.services import AuthService
+from app.ratelimit import login_guard
 
 auth_bp = Blueprint('auth', __name__)
 auth_service = AuthService()
@@ -17,19 +12,33 @@ auth_service = AuthService()
 # 1. KONFIGURASI GOOGLE OAUTH
 # ====================================================================
 
-# PENTING: Ganti nilai-nilai ini dengan environment variables yang sebenarnya 
-# di aplikasi produksi Anda.
-GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_CLIENT_ID", "YOUR_CLIENT_ID_HERE")
-GOOGLE_CLIENT_SECRET = os.environ.get("GOOGLE_CLIENT_SECRET", "YOUR_CLIENT_SECRET_HERE")
+def init_google_oauth(app):
+    """
+    Mendaftarkan blueprint Google OAuth (Flask-Dance) jika diaktifkan
+    lewat GOOGLE_OAUTH_ENABLED. Flask-Dance dan `requests` baru diimpor di
+    sini, sehingga worker yang tidak memakai login Google tidak membayar
+    biaya impornya saat start.
+    """
+    if not app.config['GOOGLE_OAUTH_ENABLED']:
+        return
+    from flask_dance.contrib.google import make_google_blueprint
+
+    google_bp = make_google_blueprint(
+        client_id=app.config['GOOGLE_CLIENT_ID'],
+        client_secret=app.config['GOOGLE_CLIENT_SECRET'],
+        scope=["profile", "email"],
+        # Endpoint ini akan dipanggil setelah pertukaran token sukses oleh Flask-Dance
+        redirect_to="auth.google_authorized_handler"
+    )
+    app.register_blueprint(google_bp, url_prefix='/login')
+
 
-# Buat Google Blueprint
-google_bp = make_google_blueprint(
-    client_id=GOOGLE_CLIENT_ID, 
-    client_secret=GOOGLE_CLIENT_SECRET,
-    scope=["profile", "email"],
-    # Endpoint ini akan dipanggil setelah pertukaran token sukses oleh Flask-Dance
-    redirect_to="auth.google_authorized_handler" 
-)
+def _google_session():
+    """Sesi OAuth Google untuk request ini, atau None jika belum diaktifkan."""
+    if 'google' not in current_app.blueprints:
+        return None
+    from flask_dance.contrib.google import google
+    return google
 
 # ====================================================================
 # 2. DEFINISI KELAS DAN DECORATOR
@@ -90,8 +99,14 @@ def login():
     if request.method == 'POST':
         email = request.form.get('email')
         password = request.form.get('password')
+
+        # Cek batas laju & lockout sebelum menyentuh repository
+        allowed, retry_after = login_guard.check_login(request.remote_addr, email)
+        if not allowed:
+            flash(f"Terlalu banyak percobaan login. Coba lagi dalam {int(retry_after) + 1} detik.", 'danger')
+            return render_template('login.html', title="Login"), 429
         
-        user_data, message = auth_service.authenticate_user(email, password)
+        user_data, message = auth_service.authenticate_user(email, password, ip=request.remote_addr)
         
         if user_data:
             user_obj = User(user_data)
@@ -112,6 +127,11 @@ def register():
         return redirect(url_for('main.dashboard'))
 
     if request.method == 'POST':
+        allowed, retry_after = login_guard.check_register(request.remote_addr)
+        if not allowed:
+            flash(f"Terlalu banyak permintaan registrasi. Coba lagi dalam {int(retry_after) + 1} detik.", 'danger')
+            return render_template('register.html', title="Register"), 429
+
         nama = request.form.get('nama')
         email = request.form.get('email')
         password = request.form.get('password')
@@ -156,6 +176,11 @@ def google_login():
     if current_user.is_authenticated:
         return redirect(url_for('main.dashboard'))
 
+    google = _google_session()
+    if google is None:
+        flash("Login dengan Google belum diaktifkan.", 'warning')
+        return redirect(url_for('auth.login'))
+
     # Jika pengguna belum terotorisasi, Flask-Dance akan mengarahkan
     # mereka ke halaman login Google.
     if not google.authorized:
@@ -174,7 +199,8 @@ def google_authorized_handler():
     Ini adalah fungsi yang didefinisikan di parameter `redirect_to` pada `make_google_blueprint`.
     """
     # Cek apakah Flask-Dance berhasil mendapatkan token dari Google
-    if not google.authorized:
+    google = _google_session()
+    if google is None or not google.authorized:
         flash("Gagal masuk dengan Google. Pastikan akses diberikan.", 'danger')
         return redirect(url_for("auth.login"))
 
@@ -228,7 +254,8 @@ def google_authorized_handler():
         
         return redirect(url_for("main.dashboard"))
 
-    except (ConnectionError, HTTPError, Exception) as e:
+    except Exception as e:
+        # Termasuk ConnectionError/HTTPError dari `requests` (tidak diimpor di awal)
         flash(f"Terjadi kesalahan saat otentikasi Google: {e}", 'danger')
         return redirect(url_for("auth.login"))
         
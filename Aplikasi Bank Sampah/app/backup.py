@@ -0,0 +1,350 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl # Kunci antar-worker agar hanya satu proses yang membuat backup
+except ImportError:
+    fcntl = None
+
+JENIS_PENUH = 'penuh'
+JENIS_INKREMENTAL = 'inkremental'
+# Ukuran potongan saat menyalin/mengompresi (throttling dihitung per potongan)
+CHUNK_SIZE = 256 * 1024
+
+
+def checksum(data):
+    """Sidik isi database yang tidak bergantung pada urutan key."""
+    return hashlib.sha256(json.dumps(data, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def diff(old, new):
+    """
+    Perubahan dari `old` ke `new`. Key tingkat atas berisi dict (users,
+    pickups, transactions, ...) dibandingkan per record; nilai lain
+    disimpan utuh jika berubah.
+    """
+    changes = {"koleksi": {}, "ubah": {}, "hapus": [key for key in old if key not in new]}
+    for key, value in new.items():
+        before = old.get(key)
+        if isinstance(value, dict) and isinstance(before, dict):
+            upserts = {k: v for k, v in value.items() if k not in before or before[k] != v}
+            removed = [k for k in before if k not in value]
+            if upserts or removed:
+                changes['koleksi'][key] = {"ubah": upserts, "hapus": removed}
+        elif key not in old or before != value:
+            changes['ubah'][key] = value
+    return changes
+
+
+def apply_diff(data, changes):
+    """Menerapkan hasil `diff` ke `data` (diubah di tempat)."""
+    for key, collection in changes['koleksi'].items():
+        target = data.setdefault(key, {})
+        target.update(collection['ubah'])
+        for record_id in collection['hapus']:
+            target.pop(record_id, None)
+    data.update(changes['ubah'])
+    for key in changes['hapus']:
+        data.pop(key, None)
+    return data
+
+
+class _ThrottledFile:
+    """Pembungkus file tulis yang membatasi laju byte per detik."""
+    def __init__(self, raw, throttle):
+        self.raw = raw
+        self.throttle = throttle
+
+    def write(self, data):
+        written = self.raw.write(data)
+        self.throttle(len(data))
+        return written
+
+    def flush(self):
+        self.raw.flush()
+
+
+class BackupManager:
+    """
+    Backup online database utama dan arsip bulanan tanpa menghentikan
+    request.
+
+    - Snapshot: hard link ke file database & arsip saat ini, dibuat di
+      bawah kunci database (lihat DataRepository.snapshot_files). Karena
+      penulisan selalu mengganti file secara atomik, snapshot tidak pernah
+      setengah tertulis dan kunci hanya dipegang beberapa milidetik.
+    - Backup penuh menyimpan database terkompresi; backup inkremental hanya
+      menyimpan record yang berubah/terhapus sejak backup sebelumnya, plus
+      partisi arsip yang berubah. Setiap BACKUP_FULL_EVERY inkremental
+      dibuat backup penuh baru.
+    - Penulisan berjalan di antrean latar belakang dan dibatasi
+      BACKUP_MAX_BYTES_PER_SEC agar tidak berebut I/O dengan request.
+    - Restore memutar backup penuh terakhir lalu inkremental berikutnya
+      sampai waktu yang dipilih, dan memverifikasi checksum hasilnya.
+    """
+    def __init__(self):
+        self.directory = None
+        self.full_every = 24
+        self.keep_full = 7
+        self.max_bytes_per_sec = 4 * 1024 * 1024
+        self._lock = threading.Lock()
+        self._window = None
+
+    def init_app(self, app):
+        from app.tasks import job_queue
+
+        self.directory = app.config['BACKUP_DIR']
+        self.full_every = app.config['BACKUP_FULL_EVERY']
+        self.keep_full = app.config['BACKUP_KEEP_FULL']
+        self.max_bytes_per_sec = app.config['BACKUP_MAX_BYTES_PER_SEC']
+        os.makedirs(self.directory, exist_ok=True)
+        if app.config['BACKUP_INTERVAL']:
+            job_queue.every(app.config['BACKUP_INTERVAL'], 'backup_database')
+
+    # --- Backup ---
+
+    def backup(self, full=False, min_interval=0):
+        """
+        Membuat satu backup. Mengembalikan entri manifest, atau None jika
+        proses lain sedang membuat backup atau backup terakhir lebih muda
+        dari `min_interval` detik (jadwal yang sama berjalan di tiap worker).
+        """
+        from app.repository import DataRepository
+
+        with self._exclusive() as acquired:
+            if not acquired:
+                return None
+            manifest = self.read_manifest()
+            entries = manifest['backups']
+            now = datetime.now()
+            if entries and min_interval and \
+                    (now - datetime.fromisoformat(entries[-1]['waktu'])).total_seconds() < min_interval:
+                return None
+
+            backup_id = now.strftime('%Y%m%dT%H%M%S%f')
+            staging = os.path.join(self.directory, f".snapshot-{backup_id}")
+            target = os.path.join(self.directory, backup_id)
+            try:
+                DataRepository().snapshot_files(staging)
+                entry = self._write_backup(staging, target, backup_id, now, entries, full)
+                entries.append(entry)
+                self._prune(manifest)
+                self._write_manifest(manifest)
+            except Exception:
+                shutil.rmtree(target, ignore_errors=True)
+                raise
+            else:
+                # Snapshot ini menjadi basis inkremental berikutnya
+                os.replace(os.path.join(staging, 'database.json'), self._basis_path())
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+            return entry
+
+    def _write_backup(self, staging, target, backup_id, now, entries, full):
+        self._window = (time.monotonic(), 0)
+        db_path = os.path.join(staging, 'database.json')
+        basis_path = self._basis_path()
+        with open(db_path, 'r') as f:
+            data = json.load(f)
+
+        since_full = 0
+        for entry in reversed(entries):
+            if entry['jenis'] == JENIS_PENUH:
+                break
+            since_full += 1
+        incremental = (not full and entries and os.path.exists(basis_path)
+                       and since_full < self.full_every)
+
+        os.makedirs(os.path.join(target, 'archive'))
+        if incremental:
+            with open(basis_path, 'r') as f:
+                previous = json.load(f)
+            payload = json.dumps(diff(previous, data), separators=(',', ':')).encode()
+            self._compress_bytes(payload, os.path.join(target, 'perubahan.json.gz'))
+        else:
+            with open(db_path, 'rb') as source:
+                self._compress_stream(source, os.path.join(target, 'database.json.gz'))
+
+        # Partisi arsip: salin yang baru/berubah sejak backup sebelumnya
+        previous_files = entries[-1]['arsip'] if incremental else {}
+        files = {}
+        archive_dir = os.path.join(staging, 'archive')
+        for name in sorted(os.listdir(archive_dir)):
+            stat = os.stat(os.path.join(archive_dir, name))
+            files[name] = [stat.st_size, stat.st_mtime_ns]
+            if previous_files.get(name) != files[name]:
+                with open(os.path.join(archive_dir, name), 'rb') as source, \
+                        open(os.path.join(target, 'archive', name), 'wb') as raw:
+                    self._copy(source, _ThrottledFile(raw, self._throttle))
+
+        return {
+            "id": backup_id,
+            "waktu": now.isoformat(timespec='seconds'),
+            "jenis": JENIS_INKREMENTAL if incremental else JENIS_PENUH,
+            "checksum": checksum(data),
+            "arsip": files,
+            "ukuran": self._size(target),
+        }
+
+    # --- Restore ---
+
+    def restore(self, waktu):
+        """
+        Mengembalikan database & arsip ke backup terakhir pada atau sebelum
+        `waktu` (datetime). Mengembalikan (entri backup, pesan error).
+        """
+        with self._exclusive() as acquired:
+            if not acquired:
+                return None, "Backup sedang berjalan, coba lagi sebentar lagi."
+            return self._restore(waktu)
+
+    def _restore(self, waktu):
+        from app.repository import DataRepository
+
+        entries = [e for e in self.read_manifest()['backups']
+                   if datetime.fromisoformat(e['waktu']) <= waktu]
+        if not entries:
+            return None, f"Tidak ada backup pada atau sebelum {waktu.isoformat(sep=' ', timespec='seconds')}."
+        chain = []
+        for entry in reversed(entries):
+            chain.insert(0, entry)
+            if entry['jenis'] == JENIS_PENUH:
+                break
+        if chain[0]['jenis'] != JENIS_PENUH:
+            return None, "Backup penuh untuk rantai ini tidak ditemukan."
+
+        data = None
+        sources = {}
+        for entry in chain:
+            folder = os.path.join(self.directory, entry['id'])
+            if entry['jenis'] == JENIS_PENUH:
+                with gzip.open(os.path.join(folder, 'database.json.gz'), 'rt', encoding='utf-8') as f:
+                    data = json.load(f)
+            else:
+                with gzip.open(os.path.join(folder, 'perubahan.json.gz'), 'rt', encoding='utf-8') as f:
+                    apply_diff(data, json.load(f))
+            for name in os.listdir(os.path.join(folder, 'archive')):
+                sources[name] = os.path.join(folder, 'archive', name)
+
+        target = chain[-1]
+        if checksum(data) != target['checksum']:
+            return None, f"Checksum hasil restore tidak cocok dengan backup {target['id']}."
+
+        staging = os.path.join(self.directory, f".restore-{target['id']}")
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        try:
+            # Hanya partisi yang ada saat backup target dibuat
+            for name in target['arsip']:
+                shutil.copy2(sources[name], os.path.join(staging, name))
+            DataRepository().restore_snapshot(data, staging)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return target, None
+
+    # --- Manifest ---
+
+    def read_manifest(self):
+        try:
+            with open(self._manifest_path(), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError, TypeError):
+            return {"backups": []}
+
+    def stats(self):
+        entries = self.read_manifest()['backups']
+        return {
+            "jumlah": len(entries),
+            "penuh": sum(1 for e in entries if e['jenis'] == JENIS_PENUH),
+            "terakhir": entries[-1]['waktu'] if entries else None,
+            "ukuran": sum(e.get('ukuran', 0) for e in entries),
+        }
+
+    # --- Internal ---
+
+    def _prune(self, manifest):
+        """Menyimpan BACKUP_KEEP_FULL rantai terakhir (backup penuh + inkrementalnya)."""
+        entries = manifest['backups']
+        fulls = [i for i, e in enumerate(entries) if e['jenis'] == JENIS_PENUH]
+        if len(fulls) <= self.keep_full:
+            return
+        cut = fulls[-self.keep_full]
+        for entry in entries[:cut]:
+            shutil.rmtree(os.path.join(self.directory, entry['id']), ignore_errors=True)
+        manifest['backups'] = entries[cut:]
+
+    def _throttle(self, nbytes):
+        if not self.max_bytes_per_sec:
+            return
+        started, written = self._window
+        written += nbytes
+        self._window = (started, written)
+        delay = written / self.max_bytes_per_sec - (time.monotonic() - started)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _copy(self, source, target):
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            target.write(chunk)
+
+    def _compress_stream(self, source, path):
+        with open(path, 'wb') as raw:
+            with gzip.GzipFile(fileobj=_ThrottledFile(raw, self._throttle), mode='wb') as gz:
+                self._copy(source, gz)
+
+    def _compress_bytes(self, payload, path):
+        with open(path, 'wb') as raw:
+            with gzip.GzipFile(fileobj=_ThrottledFile(raw, self._throttle), mode='wb') as gz:
+                for start in range(0, len(payload), CHUNK_SIZE):
+                    gz.write(payload[start:start + CHUNK_SIZE])
+
+    @staticmethod
+    def _size(folder):
+        return sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(folder) for name in names)
+
+    def _basis_path(self):
+        return os.path.join(self.directory, 'basis.json')
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, 'manifest.json') if self.directory else None
+
+    def _write_manifest(self, manifest):
+        tmp_path = f"{self._manifest_path()}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self._manifest_path())
+
+    @contextmanager
+    def _exclusive(self):
+        """Satu backup/restore sekaligus; proses lain langsung dilewati."""
+        if not self._lock.acquire(blocking=False):
+            yield False
+            return
+        lock_fd = open(os.path.join(self.directory, '.lock'), 'a') if fcntl else None
+        try:
+            if lock_fd:
+                try:
+                    fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    yield False
+                    return
+            yield True
+        finally:
+            if lock_fd:
+                lock_fd.close()
+            self._lock.release()
+
+
+# Instance tunggal yang dipakai tugas latar belakang & CLI
+backup_manager = BackupManager()
@@ -0,0 +1,240 @@
+import click
+
+
+def init_app(app):
+    """
+    Mendaftarkan perintah CLI aplikasi. Jalankan dari folder proyek, misal:
+        flask --app run reconcile-ledger --workers 4
+    """
+
+    @app.cli.command('reconcile-ledger')
+    @click.option('--workers', type=int, default=None, help='Jumlah proses worker.')
+    @click.option('--chunk-size', type=int, default=5000, help='Jumlah transaksi per potongan.')
+    def reconcile_ledger(workers, chunk_size):
+        """Memutar ulang riwayat transaksi dan melaporkan selisih saldo."""
+        from app.ledger import point_ledger
+
+        report = point_ledger.reconcile(workers=workers, chunk_size=chunk_size)
+        click.echo(f"Transaksi diproses : {report['transaksi_diproses']}")
+        click.echo(f"Pengguna diperiksa : {report['pengguna_diperiksa']}")
+
+        if report['drift']:
+            click.echo("\nSelisih ledger (snapshot + tail vs replay riwayat):")
+            for row in report['drift']:
+                click.echo(f"  {row['user_id']}: ledger={row['saldo_ledger']} replay={row['saldo_replay']}")
+        else:
+            click.echo("\nLedger konsisten dengan riwayat transaksi.")
+
+        if report['drift_total_poin_lama']:
+            click.echo("\nField total_poin lama yang tidak sesuai ledger:")
+            for row in report['drift_total_poin_lama']:
+                click.echo(f"  {row['user_id']}: total_poin={row['total_poin_lama']} ledger={row['saldo_ledger']}")
+
+    @app.cli.command('check-integrity')
+    @click.option('--workers', type=int, default=None, help='Jumlah proses worker.')
+    @click.option('--chunk-size', type=int, default=5000, help='Jumlah record per potongan.')
+    @click.option('--perbaiki', is_flag=True, help='Perbaiki temuan yang bisa diperbaiki otomatis.')
+    def check_integrity(workers, chunk_size, perbaiki):
+        """Memeriksa referensi pengguna/jenis sampah & saldo di database dan arsip."""
+        from app.integrity import integrity_checker
+
+        report = integrity_checker.check(workers=workers, chunk_size=chunk_size)
+        click.echo(f"Record diperiksa : {report['record_diperiksa']}")
+        if report['temuan']:
+            click.echo("\nReferensi rusak:")
+            for issue in report['temuan']:
+                lokasi = 'arsip' if issue['arsip'] else 'hot'
+                click.echo(f"  {issue['jenis']}: {issue['koleksi']} {issue['id']} ({issue['status'] or '-'}, {lokasi}) -> {issue['ref']}")
+        if report['drift']:
+            click.echo("\nSaldo tidak sesuai riwayat:")
+            for row in report['drift']:
+                click.echo(f"  {row['user_id']}: ledger={row['saldo_ledger']} replay={row['saldo_replay']}")
+        if not report['temuan'] and not report['drift']:
+            click.echo("\nTidak ada masalah integritas.")
+            return
+
+        if perbaiki:
+            fixed = integrity_checker.repair(report)
+            click.echo("\nPerbaikan:")
+            for name, count in fixed.items():
+                click.echo(f"  {name}: {count}")
+            click.echo("Jenis sampah yang tidak dikenal tidak diperbaiki otomatis; periksa data master.")
+
+    @app.cli.command('import-users')
+    @click.argument('berkas', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--batch-size', type=int, default=None, help='Jumlah pengguna per penulisan; default IMPORT_BATCH_SIZE.')
+    @click.option('--laporan', type=click.Path(dir_okay=False, writable=True), default=None,
+                  help='Tulis baris yang ditolak ke file CSV ini.')
+    def import_users(berkas, batch_size, laporan):
+        """Mengimpor pengguna dari CSV (nama, email, password, role, alamat, area_tugas)."""
+        import csv
+        from app.services import AdminService
+        from app.user_import import user_importer
+
+        if batch_size:
+            user_importer.batch_size = batch_size
+        with open(berkas, 'r', encoding='utf-8-sig', newline='') as f:
+            report, error = AdminService().import_user_accounts(f)
+        if error:
+            raise click.ClickException(error)
+
+        click.echo(f"Diimpor : {report['diimpor']}")
+        click.echo(f"Ditolak : {len(report['ditolak'])}")
+        click.echo(f"Durasi  : {report['durasi_detik']} detik")
+        if laporan:
+            with open(laporan, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=('baris', 'email', 'alasan'))
+                writer.writeheader()
+                writer.writerows(report['ditolak'])
+            click.echo(f"Laporan baris ditolak ditulis ke {laporan}")
+        else:
+            for item in report['ditolak']:
+                click.echo(f"  baris {item['baris']} ({item['email'] or '-'}): {item['alasan']}")
+
+    @app.cli.command('simulate-repricing')
+    @click.argument('harga', nargs=-1, required=True)
+    @click.option('--sejak', default=None, help='Tanggal berlaku (YYYY-MM-DD); default seluruh riwayat.')
+    @click.option('--terapkan', is_flag=True, help='Terapkan harga mulai --sejak.')
+    @click.option('--sesuaikan-poin', is_flag=True, help='Bukukan selisih poin setoran sejak --sejak.')
+    def simulate_repricing(harga, sejak, terapkan, sesuaikan_poin):
+        """Simulasi harga baru, misal: simulate-repricing wt1=250 wt2=120."""
+        from app.ledger import from_fixed
+        from app.pricing import repricing_engine, parse_price
+
+        table = {}
+        for pair in harga:
+            waste_type_id, _, value = pair.partition('=')
+            try:
+                table[waste_type_id] = parse_price(value)
+            except ValueError as e:
+                raise click.BadParameter(f"{pair}: {e}", param_hint='HARGA')
+
+        if terapkan:
+            if not sejak:
+                raise click.UsageError("--terapkan membutuhkan --sejak.")
+            from app.sharding import shard_router
+            if not shard_router.is_master:
+                raise click.ClickException("Harga hanya bisa diubah di node pusat (halaman admin di node pusat).")
+            ok, result = repricing_engine.apply(table, sejak, sesuaikan_poin)
+            if not ok:
+                raise click.ClickException(result)
+        else:
+            result = repricing_engine.simulate(table, sejak)
+
+        click.echo(f"Item setoran   : {result['jumlah_item']} ({result['item_terdampak']} terdampak)")
+        click.echo(f"Total selisih  : {from_fixed(result['total_delta_fp'])} poin")
+        click.echo(f"Durasi         : {result['durasi_detik']} detik")
+        click.echo("\nPer jenis sampah:")
+        for row in result['per_jenis']:
+            click.echo(f"  {row['nama']}: {row['harga_lama']} -> {row['harga_baru']}, "
+                       f"{row['berat_terdampak']} kg, {from_fixed(row['delta_fp'])} poin")
+        click.echo("\nPer pengguna:")
+        for row in result['per_pengguna']:
+            click.echo(f"  {row['user_id']}: {from_fixed(row['delta_fp'])} poin")
+        if terapkan:
+            click.echo(f"\nHarga baru berlaku mulai {sejak}.")
+
+    @app.cli.command('split-shards')
+    @click.option('--routing', required=True, type=click.Path(exists=True, dir_okay=False),
+                  help='Tabel routing shard (JSON, lihat shards.example.json).')
+    @click.option('--keluar', required=True, type=click.Path(file_okay=False),
+                  help='Folder tujuan; tiap shard mendapat subfolder sendiri.')
+    def split_shards(routing, keluar):
+        """Membagi database & arsip node ini menjadi satu database per shard."""
+        import json
+        import os
+        from app.archive import archive_store, ArchiveStore
+        from app.repository import DataRepository
+        from app.sharding import ShardRouter, split_database
+
+        router = ShardRouter()
+        router.load(routing)
+        for shard_id in router.shards:
+            if os.path.exists(os.path.join(keluar, shard_id, 'database.json')):
+                raise click.ClickException(f"{os.path.join(keluar, shard_id)} sudah berisi database.")
+
+        archived = {kind: list(archive_store.iter_records(kind)) for kind in ('pickups', 'transactions')}
+        shards = split_database(DataRepository().export_data(), archived, router)
+        for shard_id, (database, arsip) in shards.items():
+            directory = os.path.join(keluar, shard_id)
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, 'database.json'), 'w') as f:
+                json.dump(database, f, indent=2)
+            store = ArchiveStore()
+            store.directory = os.path.join(directory, 'instance', 'archive')
+            os.makedirs(store.directory, exist_ok=True)
+            for kind, records in arsip.items():
+                store.write(kind, records)
+            click.echo(f"{shard_id}: {len(database['users'])} pengguna, {len(database['pickups'])} pickup, "
+                       f"{len(database['transactions'])} transaksi, "
+                       f"{len(arsip['pickups']) + len(arsip['transactions'])} record arsip")
+        click.echo(f"\nJalankan tiap node dengan SHARD_ID=<shard>, SHARD_ROUTING_FILE={routing}, SHARD_TOKEN, "
+                   f"DATABASE_FILE={keluar}/<shard>/database.json, dan INSTANCE_PATH={keluar}/<shard>/instance.")
+
+    @app.cli.command('archive-records')
+    @click.option('--hari', type=int, default=None, help='Umur minimum record (hari); default ARCHIVE_AFTER_DAYS.')
+    def archive_records(hari):
+        """Memindahkan pickup selesai & transaksi lama ke arsip bulanan (gzip)."""
+        from app.archive import archive_store
+        from app.tasks import archive_old_records
+
+        moved = archive_old_records(hari)
+        click.echo(f"Pickup diarsipkan    : {moved['pickups']}")
+        click.echo(f"Transaksi diarsipkan : {moved['transactions']}")
+        for kind, info in archive_store.stats().items():
+            click.echo(f"Arsip {kind}: {info['record']} record dalam {info['partisi']} partisi")
+
+    @app.cli.command('rebuild-analytics')
+    def rebuild_analytics():
+        """Membangun ulang kolom analitik dari database utama dan arsip."""
+        from app.analytics import analytics_store
+
+        rows = analytics_store.rebuild()
+        for name, count in rows.items():
+            click.echo(f"{name}: {count} baris")
+
+    @app.cli.command('backup-database')
+    @click.option('--penuh', is_flag=True, help='Buat backup penuh (bukan inkremental).')
+    def backup_database(penuh):
+        """Membuat backup online database utama & arsip sekarang."""
+        from app.backup import backup_manager
+
+        entry = backup_manager.backup(full=penuh)
+        if entry is None:
+            click.echo("Backup lain sedang berjalan; coba lagi nanti.")
+            return
+        click.echo(f"Backup {entry['jenis']} {entry['id']} ({entry['ukuran']} byte) pada {entry['waktu']}")
+
+    @app.cli.command('list-backups')
+    def list_backups():
+        """Menampilkan daftar backup yang tersedia untuk restore."""
+        from app.backup import backup_manager
+
+        entries = backup_manager.read_manifest()['backups']
+        if not entries:
+            click.echo("Belum ada backup.")
+        for entry in entries:
+            click.echo(f"{entry['waktu']}  {entry['jenis']:<12} {entry['ukuran']:>12} byte  {entry['id']}")
+
+    @app.cli.command('restore-backup')
+    @click.option('--waktu', default=None, help="Titik restore 'YYYY-MM-DD HH:MM[:SS]'; default backup terakhir.")
+    @click.option('--ya', is_flag=True, help='Lewati konfirmasi.')
+    def restore_backup(waktu, ya):
+        """Mengembalikan database & arsip ke backup terakhir sebelum --waktu."""
+        from datetime import datetime
+        from app.analytics import analytics_store
+        from app.backup import backup_manager
+
+        try:
+            titik = datetime.fromisoformat(waktu) if waktu else datetime.now()
+        except ValueError:
+            raise click.BadParameter("Format waktu harus 'YYYY-MM-DD HH:MM[:SS]'.", param_hint='--waktu')
+        if not ya:
+            click.confirm("Database & arsip saat ini akan ditimpa. Hentikan aplikasi dulu. Lanjutkan?", abort=True)
+
+        entry, error = backup_manager.restore(titik)
+        if error:
+            raise click.ClickException(error)
+        analytics_store.rebuild()
+        click.echo(f"Database dikembalikan ke backup {entry['id']} ({entry['waktu']}).")
+        click.echo("Kolom analitik sudah dibangun ulang; jalankan ulang aplikasi agar indeks di memori dimuat ulang.")
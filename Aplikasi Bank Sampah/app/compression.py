@@ -0,0 +1,67 @@
+import gzip
+from flask import request
+
+try:
+    import brotli # Opsional; tanpa paket ini hanya gzip yang dipakai
+except ImportError:
+    brotli = None
+
+
+class ResponseCompressor:
+    """
+    Kompresi respons (brotli atau gzip sesuai Accept-Encoding) sebagai hook
+    after_request di level aplikasi, sehingga berlaku untuk halaman HTML
+    maupun API JSON tanpa mengubah setiap route.
+
+    Respons streaming (SSE feed tugas), file (send_file), yang sudah
+    terkompresi, dan yang terlalu kecil dibiarkan apa adanya. ETag dari
+    API bersifat weak sehingga tetap cocok untuk semua varian encoding.
+    """
+    def __init__(self):
+        self.min_size = 500
+        self.level = 6
+        self.brotli_quality = 5
+        self.mimetypes = ()
+
+    def init_app(self, app):
+        self.min_size = app.config['COMPRESS_MIN_SIZE']
+        self.level = app.config['COMPRESS_LEVEL']
+        self.brotli_quality = app.config['COMPRESS_BROTLI_QUALITY']
+        self.mimetypes = tuple(app.config['COMPRESS_MIMETYPES'])
+        app.after_request(self.compress)
+
+    def compress(self, response):
+        if (response.status_code < 200 or response.status_code in (204, 304)
+                or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in self.mimetypes):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self.negotiate(request.accept_encodings)
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        if encoding == 'br':
+            compressed = brotli.compress(data, quality=self.brotli_quality)
+        else:
+            compressed = gzip.compress(data, compresslevel=self.level, mtime=0)
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    @staticmethod
+    def negotiate(accept_encodings):
+        """'br' jika didukung klien & server, lalu 'gzip'; None jika tidak keduanya."""
+        if brotli is not None and accept_encodings.quality('br') > 0:
+            return 'br'
+        if accept_encodings.quality('gzip') > 0:
+            return 'gzip'
+        return None
+
+
+# Instance tunggal yang dipasang di create_app
+response_compressor = ResponseCompressor()
@@ -0,0 +1,283 @@
+import itertools
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Jenis event yang dikirim ke pengepul (didengarkan dashboard_pengepul.html)
+EVENT_TYPES = ('task-added', 'task-claimed', 'task-completed', 'task-removed')
+
+
+class Subscription:
+    """Antrean event milik satu koneksi SSE."""
+    def __init__(self, area, maxsize):
+        self.area = area
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.overflow = False
+
+    def matches(self, area):
+        # Pengepul tanpa area tugas menerima event dari semua area
+        return self.area is None or self.area == area
+
+
+class MemoryEventLog:
+    """Riwayat event terbaru di memori proses (satu worker)."""
+    def __init__(self, size):
+        self._events = deque(maxlen=size)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def append(self, origin, event):
+        with self._lock:
+            event['id'] = next(self._ids)
+            self._events.append(event)
+            return event
+
+    def since(self, last_id, area=None):
+        with self._lock:
+            events = list(self._events)
+        newest = events[-1]['id'] if events else 0
+        if last_id > newest or (events and events[0]['id'] > last_id + 1):
+            return None  # sebagian event sudah terbuang atau proses sudah start ulang
+        return [e for e in events if e['id'] > last_id and (area is None or e['area'] == area)]
+
+    def poll(self, origin):
+        return []
+
+
+class SQLiteEventLog:
+    """
+    Jembatan event antar worker gunicorn di satu mesin. Setiap worker
+    menulis event ke tabel yang sama, lalu thread poller tiap worker
+    membaca event dari worker lain dan meneruskannya ke pelanggan lokal.
+    """
+    def __init__(self, path, retention):
+        self.path = path
+        self.retention = retention
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS events "
+                     "(seq INTEGER PRIMARY KEY AUTOINCREMENT, origin TEXT, area TEXT, "
+                     "type TEXT, payload TEXT, created REAL)")
+        row = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM events").fetchone()
+        self._last_seq = row[0]
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def reopen(self):
+        """Membuang koneksi per-thread (misal yang tersalin dari proses induk)."""
+        self._local = threading.local()
+
+    def append(self, origin, event):
+        cursor = self._conn().execute(
+            "INSERT INTO events (origin, area, type, payload, created) VALUES (?, ?, ?, ?, ?)",
+            (origin, event['area'], event['type'], json.dumps(event['data']), time.time())
+        )
+        event['id'] = cursor.lastrowid
+        return event
+
+    def since(self, last_id, area=None):
+        conn = self._conn()
+        oldest, newest = conn.execute("SELECT MIN(seq), MAX(seq) FROM events").fetchone()
+        if last_id > (newest or 0) or (oldest is not None and oldest > last_id + 1):
+            return None
+        rows = conn.execute(
+            "SELECT seq, area, type, payload FROM events WHERE seq > ? AND (? IS NULL OR area = ?) ORDER BY seq",
+            (last_id, area, area)
+        ).fetchall()
+        return [self._row_to_event(row) for row in rows]
+
+    def poll(self, origin):
+        """Event baru dari worker lain sejak poll terakhir."""
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT seq, area, type, payload, origin FROM events WHERE seq > ? ORDER BY seq LIMIT 500",
+            (self._last_seq,)
+        ).fetchall()
+        if rows:
+            self._last_seq = rows[-1][0]
+        conn.execute("DELETE FROM events WHERE created < ?", (time.time() - self.retention,))
+        return [self._row_to_event(row) for row in rows if row[4] != origin]
+
+    @staticmethod
+    def _row_to_event(row):
+        return {"id": row[0], "area": row[1], "type": row[2], "data": json.loads(row[3])}
+
+
+class TaskFeed:
+    """
+    Pub/sub di dalam proses untuk feed tugas pengepul (Server-Sent Events).
+
+    Service menerbitkan event kecil (delta) saat tugas ditambahkan, diambil,
+    atau diselesaikan; setiap koneksi SSE punya antrean sendiri sehingga
+    pengepul tidak perlu me-refresh dasbor yang memindai semua pickup.
+    Dengan FEED_BACKEND='sqlite', event juga diteruskan antar worker dan id
+    event berurutan di semua worker; backend 'memory' hanya benar untuk satu
+    worker (id per proses membuat replay Last-Event-ID salah).
+    """
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._origin = uuid.uuid4().hex
+        self.log = MemoryEventLog(500)
+        self.queue_size = 100
+        self.heartbeat = 15
+        self.poll_interval = 0.5
+        self._poller = None
+        self._stop = threading.Event()
+
+    def init_app(self, app, start=True):
+        self.queue_size = app.config['FEED_QUEUE_SIZE']
+        self.heartbeat = app.config['FEED_HEARTBEAT']
+        self.poll_interval = app.config['FEED_POLL_INTERVAL']
+        if app.config['FEED_BACKEND'] == 'sqlite':
+            self.log = SQLiteEventLog(app.config['FEED_SQLITE_PATH'], app.config['FEED_RETENTION'])
+        else:
+            self.log = MemoryEventLog(app.config['FEED_MEMORY_EVENTS'])
+        if start:
+            self.start()
+
+    def start(self):
+        """
+        Menyalakan poller antar worker (backend sqlite). Pada mode preload
+        dipanggil di setiap worker setelah fork: origin harus unik per
+        worker dan koneksi SQLite tidak boleh dipakai lintas proses.
+        """
+        self._origin = uuid.uuid4().hex
+        if isinstance(self.log, SQLiteEventLog):
+            self.log.reopen()
+            self._start_poller(self.poll_interval)
+
+    def subscribe(self, area):
+        subscription = Subscription(area, self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event_type, pickup, **extra):
+        """Menerbitkan event untuk satu pickup ke pengepul di area pickup."""
+        from app.areas import area_of
+
+        if event_type not in EVENT_TYPES:
+            raise ValueError(f"Jenis event feed tidak dikenal: {event_type}")
+        area = pickup.get('area') or area_of({'alamat': pickup.get('lokasi')})
+        data = {
+            "pickup_id": pickup['id'],
+            "status": pickup.get('status'),
+            "pengepul_id": pickup.get('pengepul_id'),
+            "tanggal": pickup.get('tanggal'),
+            "waktu": pickup.get('waktu'),
+            "area": area,
+        }
+        data.update(extra)
+        try:
+            event = self.log.append(self._origin, {"area": area, "type": event_type, "data": data})
+        except sqlite3.Error as e:
+            # Feed bersifat pelengkap; kegagalan jembatan tidak boleh menggagalkan request
+            logger.warning("Gagal mencatat event feed: %s", e)
+            event = {"id": 0, "area": area, "type": event_type, "data": data}
+        self._dispatch(event)
+        return event
+
+    def replay(self, subscription, last_id):
+        """
+        Event yang terlewat sejak Last-Event-ID. None berarti terlalu lama
+        terputus sehingga klien perlu memuat ulang daftar tugas.
+        """
+        return self.log.since(last_id, subscription.area)
+
+    def stream(self, subscription, last_id=None):
+        """
+        Generator teks SSE untuk satu koneksi. Mengirim heartbeat berkala
+        agar proxy tidak memutus koneksi yang sepi.
+        """
+        try:
+            yield "retry: 3000\n\n"
+            if last_id is not None:
+                missed = self.replay(subscription, last_id)
+                if missed is None:
+                    yield self._format({"id": last_id, "type": "reset", "data": {}})
+                    return
+                for event in missed:
+                    yield self._format(event)
+            while True:
+                try:
+                    event = subscription.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                if event is None:
+                    # Antrean penuh (klien terlalu lambat): minta muat ulang
+                    yield self._format({"id": 0, "type": "reset", "data": {}})
+                    return
+                yield self._format(event)
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        with self._lock:
+            return {"subscribers": len(self._subscribers)}
+
+    def shutdown(self):
+        self._stop.set()
+
+    # --- Internal ---
+
+    def _dispatch(self, event):
+        with self._lock:
+            subscribers = [s for s in self._subscribers if s.matches(event['area'])]
+        for subscription in subscribers:
+            if subscription.overflow:
+                continue
+            try:
+                subscription.queue.put_nowait(event)
+            except queue.Full:
+                subscription.overflow = True
+                self._force_reset(subscription)
+
+    @staticmethod
+    def _force_reset(subscription):
+        # Kosongkan satu slot lalu kirim penanda reset
+        try:
+            subscription.queue.get_nowait()
+        except queue.Empty:
+            pass
+        subscription.queue.put_nowait(None)
+
+    def _start_poller(self, interval):
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    for event in self.log.poll(self._origin):
+                        self._dispatch(event)
+                except sqlite3.Error as e:
+                    logger.warning("Gagal membaca event feed: %s", e)
+
+        self._stop.clear()
+        self._poller = threading.Thread(target=run, name='task-feed-poller', daemon=True)
+        self._poller.start()
+
+    @staticmethod
+    def _format(event):
+        return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event.get('data', {}))}\n\n"
+
+
+# Instance tunggal yang dipakai service & rute pengepul
+task_feed = TaskFeed()
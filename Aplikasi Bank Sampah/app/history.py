@@ -0,0 +1,168 @@
+import base64
+import bisect
+import json
+import threading
+from collections import defaultdict
+from app.archive import archive_store, month_of
+
+# Jenis riwayat yang diindeks per pengguna
+KINDS = ('pickups', 'transaksi')
+
+
+def _pickup_key(pickup):
+    return (pickup.get('tanggal') or '', pickup.get('waktu') or '', pickup['id'])
+
+
+def _transaction_key(transaction):
+    return (transaction.get('tanggal') or '', transaction.get('seq', 0), transaction['id'])
+
+
+SORT_KEYS = {'pickups': _pickup_key, 'transaksi': _transaction_key}
+# Nama koleksi di database / 'user_refs' untuk tiap jenis riwayat
+COLLECTIONS = {'pickups': 'pickups', 'transaksi': 'transactions'}
+
+
+def encode_cursor(key):
+    """Kunci urutan item terakhir -> cursor string yang aman untuk URL."""
+    raw = json.dumps(list(key), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Kebalikan encode_cursor; mengembalikan None jika cursor rusak."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return tuple(json.loads(base64.urlsafe_b64decode(padded.encode())))
+    except (ValueError, TypeError):
+        return None
+
+
+class HistoryIndex:
+    """
+    Riwayat penjemputan dan transaksi per pengguna, masing-masing sebagai
+    daftar kunci (tanggal, ..., id) yang selalu terurut. Dasbor cukup
+    mengambil ekor daftar untuk lima item terbaru, dan halaman riwayat
+    memakai keyset pagination: cursor berisi kunci item terakhir, lalu
+    posisinya dicari dengan bisect sehingga halaman berapa pun sama murahnya.
+
+    Hanya record di database utama yang dimuat ke memori; setelah kunci
+    terakhirnya, halaman berikutnya dibaca dari partisi arsip bulanan milik
+    pengguna (terbaru lebih dulu) sehingga memori & waktu start tidak
+    tumbuh dengan umur arsip.
+
+    Indeks ini per proses: record yang ditulis worker gunicorn lain belum
+    ada di sini. Sebelum dibaca, riwayat satu pengguna disamakan dengan
+    indeks balik 'user_refs' yang tersimpan di database (`refresh_user`),
+    sehingga pickup & transaksi baru dari worker mana pun ikut tampil.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lists = {kind: defaultdict(list) for kind in KINDS}
+
+    def init_app(self, app):
+        from app.repository import DataRepository
+
+        data_repo = DataRepository()
+        self.load(data_repo.get_all_pickups(), data_repo.get_all_transactions())
+
+    def load(self, pickups, transactions):
+        with self._lock:
+            self._lists = {kind: defaultdict(list) for kind in KINDS}
+            for kind, records in (('pickups', pickups), ('transaksi', transactions)):
+                lists = self._lists[kind]
+                for record in records:
+                    lists[record['user_id']].append(SORT_KEYS[kind](record))
+                # Pada pemuatan massal cukup diurutkan sekali per pengguna
+                for keys in lists.values():
+                    keys.sort()
+
+    def add_pickup(self, pickup):
+        self._insert('pickups', pickup)
+
+    def add_transaction(self, transaction):
+        self._insert('transaksi', transaction)
+
+    def refresh_user(self, kind, user_id):
+        """
+        Menambahkan record pengguna yang belum ada di indeks (ditulis worker
+        lain) berdasarkan 'user_refs' di database; O(jumlah record pengguna).
+        """
+        from app.repository import DataRepository
+
+        with self._lock:
+            known = {key[-1] for key in self._lists[kind].get(user_id, [])}
+        records = DataRepository().get_user_records(COLLECTIONS[kind], user_id, exclude=known)
+        for record in records:
+            self._insert(kind, record)
+
+    def remove_user(self, user_id):
+        with self._lock:
+            for kind in KINDS:
+                self._lists[kind].pop(user_id, None)
+
+    def latest(self, kind, user_id, k=5):
+        """ID k item terbaru milik pengguna (terbaru lebih dulu)."""
+        return self.page(kind, user_id, limit=k)['ids']
+
+    def page(self, kind, user_id, cursor=None, limit=20):
+        """
+        Satu halaman riwayat (terbaru lebih dulu) mulai setelah `cursor`.
+        Mengembalikan {'ids', 'next_cursor'}; next_cursor None jika habis.
+        ValueError jika cursor tidak bisa dibaca.
+        """
+        after = decode_cursor(cursor)
+        if cursor and after is None:
+            raise ValueError("Cursor tidak valid.")
+        with self._lock:
+            keys = self._lists[kind].get(user_id, [])
+            try:
+                end = len(keys) if after is None else bisect.bisect_left(keys, after)
+            except TypeError:
+                raise ValueError("Cursor tidak valid.")
+            candidates = keys[max(0, end - limit - 1):end]
+        # Satu kunci lebih dari limit untuk tahu apakah masih ada halaman.
+        # Arsip dibuka jika indeks kurang, atau jika kandidat tertua sudah
+        # masuk bulan yang juga punya arsip (pickup lama yang masih terbuka).
+        months = archive_store.months(COLLECTIONS[kind], user_id)
+        if months and (len(candidates) <= limit or month_of({'tanggal': candidates[0][0]}) <= months[0]):
+            archived = self._archived_keys(kind, user_id, months, after, limit + 1)
+            candidates = sorted(set(candidates) | set(archived))
+        selected = candidates[-limit:][::-1] if limit > 0 else []
+        return {
+            "ids": [key[-1] for key in selected],
+            "next_cursor": encode_cursor(selected[-1]) if len(candidates) > limit and selected else None,
+        }
+
+    @staticmethod
+    def _archived_keys(kind, user_id, months, before, count):
+        """
+        Sampai `count` kunci terbesar (< `before`) milik pengguna di arsip.
+        Partisi dibuka dari bulan terbaru dan berhenti begitu cukup, karena
+        kunci diawali tanggal dan setiap partisi berisi satu bulan.
+        """
+        found = []
+        for month in months:
+            if len(found) >= count:
+                break
+            if before is not None and month > month_of({'tanggal': before[0]}):
+                continue
+            for record in archive_store.load_partition(COLLECTIONS[kind], month).values():
+                if record.get('user_id') == user_id:
+                    key = SORT_KEYS[kind](record)
+                    if before is None or key < before:
+                        found.append(key)
+        return sorted(found)[-count:]
+
+    def _insert(self, kind, record):
+        key = SORT_KEYS[kind](record)
+        with self._lock:
+            keys = self._lists[kind][record['user_id']]
+            i = bisect.bisect_left(keys, key)
+            if i == len(keys) or keys[i] != key:
+                keys.insert(i, key)
+
+
+# Instance tunggal yang dipakai service pengguna
+history_index = HistoryIndex()
@@ -0,0 +1,129 @@
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from app.ledger import to_fixed, from_fixed
+from app.repository import DataRepository
+
+# Id referensi yang valid, dikirim sekali ke setiap proses worker
+_known = {}
+
+
+def _init_worker(users, waste_types):
+    _known['users'] = users
+    _known['waste_types'] = waste_types
+
+
+def _check_chunk(kind, rows):
+    """
+    Dijalankan di proses worker: memeriksa satu potongan record
+    (id, user_id, pengepul_id, status, arsip, jenis_sampah, poin_fp).
+    Mengembalikan temuan dan jumlah poin + transaksi per pengguna.
+    """
+    users, waste_types = _known['users'], _known['waste_types']
+    issues = []
+    totals = defaultdict(lambda: [0, 0])
+    for record_id, user_id, collector_id, status, archived, waste_ids, amount_fp in rows:
+        base = {"koleksi": kind, "id": record_id, "status": status, "arsip": archived}
+        if user_id not in users:
+            issues.append(dict(base, jenis='pengguna_hilang', ref=user_id))
+        if collector_id and collector_id not in users:
+            issues.append(dict(base, jenis='pengepul_hilang', ref=collector_id))
+        for waste_type_id in waste_ids:
+            if waste_type_id not in waste_types:
+                issues.append(dict(base, jenis='jenis_sampah_tidak_dikenal', ref=waste_type_id))
+        if kind == 'transactions':
+            totals[user_id][0] += amount_fp
+            totals[user_id][1] += 1
+    return issues, dict(totals), len(rows)
+
+
+def _row(kind, record):
+    waste_ids = [item.get('waste_type_id') for item in record.get('rincian') or []]
+    amount_fp = 0
+    if kind == 'transactions':
+        amount_fp = record.get('jumlah_poin_fp', to_fixed(record.get('jumlah_poin')))
+    return (record['id'], record.get('user_id'), record.get('pengepul_id'), record.get('status'),
+            bool(record.get('arsip')), waste_ids, amount_fp)
+
+
+class IntegrityChecker:
+    """
+    Pemeriksa integritas referensial database + arsip: pickup, transaksi,
+    dan notifikasi yang menunjuk ke pengguna/pengepul yang tidak ada,
+    rincian setoran dengan jenis sampah yang tidak dikenal, serta saldo
+    ledger yang tidak sama dengan replay riwayat. Record dipindai dalam
+    potongan paralel di process pool (seperti rekonsiliasi ledger).
+
+    Juga menyiapkan indeks balik 'user_refs' yang dipakai penghapusan
+    pengguna.
+    """
+    def __init__(self):
+        self.repo = DataRepository()
+
+    def init_app(self, app):
+        self.repo.build_user_refs()
+
+    def check(self, workers=None, chunk_size=5000):
+        source = self.repo.get_integrity_data()
+        # Tombstone tetap referensi yang valid (pengguna dihapus anonim)
+        known_users = source['users'] | source['deleted_users']
+
+        def chunks():
+            for kind, records in source['records'].items():
+                for start in range(0, len(records), chunk_size):
+                    yield kind, [_row(kind, record) for record in records[start:start + chunk_size]]
+
+        issues = []
+        replayed = defaultdict(lambda: [0, 0])
+        processed = 0
+
+        def merge(futures):
+            nonlocal processed
+            for future in futures:
+                chunk_issues, totals, count = future.result()
+                issues.extend(chunk_issues)
+                processed += count
+                for user_id, (amount_fp, jumlah) in totals.items():
+                    replayed[user_id][0] += amount_fp
+                    replayed[user_id][1] += jumlah
+
+        workers = workers or os.cpu_count() or 2
+        pending = set()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(known_users, source['waste_types'])) as pool:
+            for kind, rows in chunks():
+                pending.add(pool.submit(_check_chunk, kind, rows))
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    merge(done)
+            merge(wait(pending).done)
+
+        ledger = source['ledger']
+        drift = []
+        for user_id in sorted(set(replayed) | set(ledger['balance_snapshots'])):
+            ledger_fp = self.repo._balance_fp(ledger, user_id)
+            replay_fp, jumlah = replayed.get(user_id, (0, 0))
+            if ledger_fp != replay_fp:
+                drift.append({
+                    "user_id": user_id,
+                    "saldo_ledger": from_fixed(ledger_fp),
+                    "saldo_replay": from_fixed(replay_fp),
+                    "saldo_fp": replay_fp,
+                    "jumlah_transaksi": jumlah,
+                })
+
+        issues.sort(key=lambda issue: (issue['jenis'], issue['koleksi'], issue['id']))
+        return {
+            "record_diperiksa": processed,
+            "temuan": issues,
+            "drift": drift,
+        }
+
+    def repair(self, report):
+        """Memperbaiki temuan dari `check()`; lihat DataRepository.repair_integrity."""
+        balances = {row['user_id']: (row['saldo_fp'], row['jumlah_transaksi']) for row in report['drift']}
+        return self.repo.repair_integrity(report['temuan'], balances)
+
+
+# Instance tunggal yang dipakai perintah CLI
+integrity_checker = IntegrityChecker()
@@ -0,0 +1,92 @@
+import threading
+from collections import Counter
+
+# Alasan penukaran ditolak (dipakai service untuk memilih pesan)
+ALASAN_STOK = 'stok'
+ALASAN_BATAS = 'batas'
+ALASAN_SALDO = 'saldo'
+ALASAN_REWARD = 'reward'
+
+
+class RewardInventory:
+    """
+    Stok reward dan jumlah penukaran per pengguna sebagai counter di memori,
+    sehingga katalog bisa menampilkan ketersediaan tanpa membaca riwayat
+    transaksi, dan penukaran yang pasti gagal (stok habis, batas tercapai)
+    ditolak tanpa mengambil kunci database.
+
+    - `stok` None berarti tidak terbatas; begitu juga `batas_per_pengguna`.
+    - Keputusan akhir diambil di repository: cek saldo, stok, dan batas,
+      lalu pengurangan stok, counter 'reward_redemptions', dan transaksi
+      ledger ditulis dalam satu siklus di bawah kunci database. Dengan
+      begitu beberapa worker tidak bisa menjual stok yang sama dua kali.
+    - Counter memori disamakan dengan nilai dari database setelah setiap
+      penukaran dan secara berkala (perubahan dari worker lain).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stock = {}
+        self._limits = {}
+        self._claimed = Counter()
+
+    def init_app(self, app):
+        from app.repository import DataRepository
+        from app.tasks import job_queue
+
+        # Counter per pengguna dibangun sekali dari riwayat lama jika belum ada
+        self.load(DataRepository().init_reward_inventory())
+        job_queue.every(app.config['REWARD_SYNC_INTERVAL'], 'sync_reward_inventory')
+
+    def load(self, state):
+        """state: {'rewards': [...], 'redemptions': {reward_id: {user_id: n}}}"""
+        with self._lock:
+            self._stock = {r['id']: r.get('stok') for r in state['rewards']}
+            self._limits = {r['id']: r.get('batas_per_pengguna') for r in state['rewards']}
+            self._claimed = Counter({
+                (reward_id, user_id): count
+                for reward_id, per_user in state['redemptions'].items()
+                for user_id, count in per_user.items()
+            })
+
+    def set_reward(self, reward):
+        """Dipanggil setelah reward ditambah atau stok/batasnya diubah admin."""
+        with self._lock:
+            self._stock[reward['id']] = reward.get('stok')
+            self._limits[reward['id']] = reward.get('batas_per_pengguna')
+
+    def record(self, reward_id, user_id, stok, ditukar):
+        """Menyamakan counter memori dengan nilai dari database."""
+        with self._lock:
+            self._stock[reward_id] = stok
+            self._claimed[(reward_id, user_id)] = ditukar
+
+    def check(self, reward_id, user_id):
+        """Pengecekan cepat sebelum ke repository; None jika boleh dicoba."""
+        with self._lock:
+            stok = self._stock.get(reward_id)
+            batas = self._limits.get(reward_id)
+            ditukar = self._claimed[(reward_id, user_id)]
+        if stok is not None and stok <= 0:
+            return ALASAN_STOK
+        if batas is not None and ditukar >= batas:
+            return ALASAN_BATAS
+        return None
+
+    def availability(self, reward_id, user_id=None):
+        """Ketersediaan satu reward untuk katalog (O(1))."""
+        with self._lock:
+            stok = self._stock.get(reward_id)
+            batas = self._limits.get(reward_id)
+            ditukar = self._claimed[(reward_id, user_id)] if user_id else 0
+        sisa_batas = None if batas is None else max(batas - ditukar, 0)
+        return {
+            "stok": stok,
+            "batas_per_pengguna": batas,
+            "ditukar": ditukar,
+            "sisa_batas": sisa_batas,
+            "tersedia": (stok is None or stok > 0) and (sisa_batas is None or sisa_batas > 0),
+        }
+
+
+# Instance tunggal yang dipakai service katalog reward
+reward_inventory = RewardInventory()
@@ -0,0 +1,278 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """
+    Antrean pekerjaan latar belakang (in-process) untuk efek samping yang
+    tidak kritis, misalnya menyimpan foto, notifikasi, log audit, dan
+    pembaruan agregat. Service cukup menyerahkan pekerjaan setelah data
+    utama tersimpan, sehingga latensi request hanya mencakup penulisan kritis.
+
+    Pekerjaan dijalankan oleh thread pool, dicoba ulang bila gagal, dan
+    (opsional) dicatat ke file jurnal agar pekerjaan yang belum selesai
+    dijalankan kembali saat aplikasi start ulang.
+    """
+    def __init__(self):
+        self._handlers = {}
+        self._executor = None
+        self._app = None
+        self._journal_path = None
+        self._workers = 2
+        self._lock = threading.Lock()
+        self._timers = set()
+        self._schedules = {}
+        self._closing = False
+        self.max_retries = 3
+        self.retry_delay = 1.0
+        self.stats_counter = {
+            "submitted": 0,
+            "succeeded": 0,
+            "retried": 0,
+            "failed": 0,
+            "pending": 0,
+        }
+
+    def init_app(self, app, start=True):
+        """
+        Menyiapkan thread pool dan jurnal berdasarkan konfigurasi aplikasi.
+
+        Dengan start=False (mode preload gunicorn) thread pool belum dibuat:
+        thread tidak ikut tersalin saat fork, jadi setiap worker memanggil
+        `start()` sendiri setelah fork. Jurnal tetap diputar ulang sekali
+        di proses master.
+        """
+        self._app = app
+        self.max_retries = app.config.get('JOB_MAX_RETRIES', 3)
+        self.retry_delay = app.config.get('JOB_RETRY_DELAY', 1.0)
+        self._workers = app.config.get('JOB_WORKERS', 2)
+        self._journal_path = app.config.get('JOB_QUEUE_FILE')
+        if start:
+            self.start()
+        if self._journal_path:
+            self._replay_journal()
+        app.extensions['job_queue'] = self
+        # Antrean dikosongkan sebelum thread pool lain (misal pool hashing
+        # password) ditutup: hook threading berjalan terbalik dari urutan
+        # pendaftaran dan sebelum atexit biasa, sedangkan concurrent.futures
+        # menolak submit baru begitu hook miliknya berjalan.
+        register = getattr(threading, '_register_atexit', atexit.register)
+        register(self.shutdown)
+
+    def start(self):
+        """
+        Menyalakan thread pool dan semua jadwal berulang yang sudah didaftarkan.
+        Kunci & timer dibuat baru karena milik proses induk tidak berlaku lagi.
+        """
+        self._lock = threading.Lock()
+        self._timers = set()
+        self._closing = False
+        self._executor = ThreadPoolExecutor(
+            max_workers=self._workers,
+            thread_name_prefix='job-worker'
+        )
+        for name, (seconds, payload) in self._schedules.items():
+            self._schedule(seconds, name, payload)
+
+    def task(self, name):
+        """
+        Decorator untuk mendaftarkan fungsi sebagai handler pekerjaan.
+        """
+        def decorator(f):
+            self._handlers[name] = f
+            return f
+        return decorator
+
+    def enqueue(self, name, durable=True, **payload):
+        """
+        Menyerahkan pekerjaan ke antrean. Payload pekerjaan durable harus
+        bisa diserialisasi ke JSON; gunakan durable=False untuk payload
+        seperti bytes foto yang cukup disimpan di memori.
+        """
+        if name not in self._handlers:
+            raise KeyError(f"Handler pekerjaan '{name}' belum terdaftar.")
+
+        job = {"id": uuid.uuid4().hex, "name": name, "payload": payload, "attempt": 0}
+
+        # Tanpa thread pool (misal saat dipanggil dari CLI), jalankan langsung
+        if self._executor is None or self._closing:
+            self._run_inline(job)
+            return job['id']
+
+        if durable and self._journal_path:
+            job['durable'] = True
+            self._journal_write({"id": job['id'], "name": name, "payload": payload})
+
+        with self._lock:
+            self.stats_counter['submitted'] += 1
+            self.stats_counter['pending'] += 1
+        self._executor.submit(self._run, job)
+        return job['id']
+
+    def every(self, seconds, name, **payload):
+        """
+        Menjadwalkan pekerjaan berulang setiap `seconds` detik, misalnya
+        sweep sanksi kedaluwarsa. Tanpa thread pool jadwal hanya dicatat
+        dan baru berjalan saat `start()`.
+        """
+        self._schedules[name] = (seconds, payload)
+        if self._executor is None:
+            return
+        self._schedule(seconds, name, payload)
+
+    def stats(self):
+        """Metrik antrean, termasuk kedalaman antrean (pending)."""
+        with self._lock:
+            return dict(self.stats_counter)
+
+    def shutdown(self, wait=True):
+        """
+        Menghentikan antrean dengan rapi: pekerjaan yang sedang berjalan
+        ditunggu, percobaan ulang yang tertunda tetap tersimpan di jurnal.
+        """
+        if self._executor is None or self._closing:
+            return
+        self._closing = True
+        with self._lock:
+            timers = list(self._timers)
+            self._timers.clear()
+        for timer in timers:
+            timer.cancel()
+        self._executor.shutdown(wait=wait)
+        self._executor = None
+
+    # --- Internal ---
+
+    def _call_handler(self, job):
+        handler = self._handlers[job['name']]
+        if self._app is not None:
+            with self._app.app_context():
+                handler(**job['payload'])
+        else:
+            handler(**job['payload'])
+
+    def _run_inline(self, job):
+        try:
+            self._call_handler(job)
+        except Exception:
+            logger.exception("Pekerjaan %s gagal dijalankan.", job['name'])
+
+    def _run(self, job):
+        job['attempt'] += 1
+        try:
+            self._call_handler(job)
+        except Exception as e:
+            if job['attempt'] <= self.max_retries and not self._closing:
+                logger.warning("Pekerjaan %s gagal (percobaan %s): %s",
+                               job['name'], job['attempt'], e)
+                self._schedule_retry(job)
+                return
+            if job['attempt'] <= self.max_retries and job.get('durable'):
+                # Antrean sedang dihentikan: entri jurnal dibiarkan tertunda
+                # agar dicoba ulang saat aplikasi start berikutnya
+                logger.warning("Pekerjaan %s gagal saat shutdown; dicoba ulang saat start berikutnya: %s",
+                               job['name'], e)
+                with self._lock:
+                    self.stats_counter['pending'] -= 1
+                return
+            logger.exception("Pekerjaan %s gagal permanen.", job['name'])
+            self._finish(job, "failed")
+            return
+        self._finish(job, "succeeded")
+
+    def _schedule(self, seconds, name, payload):
+        def tick():
+            if self._executor is None or self._closing:
+                return
+            self.enqueue(name, durable=False, **payload)
+            self._start_timer(seconds, tick)
+
+        self._start_timer(seconds, tick)
+
+    def _start_timer(self, delay, function, args=()):
+        timer = threading.Timer(delay, function, args=args)
+        timer.daemon = True
+        with self._lock:
+            # Buang timer yang sudah selesai agar set tidak terus membesar
+            self._timers = {t for t in self._timers if t.is_alive()}
+            self._timers.add(timer)
+        timer.start()
+
+    def _schedule_retry(self, job):
+        # Jeda bertambah secara eksponensial setiap percobaan
+        delay = self.retry_delay * (2 ** (job['attempt'] - 1))
+        with self._lock:
+            self.stats_counter['retried'] += 1
+        self._start_timer(delay, self._resubmit, args=(job,))
+
+    def _resubmit(self, job):
+        if self._executor is None or self._closing:
+            return
+        self._executor.submit(self._run, job)
+
+    def _finish(self, job, status):
+        with self._lock:
+            self.stats_counter[status] += 1
+            self.stats_counter['pending'] -= 1
+        if job.get('durable'):
+            self._journal_write({"id": job['id'], "done": status})
+
+    def _journal_write(self, entry):
+        with self._lock:
+            with open(self._journal_path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+
+    def _replay_journal(self):
+        """
+        Menjalankan ulang pekerjaan durable yang belum selesai pada
+        sesi sebelumnya, lalu memadatkan file jurnal.
+        """
+        if not os.path.exists(self._journal_path):
+            return
+
+        unfinished = {}
+        with open(self._journal_path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if 'done' in entry:
+                    unfinished.pop(entry['id'], None)
+                else:
+                    unfinished[entry['id']] = entry
+
+        with open(self._journal_path, 'w') as f:
+            for entry in unfinished.values():
+                f.write(json.dumps(entry) + '\n')
+
+        for entry in unfinished.values():
+            if entry['name'] not in self._handlers:
+                logger.warning("Handler '%s' tidak ditemukan, pekerjaan dilewati.", entry['name'])
+                continue
+            job = {"id": entry['id'], "name": entry['name'], "payload": entry['payload'],
+                   "attempt": 0, "durable": True}
+            if self._executor is None:
+                self._replay_inline(job)
+                continue
+            with self._lock:
+                self.stats_counter['submitted'] += 1
+                self.stats_counter['pending'] += 1
+            self._executor.submit(self._run, job)
+
+    def _replay_inline(self, job):
+        # Belum ada thread pool (proses master sebelum fork): jalankan langsung.
+        # Yang gagal tetap ada di jurnal dan diputar ulang saat start berikutnya.
+        try:
+            self._call_handler(job)
+        except Exception:
+            logger.exception("Pekerjaan %s gagal dijalankan.", job['name'])
+            return
+        self._journal_write({"id": job['id'], "done": "succeeded"})
@@ -0,0 +1,184 @@
+import bisect
+import threading
+from collections import defaultdict
+from datetime import datetime
+from app.areas import area_of
+from app.ledger import from_fixed
+
+# Metrik peringkat yang didukung
+METRICS = ('poin', 'berat')
+
+
+def _period(tanggal):
+    """'YYYY-MM-DD' -> periode bulanan 'YYYY-MM'."""
+    return (tanggal or '')[:7]
+
+
+class Leaderboard:
+    """
+    Peringkat penabung teratas per area dan per bulan.
+
+    Setiap partisi (area, bulan) menyimpan skor per pengguna dan, untuk
+    setiap metrik, daftar terurut (-skor, user_id). Top-K dan "peringkat
+    saya" cukup memakai bisect (O(log n)); konfirmasi baru memperbarui
+    partisinya saja tanpa mengurutkan ulang seluruh pengguna.
+
+    Leaderboard ini per proses: `record` hanya memperbarui worker yang
+    mengonfirmasi setoran. Partisi bulan berjalan dihitung ulang dari
+    database secara berkala (LEADERBOARD_REFRESH_INTERVAL) agar semua worker
+    menampilkan peringkat yang sama.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def init_app(self, app):
+        """
+        Membangun leaderboard bulan berjalan (satu-satunya periode yang
+        ditampilkan) dari transaksi bulan itu saja, bukan seluruh arsip.
+        """
+        from app.repository import UserRepository, DataRepository
+
+        users = {u['id']: u for u in UserRepository().get_all_users()}
+        waste_types = DataRepository().get_all_waste_types()
+        self.load(DataRepository().get_month_transactions(self.current_period()), users, waste_types)
+
+        from app.tasks import job_queue
+        job_queue.every(app.config['LEADERBOARD_REFRESH_INTERVAL'], 'refresh_leaderboard')
+
+    def load(self, transactions, users, waste_types):
+        with self._lock:
+            self._reset()
+            self._fill(transactions, users, waste_types)
+
+    def reload_period(self, transactions, users, waste_types, bulan):
+        """
+        Menghitung ulang semua partisi satu bulan dari transaksi tersimpan,
+        termasuk setoran yang dikonfirmasi di worker lain.
+        """
+        transactions = [t for t in transactions if _period(t.get('tanggal')) == bulan]
+        with self._lock:
+            for key in [key for key in self._scores if key[1] == bulan]:
+                for user_id in self._scores.pop(key):
+                    self._partitions_by_user[user_id].discard(key)
+                for metric in METRICS:
+                    self._ranked.pop(key + (metric,), None)
+            self._fill(transactions, users, waste_types)
+
+    def record(self, user, tanggal, poin_fp, berat):
+        """Mencatat satu setoran yang baru dikonfirmasi."""
+        with self._lock:
+            self._add(user['id'], area_of(user), _period(tanggal), poin_fp, berat)
+
+    def remove_user(self, user_id):
+        with self._lock:
+            for key in self._partitions_by_user.pop(user_id, set()):
+                scores = self._scores[key].pop(user_id, None)
+                if scores is None:
+                    continue
+                for metric, score in zip(METRICS, scores):
+                    self._discard(self._ranked[key + (metric,)], (-score, user_id))
+
+    def top(self, area, bulan=None, k=10, metric='poin'):
+        """K pengguna teratas pada satu area dan bulan."""
+        key = (area, bulan or self.current_period())
+        with self._lock:
+            ranked = self._ranked.get(key + (metric,), [])
+            return [self._row(key, user_id, i + 1) for i, (_, user_id) in enumerate(ranked[:k])]
+
+    def rank(self, user_id, area, bulan=None, metric='poin'):
+        """
+        Peringkat seorang pengguna di partisinya. Skor yang sama mendapat
+        peringkat yang sama. Mengembalikan None jika belum ada setoran.
+        """
+        key = (area, bulan or self.current_period())
+        with self._lock:
+            scores = self._scores.get(key, {}).get(user_id)
+            if scores is None:
+                return None
+            ranked = self._ranked[key + (metric,)]
+            score = scores[METRICS.index(metric)]
+            position = bisect.bisect_left(ranked, (-score, '')) + 1
+            row = self._row(key, user_id, position)
+            row['jumlah_peserta'] = len(ranked)
+            return row
+
+    def areas(self, bulan=None):
+        """Daftar area yang punya setoran pada bulan tersebut."""
+        bulan = bulan or self.current_period()
+        with self._lock:
+            return sorted(area for area, period in self._scores if period == bulan)
+
+    @staticmethod
+    def current_period():
+        return datetime.now().strftime('%Y-%m')
+
+    # --- Internal (dipanggil dengan lock sudah dipegang) ---
+
+    def _fill(self, transactions, users, waste_types):
+        from app.pricing import parse_legacy_items
+
+        name_map = {wt['nama']: wt['id'] for wt in waste_types}
+        touched = set()
+        for transaction in transactions:
+            if transaction.get('tipe') != 'setor_sampah':
+                continue
+            user = users.get(transaction['user_id'])
+            if not user:
+                continue
+            items = transaction.get('rincian')
+            if items is None:
+                items = parse_legacy_items(transaction.get('deskripsi'), name_map)
+            key = (area_of(user), _period(transaction.get('tanggal')))
+            poin_fp, berat = self._scores[key].get(transaction['user_id'], (0, 0.0))
+            self._scores[key][transaction['user_id']] = (
+                poin_fp + transaction.get('jumlah_poin_fp', 0),
+                berat + sum(item['berat'] for item in items),
+            )
+            self._partitions_by_user[transaction['user_id']].add(key)
+            touched.add(key)
+
+        # Pada pemuatan massal daftar peringkat cukup diurutkan sekali
+        for key in touched:
+            scores = self._scores[key]
+            for m, metric in enumerate(METRICS):
+                self._ranked[key + (metric,)] = sorted(
+                    (-values[m], user_id) for user_id, values in scores.items()
+                )
+
+    def _reset(self):
+        self._scores = defaultdict(dict)
+        self._ranked = defaultdict(list)
+        self._partitions_by_user = defaultdict(set)
+
+    def _add(self, user_id, area, bulan, poin_fp, berat):
+        key = (area, bulan)
+        old = self._scores[key].get(user_id)
+        new = (old[0] + poin_fp, old[1] + berat) if old else (poin_fp, berat)
+        self._scores[key][user_id] = new
+        self._partitions_by_user[user_id].add(key)
+
+        for metric, old_score, new_score in zip(METRICS, old or (None, None), new):
+            ranked = self._ranked[key + (metric,)]
+            if old_score is not None:
+                self._discard(ranked, (-old_score, user_id))
+            bisect.insort(ranked, (-new_score, user_id))
+
+    @staticmethod
+    def _discard(ranked, entry):
+        i = bisect.bisect_left(ranked, entry)
+        if i < len(ranked) and ranked[i] == entry:
+            del ranked[i]
+
+    def _row(self, key, user_id, position):
+        poin_fp, berat = self._scores[key][user_id]
+        return {
+            "peringkat": position,
+            "user_id": user_id,
+            "poin": from_fixed(poin_fp),
+            "berat": round(berat, 2),
+        }
+
+
+# Instance tunggal yang dipakai service dasbor
+leaderboard = Leaderboard()
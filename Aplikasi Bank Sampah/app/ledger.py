@@ -0,0 +1,129 @@
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from decimal import Decimal, ROUND_HALF_UP
+from itertools import chain, islice
+from app.repository import DataRepository
+
+# Poin disimpan sebagai integer fixed-point: 1 poin = 100 satuan.
+POINT_SCALE = 100
+
+
+def to_fixed(value):
+    """Mengubah nilai poin (int/float/str) menjadi integer fixed-point."""
+    scaled = Decimal(str(value or 0)) * POINT_SCALE
+    return int(scaled.quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def from_fixed(value_fp):
+    """Mengubah integer fixed-point menjadi poin untuk ditampilkan."""
+    whole, rest = divmod(value_fp, POINT_SCALE)
+    return whole if rest == 0 else value_fp / POINT_SCALE
+
+
+def _sum_chunk(chunk):
+    """
+    Dijalankan di proses worker: menjumlahkan event poin satu potongan
+    riwayat per pengguna.
+    """
+    totals = defaultdict(int)
+    for user_id, amount_fp in chunk:
+        totals[user_id] += amount_fp
+    return dict(totals), len(chunk)
+
+
+class PointLedger:
+    """
+    Ledger poin sebagai sumber kebenaran saldo. Saldo dibaca dari snapshot
+    per pengguna + tail event (lihat DataRepository), bukan dari field
+    `total_poin` yang dulu diubah langsung.
+    """
+    def __init__(self):
+        self.repo = DataRepository()
+
+    def init_app(self, app):
+        from app.tasks import job_queue
+
+        DataRepository.snapshot_every = app.config['LEDGER_SNAPSHOT_EVERY']
+        self.repo.migrate_ledger(to_fixed)
+        job_queue.every(app.config['LEDGER_SNAPSHOT_INTERVAL'], 'snapshot_balances')
+
+    def get_balance(self, user_id):
+        return from_fixed(self.repo.get_balance_fp(user_id))
+
+    def get_balance_fp(self, user_id):
+        return self.repo.get_balance_fp(user_id)
+
+    def reconcile(self, workers=None, chunk_size=5000):
+        """
+        Memutar ulang seluruh riwayat transaksi secara streaming: arsip
+        dibaca per partisi bulanan lalu transaksi di database utama,
+        dipotong per `chunk_size` dan dijumlahkan paralel di process pool,
+        kemudian dibandingkan dengan saldo ledger (snapshot + tail) dan
+        field lama `total_poin`. Urutan tidak berpengaruh pada jumlah.
+        """
+        ledger = self.repo.get_ledger_data()
+        hot = ledger['transactions']
+        events = (
+            (t['user_id'], t.get('jumlah_poin_fp', to_fixed(t.get('jumlah_poin'))))
+            for t in chain(self.repo.iter_archived_transactions(exclude=hot), hot.values())
+        )
+
+        def chunks():
+            while True:
+                chunk = list(islice(events, chunk_size))
+                if not chunk:
+                    return
+                yield chunk
+
+        replayed = defaultdict(int)
+        processed = 0
+
+        def merge(futures):
+            nonlocal processed
+            for future in futures:
+                totals, count = future.result()
+                processed += count
+                for user_id, amount_fp in totals.items():
+                    replayed[user_id] += amount_fp
+
+        # Jumlah potongan yang sedang diproses dibatasi agar memori tetap kecil
+        workers = workers or os.cpu_count() or 2
+        pending = set()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for chunk in chunks():
+                pending.add(pool.submit(_sum_chunk, chunk))
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    merge(done)
+            merge(wait(pending).done)
+
+        data = {key: ledger[key] for key in ('transactions', 'balance_snapshots', 'ledger_tail')}
+        user_ids = set(replayed) | set(ledger['balance_snapshots']) | set(ledger['users'])
+        drift, legacy_drift = [], []
+        for user_id in sorted(user_ids):
+            ledger_fp = self.repo._balance_fp(data, user_id)
+            if ledger_fp != replayed.get(user_id, 0):
+                drift.append({
+                    "user_id": user_id,
+                    "saldo_ledger": from_fixed(ledger_fp),
+                    "saldo_replay": from_fixed(replayed.get(user_id, 0)),
+                })
+            user = ledger['users'].get(user_id)
+            if user and 'total_poin' in user and to_fixed(user['total_poin']) != ledger_fp:
+                legacy_drift.append({
+                    "user_id": user_id,
+                    "total_poin_lama": user['total_poin'],
+                    "saldo_ledger": from_fixed(ledger_fp),
+                })
+
+        return {
+            "transaksi_diproses": processed,
+            "pengguna_diperiksa": len(user_ids),
+            "drift": drift,
+            "drift_total_poin_lama": legacy_drift,
+        }
+
+
+# Instance tunggal yang dipakai service
+point_ledger = PointLedger()
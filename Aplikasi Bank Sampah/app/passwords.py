@@ -0,0 +1,91 @@
+import hmac
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Prefix hash yang dihasilkan werkzeug (berbasis hashlib stdlib)
+HASH_PREFIXES = ('pbkdf2:', 'scrypt:')
+
+
+class PasswordBusyError(Exception):
+    """Antrean hashing penuh; request sebaiknya ditolak cepat."""
+
+
+class PasswordHasher:
+    """
+    Hashing password ber-salt (PBKDF2 atau scrypt) dengan work factor yang
+    bisa diatur lewat konfigurasi.
+
+    Hashing dijalankan di thread pool terbatas: hashlib melepas GIL saat
+    menghitung, sehingga beban CPU login dibatasi oleh jumlah worker pool
+    dan antrean yang terlalu panjang ditolak alih-alih menumpuk.
+    """
+    def __init__(self):
+        self.method = 'pbkdf2:sha256:600000'
+        self._executor = None
+        self._slots = None
+        self.queue_timeout = 5.0
+
+    def init_app(self, app):
+        self.method = self.method_from_config(app.config)
+        workers = app.config['PASSWORD_HASH_WORKERS']
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        # Jumlah hashing yang boleh berjalan + menunggu sekaligus
+        self._slots = threading.BoundedSemaphore(workers * app.config['PASSWORD_HASH_QUEUE_FACTOR'])
+        self.queue_timeout = app.config['PASSWORD_HASH_QUEUE_TIMEOUT']
+
+    @staticmethod
+    def method_from_config(config):
+        if config['PASSWORD_HASH_METHOD'] == 'scrypt':
+            n, r, p = config['SCRYPT_COST']
+            return f"scrypt:{n}:{r}:{p}"
+        return f"pbkdf2:sha256:{config['PBKDF2_ITERATIONS']}"
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, method=self.method)
+
+    def hash_many(self, passwords, method=None, workers=None):
+        """
+        Hashing banyak password sekaligus (impor pengguna). Berjalan di
+        pool sementara sendiri agar antrean hashing login tidak tertahan.
+        Setiap password di-hash tersendiri dengan salt masing-masing, juga
+        jika isinya sama (misal password awal yang sama untuk satu RT),
+        agar hash tersimpan tidak menunjukkan akun mana yang berbagi password.
+        """
+        method = method or self.method
+        with ThreadPoolExecutor(max_workers=workers or 1, thread_name_prefix='password-import') as pool:
+            return list(pool.map(lambda p: generate_password_hash(p, method=method), passwords))
+
+    def verify(self, stored, password):
+        """
+        Memverifikasi password. Record lama yang masih plain text tetap
+        bisa login (dibandingkan secara constant-time).
+        """
+        if not stored or password is None:
+            return False
+        if not self.is_hashed(stored):
+            return hmac.compare_digest(stored.encode(), password.encode())
+        return self._run(check_password_hash, stored, password)
+
+    def needs_rehash(self, stored):
+        """True jika password masih plain text atau work factor-nya berbeda."""
+        return not self.is_hashed(stored) or not stored.startswith(self.method + '$')
+
+    @staticmethod
+    def is_hashed(stored):
+        return bool(stored) and stored.startswith(HASH_PREFIXES) and '$' in stored
+
+    def _run(self, func, *args, **kwargs):
+        # Tanpa pool (misal skrip CLI), hitung langsung di thread pemanggil
+        if self._executor is None:
+            return func(*args, **kwargs)
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise PasswordBusyError("Server sedang sibuk, silakan coba lagi.")
+        try:
+            return self._executor.submit(func, *args, **kwargs).result()
+        finally:
+            self._slots.release()
+
+
+# Instance tunggal yang dipakai AuthService
+password_hasher = PasswordHasher()
@@ -0,0 +1,293 @@
+import bisect
+import math
+import threading
+import time
+from datetime import date, datetime
+from itertools import chain
+import numpy as np
+from app.analytics import analytics_store
+from app.history import history_index
+from app.ledger import from_fixed
+from app.repository import DataRepository
+
+# Entri awal riwayat harga: berlaku sejak "selalu"
+SEJAK_AWAL = ''
+EPOCH = date(1970, 1, 1)
+# Nilai hari untuk SEJAK_AWAL agar lebih kecil dari tanggal mana pun
+HARI_AWAL = np.iinfo(np.int32).min
+
+
+def _day_number(tanggal):
+    """Mengubah 'YYYY-MM-DD' menjadi nomor hari sejak epoch (int)."""
+    if not tanggal:
+        return HARI_AWAL
+    return (datetime.strptime(tanggal, '%Y-%m-%d').date() - EPOCH).days
+
+
+def price_history(waste_type):
+    """
+    Riwayat harga satu jenis sampah, terurut berdasarkan tanggal berlaku:
+    [{'berlaku_mulai': 'YYYY-MM-DD', 'nilai_poin_per_kg': x}, ...].
+    Jenis sampah lama tanpa riwayat dianggap berharga tetap sejak awal.
+    """
+    history = waste_type.get('riwayat_harga')
+    if not history:
+        return [{"berlaku_mulai": SEJAK_AWAL, "nilai_poin_per_kg": waste_type.get('nilai_poin_per_kg', 0)}]
+    return history
+
+
+def effective_price(waste_type, tanggal):
+    """Harga per kg yang berlaku pada tanggal 'YYYY-MM-DD'."""
+    history = price_history(waste_type)
+    dates = [entry['berlaku_mulai'] for entry in history]
+    i = bisect.bisect_right(dates, tanggal) - 1
+    return history[max(i, 0)]['nilai_poin_per_kg']
+
+
+def parse_price(value):
+    """
+    Harga per kg dari input (string/angka) sebagai int atau float.
+    ValueError jika bukan angka hingga (NaN/Infinity) atau negatif.
+    """
+    price = float(value)
+    if not math.isfinite(price):
+        raise ValueError("Harga harus berupa angka.")
+    if price < 0:
+        raise ValueError("Harga tidak boleh negatif.")
+    return int(price) if price.is_integer() else price
+
+
+def parse_legacy_items(deskripsi, name_map):
+    """
+    Transaksi setoran lama belum punya field 'rincian'; rincian diambil
+    dari deskripsi "Setor sampah (Kardus: 5kg, Plastik: 3kg)". Nama yang
+    tidak dikenal dilewati.
+    """
+    if not deskripsi or '(' not in deskripsi:
+        return []
+    body = deskripsi[deskripsi.index('(') + 1:].rstrip(')')
+    items = []
+    for part in body.split(', '):
+        nama, _, berat = part.rpartition(': ')
+        waste_type_id = name_map.get(nama)
+        try:
+            berat = float(berat.rstrip('kg'))
+        except ValueError:
+            continue
+        if waste_type_id and berat > 0:
+            items.append({"waste_type_id": waste_type_id, "berat": berat})
+    return items
+
+
+class LineItems:
+    """
+    Rincian setoran dalam bentuk kolom NumPy: satu baris per item
+    (jenis sampah, berat, pengguna, tanggal). Indeks jenis dan pengguna
+    merujuk ke `type_ids` dan `user_ids`.
+    """
+    def __init__(self, type_ids, user_ids, type_idx, user_idx, day, weight):
+        self.type_ids = type_ids
+        self.user_ids = user_ids
+        self.type_idx = type_idx
+        self.user_idx = user_idx
+        self.day = day
+        self.weight = weight
+
+    def __len__(self):
+        return len(self.weight)
+
+    @classmethod
+    def from_transactions(cls, transactions, waste_types):
+        type_ids = [wt['id'] for wt in waste_types]
+        type_pos = {type_id: i for i, type_id in enumerate(type_ids)}
+        name_map = {wt['nama']: wt['id'] for wt in waste_types}
+        user_pos = {}
+        day_cache = {}
+        type_idx, user_idx, day, weight = [], [], [], []
+
+        for transaction in transactions:
+            if transaction.get('tipe') != 'setor_sampah':
+                continue
+            items = transaction.get('rincian')
+            if items is None:
+                items = parse_legacy_items(transaction.get('deskripsi'), name_map)
+            tanggal = transaction.get('tanggal') or ''
+            if tanggal not in day_cache:
+                day_cache[tanggal] = _day_number(tanggal)
+            u = user_pos.setdefault(transaction['user_id'], len(user_pos))
+            for item in items:
+                t = type_pos.get(item['waste_type_id'])
+                if t is None:
+                    continue
+                type_idx.append(t)
+                user_idx.append(u)
+                day.append(day_cache[tanggal])
+                weight.append(item['berat'])
+
+        return cls(
+            type_ids, list(user_pos),
+            np.array(type_idx, dtype=np.int32),
+            np.array(user_idx, dtype=np.int32),
+            np.array(day, dtype=np.int32),
+            np.array(weight, dtype=np.float64),
+        )
+
+
+def baseline_prices(items, histories):
+    """
+    Harga yang berlaku untuk setiap item pada tanggalnya, dihitung per
+    jenis sampah dengan searchsorted atas tanggal riwayat harga.
+    """
+    prices = np.zeros(len(items), dtype=np.float64)
+    for t, history in enumerate(histories):
+        mask = items.type_idx == t
+        if not mask.any():
+            continue
+        days = np.array([_day_number(entry['berlaku_mulai']) for entry in history], dtype=np.int32)
+        values = np.array([entry['nilai_poin_per_kg'] for entry in history], dtype=np.float64)
+        pos = np.searchsorted(days, items.day[mask], side='right') - 1
+        prices[mask] = values[np.maximum(pos, 0)]
+    return prices
+
+
+def simulate_line_items(items, histories, price_table, since_day=HARI_AWAL):
+    """
+    Inti simulasi (tervektorisasi): menghitung selisih poin fixed-point per
+    item jika harga di `price_table` (array per indeks jenis, NaN = tidak
+    berubah) berlaku untuk item bertanggal >= `since_day`.
+    Mengembalikan (delta_fp per item, mask item yang terdampak).
+    """
+    base = baseline_prices(items, histories)
+    new_price = price_table[items.type_idx]
+    mask = (items.day >= since_day) & ~np.isnan(new_price)
+    new = np.where(mask, new_price, base)
+    # Poin dibulatkan per item seperti saat konfirmasi (1 poin = 100)
+    base_fp = np.rint(items.weight * base * 100).astype(np.int64)
+    new_fp = np.rint(items.weight * new * 100).astype(np.int64)
+    return new_fp - base_fp, mask
+
+
+class RepricingEngine:
+    """
+    Perubahan harga jenis sampah dengan tanggal berlaku dan simulasi
+    "bagaimana jika" atas seluruh rincian setoran historis.
+
+    Rincian setoran disimpan sebagai kolom NumPy dan di-cache selama
+    ledger tidak berubah (ditandai `meta.ledger_seq`), sehingga simulasi
+    berulang cukup berupa operasi array.
+    """
+    def __init__(self):
+        self.repo = DataRepository()
+        self._lock = threading.Lock()
+        self._cache_key = None
+        self._items = None
+
+    def init_app(self, app):
+        from app.tasks import job_queue
+
+        job_queue.enqueue('roll_waste_prices', durable=False)
+        job_queue.every(app.config['PRICE_ROLL_INTERVAL'], 'roll_waste_prices')
+
+    def line_items(self):
+        data = self.repo.get_pricing_data()
+        key = (data['ledger_seq'], tuple(wt['id'] for wt in data['waste_types']))
+        with self._lock:
+            if self._cache_key != key:
+                # Arsip hanya dibaca (per partisi) saat cache tidak berlaku lagi
+                hot = data['transactions']
+                transactions = chain(self.repo.iter_archived_transactions(exclude=hot), hot.values())
+                self._items = LineItems.from_transactions(transactions, data['waste_types'])
+                self._cache_key = key
+            return self._items, data
+
+    def simulate(self, price_table, berlaku_mulai=None):
+        """
+        Mensimulasikan tabel harga {waste_type_id: harga_baru} untuk item
+        bertanggal >= berlaku_mulai (None = seluruh riwayat). Mengembalikan
+        selisih poin per pengguna dan per jenis sampah.
+        """
+        started = time.perf_counter()
+        items, data = self.line_items()
+        waste_types = data['waste_types']
+        histories = [price_history(wt) for wt in waste_types]
+        table = np.full(len(waste_types), np.nan)
+        for i, wt in enumerate(waste_types):
+            if wt['id'] in price_table:
+                table[i] = price_table[wt['id']]
+
+        since_day = _day_number(berlaku_mulai) if berlaku_mulai else HARI_AWAL
+        delta_fp, mask = simulate_line_items(items, histories, table, since_day)
+
+        per_user_fp = np.bincount(items.user_idx, weights=delta_fp, minlength=len(items.user_ids))
+        per_type_fp = np.bincount(items.type_idx, weights=delta_fp, minlength=len(waste_types))
+        per_type_kg = np.bincount(items.type_idx[mask], weights=items.weight[mask], minlength=len(waste_types))
+
+        per_user = [
+            {"user_id": items.user_ids[u], "delta_fp": int(per_user_fp[u])}
+            for u in np.flatnonzero(per_user_fp)
+        ]
+        per_user.sort(key=lambda row: row['delta_fp'])
+        per_type = [
+            {
+                "waste_type_id": wt['id'],
+                "nama": wt['nama'],
+                "harga_lama": wt.get('nilai_poin_per_kg'),
+                "harga_baru": price_table.get(wt['id'], wt.get('nilai_poin_per_kg')),
+                "berat_terdampak": round(float(per_type_kg[t]), 3),
+                "delta_fp": int(per_type_fp[t]),
+            }
+            for t, wt in enumerate(waste_types)
+        ]
+        return {
+            "berlaku_mulai": berlaku_mulai,
+            "jumlah_item": len(items),
+            "item_terdampak": int(mask.sum()),
+            "total_delta_fp": int(delta_fp.sum()),
+            "per_pengguna": per_user,
+            "per_jenis": per_type,
+            "ledger_seq": data['ledger_seq'],
+            "durasi_detik": round(time.perf_counter() - started, 4),
+        }
+
+    def apply(self, price_table, berlaku_mulai, sesuaikan_poin=False):
+        """
+        Mencatat harga baru ke riwayat harga mulai `berlaku_mulai`. Jika
+        `sesuaikan_poin`, selisih poin item yang sudah tercatat sejak tanggal
+        itu dibukukan sebagai transaksi 'penyesuaian_harga' di ledger.
+        Mengembalikan (ok, hasil_simulasi atau pesan).
+        """
+        try:
+            price_table = {waste_type_id: parse_price(price) for waste_type_id, price in price_table.items()}
+        except (TypeError, ValueError) as e:
+            return False, f"Harga tidak valid: {e}"
+        today = date.today().strftime('%Y-%m-%d')
+        if berlaku_mulai < today and not sesuaikan_poin:
+            return False, "Tanggal berlaku di masa lalu memerlukan penyesuaian poin."
+
+        # Dicoba ulang jika ada transaksi baru di antara simulasi dan penulisan
+        for _ in range(3):
+            result = self.simulate(price_table, berlaku_mulai)
+            adjustments = []
+            if sesuaikan_poin:
+                adjustments = [
+                    {
+                        "user_id": row['user_id'],
+                        "tanggal": today,
+                        "tipe": "penyesuaian_harga",
+                        "deskripsi": f"Penyesuaian harga sampah sejak {berlaku_mulai}",
+                        "jumlah_poin": from_fixed(row['delta_fp']),
+                        "jumlah_poin_fp": row['delta_fp'],
+                    }
+                    for row in result['per_pengguna']
+                ]
+            if self.repo.apply_repricing(price_table, berlaku_mulai, adjustments,
+                                         expected_seq=result['ledger_seq'], today=today):
+                for transaction in adjustments:
+                    history_index.add_transaction(transaction)
+                    analytics_store.record_transaction(transaction)
+                return True, result
+        return False, "Data berubah saat harga diterapkan, silakan coba lagi."
+
+
+# Instance tunggal yang dipakai service admin
+repricing_engine = RepricingEngine()
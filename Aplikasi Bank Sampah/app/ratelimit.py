@@ -0,0 +1,282 @@
+import sqlite3
+import threading
+import time
+
+
+class MemoryBucketStore:
+    """
+    Penyimpanan token bucket & lockout di memori proses.
+    Setiap bucket hanya berupa tuple (token, waktu_update, waktu_penuh)
+    agar ringkas; bucket yang sudah penuh kembali boleh dibuang. Lockout
+    berupa tuple (jumlah_gagal, terkunci_sampai, gagal_terakhir) dan hanya
+    dibuang oleh `prune` berdasarkan umur kegagalan terakhirnya.
+    """
+    def __init__(self, max_keys=100000):
+        self._buckets = {}
+        self._lockouts = {}
+        self._lock = threading.Lock()
+        self.max_keys = max_keys
+        self._evict_at = max_keys
+
+    def consume(self, key, capacity, refill_per_sec, now):
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_per_sec)
+            if tokens >= 1:
+                tokens -= 1
+                allowed, retry_after = True, 0
+            else:
+                allowed, retry_after = False, (1 - tokens) / refill_per_sec
+            full_at = now + (capacity - tokens) / refill_per_sec
+            self._buckets[key] = (tokens, now, full_at)
+            if len(self._buckets) > self._evict_at:
+                self._evict_full(now)
+            return allowed, retry_after
+
+    def get_lockout(self, key):
+        with self._lock:
+            return self._lockouts.get(key, (0, 0.0, 0.0))[:2]
+
+    def add_failure(self, key, now):
+        """Menambah satu kegagalan; mengembalikan jumlah kegagalan terbaru."""
+        with self._lock:
+            failures, locked_until, _ = self._lockouts.get(key, (0, 0.0, 0.0))
+            self._lockouts[key] = (failures + 1, locked_until, now)
+            return failures + 1
+
+    def lock_until(self, key, locked_until):
+        with self._lock:
+            failures, current, last_failure = self._lockouts.get(key, (0, 0.0, 0.0))
+            if failures:
+                self._lockouts[key] = (failures, max(current, locked_until), last_failure)
+
+    def clear_lockout(self, key):
+        with self._lock:
+            self._lockouts.pop(key, None)
+
+    def prune(self, now, idle_seconds):
+        """
+        Membuang bucket yang sudah penuh & lockout yang kuncinya berakhir dan
+        kegagalan terakhirnya lebih lama dari `idle_seconds`.
+        """
+        horizon = now - idle_seconds
+        with self._lock:
+            self._buckets = {
+                key: bucket for key, bucket in self._buckets.items() if bucket[2] > now
+            }
+            self._lockouts = {
+                key: lockout for key, lockout in self._lockouts.items()
+                if lockout[1] > horizon or lockout[2] > horizon
+            }
+            self._evict_at = max(self.max_keys, 2 * len(self._buckets))
+
+    def _evict_full(self, now):
+        # Bucket yang sudah terisi penuh sama saja dengan bucket baru. Lockout
+        # tidak ikut dibuang (riwayat gagal menentukan backoff). Batas
+        # berikutnya dilipatgandakan agar pembersihan O(n) teramortisasi.
+        self._buckets = {
+            key: bucket for key, bucket in self._buckets.items() if bucket[2] > now
+        }
+        self._evict_at = max(self.max_keys, 2 * len(self._buckets))
+
+
+class SQLiteBucketStore:
+    """
+    Penyimpanan token bucket & lockout di SQLite, dipakai bersama oleh
+    beberapa worker gunicorn di satu mesin.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS buckets "
+                     "(key TEXT PRIMARY KEY, tokens REAL, updated REAL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS lockouts "
+                     "(key TEXT PRIMARY KEY, failures INTEGER, locked_until REAL, last_failure REAL DEFAULT 0)")
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(lockouts)")}
+        if 'last_failure' not in columns:
+            conn.execute("ALTER TABLE lockouts ADD COLUMN last_failure REAL DEFAULT 0")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def consume(self, key, capacity, refill_per_sec, now):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = min(capacity, tokens + (now - updated) * refill_per_sec)
+            if tokens >= 1:
+                tokens -= 1
+                allowed, retry_after = True, 0
+            else:
+                allowed, retry_after = False, (1 - tokens) / refill_per_sec
+            conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                         (key, tokens, now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, retry_after
+
+    def get_lockout(self, key):
+        row = self._conn().execute(
+            "SELECT failures, locked_until FROM lockouts WHERE key = ?", (key,)
+        ).fetchone()
+        return row if row else (0, 0.0)
+
+    def add_failure(self, key, now):
+        """Menambah satu kegagalan secara atomik; mengembalikan jumlah terbaru."""
+        rows = self._conn().execute(
+            "INSERT INTO lockouts (key, failures, locked_until, last_failure) VALUES (?, 1, 0, ?) "
+            "ON CONFLICT(key) DO UPDATE SET failures = failures + 1, last_failure = excluded.last_failure "
+            "RETURNING failures", (key, now)
+        ).fetchall()
+        return rows[0][0]
+
+    def lock_until(self, key, locked_until):
+        self._conn().execute("UPDATE lockouts SET locked_until = MAX(locked_until, ?) WHERE key = ?",
+                             (locked_until, key))
+
+    def clear_lockout(self, key):
+        self._conn().execute("DELETE FROM lockouts WHERE key = ?", (key,))
+
+    def prune(self, now, idle_seconds):
+        """
+        Menghapus bucket yang tidak dipakai selama `idle_seconds` (pasti
+        sudah terisi penuh kembali) & lockout yang kuncinya berakhir dan
+        kegagalan terakhirnya sebelum itu.
+        """
+        conn = self._conn()
+        conn.execute("DELETE FROM buckets WHERE updated < ?", (now - idle_seconds,))
+        conn.execute("DELETE FROM lockouts WHERE locked_until < ? AND last_failure < ?",
+                     (now - idle_seconds, now - idle_seconds))
+
+
+class LoginGuard:
+    """
+    Lapisan pembatas laju untuk login & registrasi.
+
+    - Token bucket per IP dan per email, dicek sebelum ada akses ke
+      repository sehingga penolakan sangat murah.
+    - Lockout per akun dengan backoff eksponensial setelah beberapa kali
+      password salah berturut-turut.
+    """
+    def __init__(self):
+        self.store = MemoryBucketStore()
+        self.config = {}
+        self._lock = threading.Lock()
+        self.stats_counter = {
+            "login_allowed": 0,
+            "throttled_ip": 0,
+            "throttled_email": 0,
+            "locked_out": 0,
+            "lockouts_started": 0,
+            "register_throttled": 0,
+            "unknown_email": 0,
+        }
+
+    def init_app(self, app):
+        self.config = app.config
+        if app.config['RATELIMIT_BACKEND'] == 'sqlite':
+            self.store = SQLiteBucketStore(app.config['RATELIMIT_SQLITE_PATH'])
+        else:
+            self.store = MemoryBucketStore()
+
+    def check_login(self, ip, email):
+        """
+        Mengecek apakah percobaan login boleh diproses.
+        Mengembalikan (boleh, detik_tunggu).
+        """
+        now = time.time()
+        email_key = (email or '').strip().lower()
+
+        failures, locked_until = self.store.get_lockout(f"lock:{email_key}")
+        if locked_until > now:
+            self._count('locked_out')
+            return False, locked_until - now
+
+        capacity, per_minute = self.config['LOGIN_IP_RATE']
+        allowed, retry_after = self.store.consume(f"ip:{ip}", capacity, per_minute / 60.0, now)
+        if not allowed:
+            self._count('throttled_ip')
+            return False, retry_after
+
+        capacity, per_minute = self.config['LOGIN_EMAIL_RATE']
+        allowed, retry_after = self.store.consume(f"email:{email_key}", capacity, per_minute / 60.0, now)
+        if not allowed:
+            self._count('throttled_email')
+            return False, retry_after
+
+        self._count('login_allowed')
+        return True, 0
+
+    def check_register(self, ip):
+        capacity, per_minute = self.config['REGISTER_IP_RATE']
+        allowed, retry_after = self.store.consume(f"register:{ip}", capacity, per_minute / 60.0, time.time())
+        if not allowed:
+            self._count('register_throttled')
+        return allowed, retry_after
+
+    def record_failure(self, email):
+        """
+        Mencatat password salah. Setelah LOCKOUT_THRESHOLD kali gagal, akun
+        dikunci dengan durasi yang berlipat dua setiap kegagalan berikutnya.
+        """
+        key = f"lock:{(email or '').strip().lower()}"
+        now = time.time()
+        # Penambahan atomik di store: kegagalan bersamaan tidak saling menimpa
+        failures = self.store.add_failure(key, now)
+        threshold = self.config['LOCKOUT_THRESHOLD']
+        if failures >= threshold:
+            duration = min(
+                self.config['LOCKOUT_BASE_SECONDS'] * (2 ** (failures - threshold)),
+                self.config['LOCKOUT_MAX_SECONDS']
+            )
+            self.store.lock_until(key, now + duration)
+            self._count('lockouts_started')
+
+    def record_unknown_email(self, ip):
+        """
+        Login dengan email tak dikenal memakan satu token lagi dari bucket
+        IP, karena setiap percobaan bisa memicu pengecekan ke shard lain.
+        """
+        self._count('unknown_email')
+        capacity, per_minute = self.config['LOGIN_IP_RATE']
+        self.store.consume(f"ip:{ip}", capacity, per_minute / 60.0, time.time())
+
+    def record_success(self, email):
+        self.store.clear_lockout(f"lock:{(email or '').strip().lower()}")
+
+    def prune(self):
+        """
+        Membersihkan bucket & lockout kedaluwarsa (dijadwalkan setiap
+        RATELIMIT_PRUNE_INTERVAL detik); batasnya waktu terlama sebuah bucket
+        terisi penuh atau LOCKOUT_MAX_SECONDS, mana yang lebih lama.
+        """
+        refill = [
+            capacity * 60.0 / per_minute
+            for capacity, per_minute in (self.config['LOGIN_IP_RATE'], self.config['LOGIN_EMAIL_RATE'],
+                                         self.config['REGISTER_IP_RATE'])
+        ]
+        self.store.prune(time.time(), max(refill + [self.config['LOCKOUT_MAX_SECONDS']]))
+
+    def stats(self):
+        with self._lock:
+            return dict(self.stats_counter)
+
+    def _count(self, name):
+        with self._lock:
+            self.stats_counter[name] += 1
+
+
+# Instance tunggal yang dipakai rute otentikasi
+login_guard = LoginGuard()
@@ -1,10 +1,62 @@
+import heapq
 import json
 import os
+import shutil
+import threading
 import uuid # Untuk generate ID unik
+from contextlib import contextmanager
+from datetime import datetime
+from app.archive import archive_store, month_of, CLOSED_STATUSES
+from app.inventory import ALASAN_BATAS, ALASAN_REWARD, ALASAN_SALDO, ALASAN_STOK
+from app.sanctions import sanction_status, pickup_block_reason, normalize_ban_date
+
+try:
+    import fcntl # Hanya tersedia di Unix, dipakai untuk kunci antar-proses
+except ImportError:
+    fcntl = None
 
 # Menentukan path ke file database JSON
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_FILE = os.path.join(BASE_DIR, '..', 'database.json')
+LOCK_FILE = DB_FILE + '.lock'
+
+# Kunci untuk siklus baca-ubah-tulis. Thread lock melindungi antar-thread
+# (request & job latar belakang), flock melindungi antar-worker gunicorn.
+_db_lock = threading.Lock()
+_lock_state = threading.local()
+
+
+def set_database_file(path):
+    """
+    Memakai file database lain (misal satu file per shard saat beberapa
+    node dijalankan di satu mesin). Dipanggil sekali di create_app sebelum
+    repository pertama kali dipakai.
+    """
+    global DB_FILE, LOCK_FILE
+    DB_FILE = os.path.abspath(path)
+    LOCK_FILE = DB_FILE + '.lock'
+
+
+# Mode penghapusan pengguna (lihat UserRepository.delete_user)
+MODE_ANONIM = 'anonim'
+MODE_KASKADE = 'kaskade'
+DELETE_MODES = (MODE_ANONIM, MODE_KASKADE)
+
+
+def tombstone_of(user, deleted_at=None):
+    """Record pengganti pengguna yang dihapus: tanpa email, password, dan data pribadi."""
+    return {
+        "id": user['id'],
+        "nama": "Pengguna Terhapus",
+        "role": user.get('role'),
+        "dihapus_pada": deleted_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def transaction_key(transaction):
+    """Kunci urutan daftar transaksi admin: (tanggal, id)."""
+    return (transaction.get('tanggal') or '', transaction['id'])
+
 
 class BaseRepository:
     """
@@ -19,12 +71,89 @@ class BaseRepository:
             return {"users": {}, "waste_types": {}, "rewards": {}, "pickups": {}, "transactions": {}}
 
     def _save_data(self, data):
+        # Tulis ke file sementara lalu ganti secara atomik, sehingga pembaca
+        # tidak pernah melihat file yang setengah tertulis.
+        tmp_file = f"{DB_FILE}.{os.getpid()}.tmp"
         try:
-            with open(DB_FILE, 'w') as f:
+            with open(tmp_file, 'w') as f:
                 json.dump(data, f, indent=2)
+            os.replace(tmp_file, DB_FILE)
         except IOError as e:
             print(f"Error saving data: {e}")
 
+    def database_version(self):
+        """
+        Penanda versi file database (mtime dalam nanodetik). Setiap
+        penulisan mengganti file secara atomik, jadi nilai ini berubah
+        setiap kali worker mana pun menyimpan data.
+        """
+        try:
+            return os.stat(DB_FILE).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _touch_users(data):
+        """
+        Menaikkan penanda versi data pengguna (meta.users_version). Dipanggil
+        setiap kali record pengguna ditulis, agar indeks per proses bisa
+        membedakan perubahan pengguna dari penulisan lain di database.
+        """
+        meta = data.setdefault('meta', {})
+        meta['users_version'] = meta.get('users_version', 0) + 1
+
+    def get_users_if_changed(self, known_version):
+        """
+        (users_version, daftar pengguna) jika versi data pengguna berbeda
+        dari `known_version`, selain itu (users_version, None).
+        """
+        data = self._load_data()
+        version = data.get('meta', {}).get('users_version', 0)
+        if version == known_version:
+            return version, None
+        return version, list(data.get('users', {}).values())
+
+    @staticmethod
+    def _add_ref(data, user_id, kind, record_id):
+        """
+        Mencatat record di indeks balik 'user_refs' (pengguna -> pickup,
+        tugas, transaksi, notifikasi), dipakai saat menghapus pengguna agar
+        tidak perlu memindai seluruh koleksi.
+        """
+        if not user_id:
+            return
+        refs = data.setdefault('user_refs', {}).setdefault(user_id, {}).setdefault(kind, [])
+        if record_id not in refs:
+            refs.append(record_id)
+
+    @contextmanager
+    def _locked(self):
+        """
+        Mengunci database selama satu siklus baca-ubah-tulis agar tidak ada
+        perubahan yang hilang. Aman dipanggil bertingkat dalam satu thread.
+        """
+        depth = getattr(_lock_state, 'depth', 0)
+        if depth:
+            _lock_state.depth = depth + 1
+            try:
+                yield
+            finally:
+                _lock_state.depth -= 1
+            return
+
+        with _db_lock:
+            lock_fd = open(LOCK_FILE, 'a') if fcntl else None
+            try:
+                if lock_fd:
+                    fcntl.flock(lock_fd, fcntl.LOCK_EX)
+                _lock_state.depth = 1
+                yield
+            finally:
+                _lock_state.depth = 0
+                if lock_fd:
+                    fcntl.flock(lock_fd, fcntl.LOCK_UN)
+                    lock_fd.close()
+
 class UserRepository(BaseRepository):
     """
     Repositori untuk mengelola data pengguna (users).
@@ -44,17 +173,57 @@ class UserRepository(BaseRepository):
                 return user
         return None
 
-    def save_user(self, user_data):
+    def get_emails(self):
+        """Set email terdaftar (huruf kecil), untuk validasi impor massal."""
         data = self._load_data()
-        if 'id' not in user_data or not user_data['id']:
-            user_data['id'] = f"u{uuid.uuid4().hex[:6]}"
-        
-        if 'users' not in data:
-            data['users'] = {}
-            
-        data['users'][user_data['id']] = user_data
-        self._save_data(data)
-        return user_data
+        return {(user.get('email') or '').lower() for user in data.get('users', {}).values()}
+
+    def add_users(self, users):
+        """
+        Menyimpan banyak pengguna baru dalam satu penulisan. Email dicek
+        ulang terhadap indeks email di bawah kunci, karena pengguna lain
+        bisa mendaftar selama impor berjalan. Mengembalikan
+        (pengguna_tersimpan, email_duplikat).
+        """
+        with self._locked():
+            data = self._load_data()
+            existing = data.setdefault('users', {})
+            emails = {(user.get('email') or '').lower() for user in existing.values()}
+            saved, duplicates = [], []
+            for user_data in users:
+                email = user_data['email'].lower()
+                if email in emails:
+                    duplicates.append(user_data['email'])
+                    continue
+                emails.add(email)
+                user_data['id'] = user_data.get('id') or f"u{uuid.uuid4().hex[:6]}"
+                while user_data['id'] in existing:
+                    user_data['id'] = f"u{uuid.uuid4().hex[:6]}"
+                existing[user_data['id']] = user_data
+                saved.append(user_data)
+            if saved:
+                self._touch_users(data)
+                self._save_data(data)
+            return saved, duplicates
+
+    def get_users_by_ids(self, user_ids):
+        data = self._load_data()
+        users = data.get('users', {})
+        return [users[user_id] for user_id in user_ids if user_id in users]
+
+    def save_user(self, user_data):
+        with self._locked():
+            data = self._load_data()
+            if 'id' not in user_data or not user_data['id']:
+                user_data['id'] = f"u{uuid.uuid4().hex[:6]}"
+
+            if 'users' not in data:
+                data['users'] = {}
+
+            data['users'][user_data['id']] = user_data
+            self._touch_users(data)
+            self._save_data(data)
+            return user_data
 
     # --- TAMBAHAN UNTUK FITUR EDIT & HAPUS ---
 
@@ -62,25 +231,146 @@ class UserRepository(BaseRepository):
         """
         Metode baru: Mengupdate data pengguna yang sudah ada.
         """
-        data = self._load_data()
-        if 'users' in data and user_id in data['users']:
-            # Pastikan ID tidak berubah
-            updated_data['id'] = user_id
-            data['users'][user_id] = updated_data
-            self._save_data(data)
-            return True
-        return False
+        with self._locked():
+            data = self._load_data()
+            if 'users' in data and user_id in data['users']:
+                # Pastikan ID tidak berubah
+                updated_data['id'] = user_id
+                data['users'][user_id] = updated_data
+                self._touch_users(data)
+                self._save_data(data)
+                return True
+            return False
 
-    def delete_user(self, user_id):
+    def delete_user(self, user_id, mode=MODE_ANONIM, slot_key=None):
         """
-        Metode baru: Menghapus pengguna berdasarkan ID.
+        Menghapus pengguna beserta data terkait lewat indeks balik
+        'user_refs', tanpa memindai semua pickup dan transaksi.
+
+        - MODE_ANONIM: record pengguna diganti tombstone di 'deleted_users'
+          (tanpa data pribadi) sehingga riwayat, ledger, dan arsip tetap
+          konsisten; pickup yang masih menunggu dihapus.
+        - MODE_KASKADE: pengguna, semua pickup, transaksi, notifikasi, dan
+          saldo ledgernya dihapus, termasuk di arsip.
+
+        Pada kedua mode, tugas menunggu yang sudah diambil pengepul yang
+        dihapus dikembalikan ke antrean. `slot_key` (opsional) dipakai untuk
+        mengurangi counter slot pickup yang dihapus. Mengembalikan ringkasan
+        (dict, termasuk pickup menunggu yang dihapus/dilepas) atau None jika
+        pengguna tidak ditemukan.
         """
-        data = self._load_data()
-        if 'users' in data and user_id in data['users']:
+        with self._locked():
+            data = self._load_data()
+            user = data.get('users', {}).get(user_id)
+            if not user:
+                return None
+            refs = data.get('user_refs', {}).get(user_id, {})
+            pickups = data.get('pickups', {})
+            counts = data.get('slot_counts', {})
+            cascade = mode == MODE_KASKADE
+            summary = {"mode": mode, "pickup_dihapus": 0, "transaksi_dihapus": 0, "arsip_dihapus": 0,
+                       "slot": {}, "menunggu_dihapus": [], "tugas_dilepas": []}
+
+            for pickup_id in refs.get('pickups', []):
+                pickup = pickups.get(pickup_id)
+                if not pickup or pickup.get('user_id') != user_id:
+                    continue  # sudah diarsipkan/berubah pemilik
+                waiting = pickup.get('status') == 'menunggu'
+                if cascade or waiting:
+                    del pickups[pickup_id]
+                    summary['pickup_dihapus'] += 1
+                if waiting:
+                    summary['menunggu_dihapus'].append(pickup)
+                    key = slot_key(pickup) if slot_key else None
+                    if key in counts:
+                        counts[key] = max(counts[key] - 1, 0)
+                        summary['slot'][key] = counts[key]
+
+            for pickup_id in refs.get('tugas', []):
+                pickup = pickups.get(pickup_id)
+                if not pickup or pickup.get('pengepul_id') != user_id:
+                    continue
+                if pickup.get('status') == 'menunggu' or cascade:
+                    pickup['pengepul_id'] = None
+                    if pickup.get('status') == 'menunggu':
+                        summary['tugas_dilepas'].append(pickup)
+
+            if cascade:
+                transactions = data.get('transactions', {})
+                for transaction_id in refs.get('transactions', []):
+                    transaction = transactions.get(transaction_id)
+                    if transaction and transaction.get('user_id') == user_id:
+                        del transactions[transaction_id]
+                        summary['transaksi_dihapus'] += 1
+                notifications = data.get('notifications', {})
+                for notification_id in refs.get('notifications', []):
+                    notifications.pop(notification_id, None)
+                data.get('balance_snapshots', {}).pop(user_id, None)
+                data.get('ledger_tail', {}).pop(user_id, None)
+                for per_user in data.get('reward_redemptions', {}).values():
+                    per_user.pop(user_id, None)
+                summary['arsip_dihapus'] = archive_store.remove_user(user_id)
+            else:
+                data.setdefault('deleted_users', {})[user_id] = tombstone_of(user)
+
             del data['users'][user_id]
+            data.get('user_refs', {}).pop(user_id, None)
+            self._touch_users(data)
             self._save_data(data)
-            return True
-        return False
+            return summary
+
+    def get_deleted_users(self):
+        """Tombstone pengguna yang dihapus secara anonim {user_id: record}."""
+        data = self._load_data()
+        return data.get('deleted_users', {})
+
+    def patch_users(self, patches):
+        """
+        Mengubah sebagian field banyak pengguna sekaligus dalam satu
+        penulisan. `patches` berbentuk {user_id: {field: nilai}}.
+        Mengembalikan daftar record pengguna yang berhasil diubah.
+        """
+        if not patches:
+            return []
+        with self._locked():
+            data = self._load_data()
+            updated = []
+            for user_id, fields in patches.items():
+                user = data.get('users', {}).get(user_id)
+                if user:
+                    user.update(fields)
+                    updated.append(user)
+            if updated:
+                self._touch_users(data)
+                self._save_data(data)
+            return updated
+
+    def lift_expired_bans(self, user_ids, today):
+        """
+        Mencabut shadow ban pengguna `user_ids` yang menurut record tersimpan
+        memang sudah berakhir (ban_until < `today`), dicek di bawah kunci
+        database. Ban yang diperpanjang/diperbarui worker lain dilewati.
+        Mengembalikan record terbaru semua pengguna yang diperiksa.
+        """
+        if not user_ids:
+            return []
+        with self._locked():
+            data = self._load_data()
+            checked, lifted = [], False
+            for user_id in user_ids:
+                user = data.get('users', {}).get(user_id)
+                if not user:
+                    continue
+                ban_until = normalize_ban_date(user.get('ban_until'))
+                if user.get('is_shadow_banned') and ban_until and ban_until < today:
+                    user.update({"is_shadow_banned": False, "ban_until": None})
+                    lifted = True
+                checked.append(user)
+            if lifted:
+                self._touch_users(data)
+                self._save_data(data)
+            return checked
+
 
 class DataRepository(BaseRepository):
     """
@@ -96,32 +386,87 @@ class DataRepository(BaseRepository):
         return list(data.get('rewards', {}).values())
 
     def save_waste_type(self, waste_data):
-        data = self._load_data()
-        if 'id' not in waste_data:
-            waste_data['id'] = f"wt{uuid.uuid4().hex[:4]}"
-        if 'waste_types' not in data:
-            data['waste_types'] = {}
-        data['waste_types'][waste_data['id']] = waste_data
-        self._save_data(data)
-        return waste_data
+        with self._locked():
+            data = self._load_data()
+            if 'id' not in waste_data:
+                waste_data['id'] = f"wt{uuid.uuid4().hex[:4]}"
+            if 'waste_types' not in data:
+                data['waste_types'] = {}
+            data['waste_types'][waste_data['id']] = waste_data
+            self._save_data(data)
+            return waste_data
 
     def save_reward(self, reward_data):
+        with self._locked():
+            data = self._load_data()
+            if 'id' not in reward_data:
+                reward_data['id'] = f"r{uuid.uuid4().hex[:4]}"
+            if 'rewards' not in data:
+                data['rewards'] = {}
+            data['rewards'][reward_data['id']] = reward_data
+            self._save_data(data)
+            return reward_data
+
+    def patch_waste_prices(self, prices):
+        """Memperbarui harga aktif beberapa jenis sampah: {waste_type_id: harga}."""
+        if not prices:
+            return 0
+        with self._locked():
+            data = self._load_data()
+            for waste_type_id, price in prices.items():
+                if waste_type_id in data.get('waste_types', {}):
+                    data['waste_types'][waste_type_id]['nilai_poin_per_kg'] = price
+            self._save_data(data)
+            return len(prices)
+
+    def get_pricing_data(self):
+        """
+        Data untuk simulasi harga: jenis sampah, ledger_seq, dan transaksi di
+        database utama. Transaksi arsip tidak ikut; dibaca lewat
+        `iter_archived_transactions` hanya jika cache simulasi perlu dibangun.
+        """
         data = self._load_data()
-        if 'id' not in reward_data:
-            reward_data['id'] = f"r{uuid.uuid4().hex[:4]}"
-        if 'rewards' not in data:
-            data['rewards'] = {}
-        data['rewards'][reward_data['id']] = reward_data
-        self._save_data(data)
-        return reward_data
+        return {
+            "waste_types": list(data.get('waste_types', {}).values()),
+            "transactions": data.get('transactions', {}),
+            "ledger_seq": data.get('meta', {}).get('ledger_seq', 0),
+        }
+
+    def apply_repricing(self, price_table, berlaku_mulai, adjustments, expected_seq, today):
+        """
+        Menambahkan harga baru ke riwayat harga setiap jenis sampah (entri
+        yang berlaku pada/sesudah `berlaku_mulai` digantikan) dan
+        membukukan transaksi penyesuaian dalam satu penulisan.
+        Mengembalikan False jika ledger berubah sejak simulasi.
+        """
+        with self._locked():
+            data = self._load_data()
+            if data.get('meta', {}).get('ledger_seq', 0) != expected_seq:
+                return False
+            for waste_type_id, price in price_table.items():
+                waste_type = data.get('waste_types', {}).get(waste_type_id)
+                if not waste_type:
+                    continue
+                history = waste_type.get('riwayat_harga') or [
+                    {"berlaku_mulai": "", "nilai_poin_per_kg": waste_type.get('nilai_poin_per_kg', 0)}
+                ]
+                history = [entry for entry in history if entry['berlaku_mulai'] < berlaku_mulai]
+                history.append({"berlaku_mulai": berlaku_mulai, "nilai_poin_per_kg": price})
+                waste_type['riwayat_harga'] = history
+                if berlaku_mulai <= today:
+                    waste_type['nilai_poin_per_kg'] = price
+            for transaction_data in adjustments:
+                self._append_ledger(data, transaction_data)
+            self._save_data(data)
+            return True
 
     def get_reward_by_id(self, reward_id):
         data = self._load_data()
         return data.get('rewards', {}).get(reward_id)
 
-    def get_all_pickups(self):
+    def get_all_pickups(self, include_archive=False):
         data = self._load_data()
-        return list(data.get('pickups', {}).values())
+        return self._with_archive('pickups', data.get('pickups', {}), include_archive)
 
     def get_pickups_by_user_id(self, user_id):
         data = self._load_data()
@@ -139,62 +484,674 @@ class DataRepository(BaseRepository):
                 tasks.append(pickup)
         return tasks
         
+    def get_pickups_by_ids(self, pickup_ids, user_id=None):
+        data = self._load_data()
+        return self._by_ids('pickups', data.get('pickups', {}), pickup_ids, user_id)
+
     def get_pickup_by_id(self, pickup_id):
         data = self._load_data()
         return data.get('pickups', {}).get(pickup_id)
 
     def save_pickup(self, pickup_data):
-        data = self._load_data()
-        if 'id' not in pickup_data:
-            pickup_data['id'] = f"p{uuid.uuid4().hex[:6]}"
-        if 'pickups' not in data:
-            data['pickups'] = {}
-        data['pickups'][pickup_data['id']] = pickup_data
-        self._save_data(data)
-        return pickup_data
+        with self._locked():
+            data = self._load_data()
+            if 'id' not in pickup_data:
+                pickup_data['id'] = f"p{uuid.uuid4().hex[:6]}"
+            self._put_pickup(data, pickup_data)
+            self._save_data(data)
+            return pickup_data
+
+    def book_pickup(self, pickup_data, slot_key, capacity, has_photo=False):
+        """
+        Menyimpan pickup hanya jika pengguna tidak terkena sanksi (dicek dari
+        record tersimpan, bukan indeks per worker) dan slotnya belum penuh;
+        pengecekan dan penambahan counter terjadi di bawah kunci yang sama.
+        Mengembalikan (pickup atau None, jumlah_terisi, alasan sanksi atau None).
+        """
+        with self._locked():
+            data = self._load_data()
+            counts = data.setdefault('slot_counts', {})
+            used = counts.get(slot_key, 0)
+            user = data.get('users', {}).get(pickup_data['user_id'])
+            alasan = pickup_block_reason(sanction_status(user), has_photo) if user else None
+            if alasan:
+                return None, used, alasan
+            if used >= capacity:
+                return None, used, None
+            if 'id' not in pickup_data:
+                pickup_data['id'] = f"p{uuid.uuid4().hex[:6]}"
+            self._put_pickup(data, pickup_data)
+            counts[slot_key] = used + 1
+            self._save_data(data)
+            return pickup_data, used + 1, None
+
+    def init_slot_counts(self, slot_key, today):
+        """
+        Mengembalikan counter slot dari database. Pada start pertama counter
+        dibangun dari pickup yang tanggalnya belum lewat.
+        """
+        with self._locked():
+            data = self._load_data()
+            if 'slot_counts' in data:
+                return data['slot_counts']
+            counts = {}
+            for pickup in data.get('pickups', {}).values():
+                if (pickup.get('tanggal') or '') >= today:
+                    key = slot_key(pickup)
+                    counts[key] = counts.get(key, 0) + 1
+            data['slot_counts'] = counts
+            self._save_data(data)
+            return counts
+
+    def get_slot_counts(self):
+        """Counter slot tersimpan (termasuk booking dari worker lain)."""
+        return self._load_data().get('slot_counts', {})
+
+    def prune_slot_counts(self, today):
+        """Membuang counter slot untuk tanggal yang sudah lewat."""
+        with self._locked():
+            data = self._load_data()
+            counts = data.get('slot_counts', {})
+            expired = [key for key in counts if key.split('|')[1] < today]
+            for key in expired:
+                del counts[key]
+            if expired:
+                self._save_data(data)
+            return expired
+
+    def claim_pickup(self, pickup_id, collector_id):
+        """
+        Menandai pickup 'menunggu' sebagai diambil oleh pengepul. Mengembalikan
+        pickup yang diperbarui, atau None jika sudah diambil/diproses.
+        """
+        with self._locked():
+            data = self._load_data()
+            pickup = data.get('pickups', {}).get(pickup_id)
+            if not pickup or pickup.get('status') != 'menunggu':
+                return None
+            if pickup.get('pengepul_id') not in (None, collector_id):
+                return None
+            pickup['pengepul_id'] = collector_id
+            self._add_ref(data, collector_id, 'tugas', pickup_id)
+            self._save_data(data)
+            return pickup
 
     def update_pickup(self, pickup_id, updated_data):
         """
         Metode baru: Mengupdate data penjemputan (misal: ubah status jadi pelanggaran).
         """
+        with self._locked():
+            data = self._load_data()
+            if 'pickups' in data and pickup_id in data['pickups']:
+                # Pastikan ID tetap konsisten
+                updated_data['id'] = pickup_id
+                self._put_pickup(data, updated_data)
+                self._save_data(data)
+                return True
+            return False
+
+    def get_all_transactions(self, include_archive=False):
+        data = self._load_data()
+        return self._with_archive('transactions', data.get('transactions', {}), include_archive)
+
+    def get_transactions_page(self, before=None, limit=50, include_archive=False):
+        """
+        Sampai `limit` transaksi dengan kunci (tanggal, id) terbesar di bawah
+        `before` (terbaru lebih dulu), untuk keyset pagination. Partisi arsip
+        dibuka dari bulan terbaru dan berhenti begitu jumlahnya cukup.
+        """
+        data = self._load_data()
+        hot = data.get('transactions', {})
+
+        def below(transaction):
+            return before is None or transaction_key(transaction) < before
+
+        page = heapq.nlargest(limit, filter(below, hot.values()), key=transaction_key)
+        if include_archive:
+            archived = []
+            for month in archive_store.months('transactions'):
+                if len(archived) >= limit:
+                    break
+                if before is not None and month > month_of({'tanggal': before[0]}):
+                    continue
+                archived.extend(dict(t) for t_id, t in archive_store.load_partition('transactions', month).items()
+                                if t_id not in hot and below(t))
+            page = heapq.nlargest(limit, page + archived, key=transaction_key)
+        return page
+
+    def iter_transactions(self, include_archive=False):
+        """
+        Semua transaksi satu per satu: database utama (terbaru lebih dulu),
+        lalu arsip per partisi bulanan dari yang terbaru, sehingga paling
+        banyak satu partisi arsip yang dimuat sekaligus.
+        """
+        hot = self._load_data().get('transactions', {})
+        yield from sorted(hot.values(), key=transaction_key, reverse=True)
+        if not include_archive:
+            return
+        for month in archive_store.months('transactions'):
+            partition = archive_store.load_partition('transactions', month)
+            yield from sorted((dict(t) for t_id, t in partition.items() if t_id not in hot),
+                              key=transaction_key, reverse=True)
+
+    def get_month_transactions(self, bulan):
+        """
+        Transaksi bertanggal pada bulan `bulan` ('YYYY-MM'): dari database
+        utama ditambah satu partisi arsip bulan itu (jika sudah diarsipkan).
+        """
+        data = self._load_data()
+        hot = {t_id: t for t_id, t in data.get('transactions', {}).items()
+               if (t.get('tanggal') or '')[:7] == bulan}
+        archived = archive_store.load_partition('transactions', bulan)
+        return [dict(t) for t_id, t in archived.items() if t_id not in hot] + list(hot.values())
+
+    def get_user_records(self, kind, user_id, exclude=()):
+        """
+        Record `kind` ('pickups' / 'transactions') milik pengguna di database
+        utama menurut indeks balik 'user_refs', kecuali id di `exclude`.
+        Record yang sudah diarsipkan tidak ikut (dibaca per partisi arsip).
+        """
+        data = self._load_data()
+        hot = data.get(kind, {})
+        return [hot[record_id] for record_id in data.get('user_refs', {}).get(user_id, {}).get(kind, [])
+                if record_id in hot and record_id not in exclude]
+
+    def get_transactions_by_ids(self, transaction_ids, user_id=None):
         data = self._load_data()
-        if 'pickups' in data and pickup_id in data['pickups']:
-            # Pastikan ID tetap konsisten
-            updated_data['id'] = pickup_id
-            data['pickups'][pickup_id] = updated_data
+        return self._by_ids('transactions', data.get('transactions', {}), transaction_ids, user_id)
+
+    def archive_old_records(self, cutoff):
+        """
+        Memindahkan pickup yang sudah ditutup dan transaksi bertanggal sebelum
+        `cutoff` ('YYYY-MM-DD') ke arsip bulanan. Tail ledger pengguna yang
+        terdampak dilipat dulu ke snapshot, sehingga saldo tidak lagi
+        membutuhkan transaksi yang diarsipkan. Arsip ditulis sebelum record
+        dihapus dari database utama; jika proses berhenti di tengah, record
+        hanya akan terarsip ulang (idempoten per id).
+        """
+        with self._locked():
+            data = self._load_data()
+            pickups = [
+                p for p in data.get('pickups', {}).values()
+                if p.get('status') in CLOSED_STATUSES and (p.get('tanggal') or '') < cutoff
+            ]
+            transactions = [
+                t for t in data.get('transactions', {}).values()
+                if 'seq' in t and (t.get('tanggal') or '') < cutoff
+            ]
+            if not pickups and not transactions:
+                return {"pickups": 0, "transactions": 0}
+
+            tails = data.get('ledger_tail', {})
+            for user_id in {t['user_id'] for t in transactions if t['user_id'] in tails}:
+                self._fold_tail(data, user_id)
+
+            archive_store.write('pickups', pickups)
+            archive_store.write('transactions', transactions)
+            for pickup in pickups:
+                del data['pickups'][pickup['id']]
+            for transaction in transactions:
+                del data['transactions'][transaction['id']]
+            self._save_data(data)
+            return {"pickups": len(pickups), "transactions": len(transactions)}
+
+    def snapshot_files(self, target_dir):
+        """
+        Snapshot konsisten database utama dan arsip ke `target_dir` untuk
+        backup. Karena setiap penulisan mengganti file secara atomik (file
+        baru + os.replace), hard link ke file saat ini sudah merupakan
+        salinan copy-on-write: penulis berikutnya membuat inode baru dan
+        isi yang di-link tidak pernah berubah. Kunci hanya dipegang selama
+        membuat link (beberapa milidetik), bukan selama backup ditulis.
+        """
+        archive_dir = os.path.join(target_dir, 'archive')
+        os.makedirs(archive_dir, exist_ok=True)
+        with self._locked():
+            self._link_or_copy(DB_FILE, os.path.join(target_dir, 'database.json'))
+            if archive_store.directory and os.path.isdir(archive_store.directory):
+                for name in os.listdir(archive_store.directory):
+                    if name.endswith(('.json.gz', 'index.json')):
+                        self._link_or_copy(os.path.join(archive_store.directory, name),
+                                           os.path.join(archive_dir, name))
+
+    def restore_snapshot(self, data, archive_dir):
+        """
+        Mengganti database utama dan isi arsip dengan hasil restore.
+        File arsip di `archive_dir` dipindahkan ke folder arsip; partisi yang
+        tidak ada di snapshot (dibuat setelah titik restore) dihapus.
+        """
+        with self._locked():
+            if archive_store.directory:
+                os.makedirs(archive_store.directory, exist_ok=True)
+                restored = set(os.listdir(archive_dir))
+                for name in os.listdir(archive_store.directory):
+                    if name.endswith(('.json.gz', 'index.json')) and name not in restored:
+                        os.remove(os.path.join(archive_store.directory, name))
+                for name in restored:
+                    os.replace(os.path.join(archive_dir, name), os.path.join(archive_store.directory, name))
+            # Versi pengguna harus naik dari nilai saat ini, bukan nilai di snapshot
+            current = self._load_data().get('meta', {}).get('users_version', 0)
+            data.setdefault('meta', {})['users_version'] = max(current, data['meta'].get('users_version', 0))
+            self._touch_users(data)
+            self._save_data(data)
+
+    def export_data(self):
+        """Salinan lengkap database utama (dipakai perintah split-shards)."""
+        with self._locked():
+            return self._load_data()
+
+    @staticmethod
+    def _link_or_copy(source, target):
+        if not os.path.exists(source):
+            return
+        try:
+            os.link(source, target)
+        except OSError:
+            # Sistem file tanpa hard link: salin (tetap di bawah kunci)
+            shutil.copy2(source, target)
+
+    def confirm_pickup_transaction(self, pickup_data, transaction_data):
+        """
+        Menyelesaikan penjemputan dan mencatat event poin ke ledger dalam
+        satu penulisan. Mengembalikan False jika pickup sudah selesai
+        (misal dikonfirmasi bersamaan oleh pengepul lain).
+        """
+        with self._locked():
+            data = self._load_data()
+            if 'pickups' not in data: data['pickups'] = {}
+            current = data['pickups'].get(pickup_data['id'])
+            if current and current.get('status') == 'selesai':
+                return False
+            self._put_pickup(data, pickup_data)
+
+            self._append_ledger(data, transaction_data)
+
             self._save_data(data)
             return True
-        return False
 
-    def get_all_transactions(self):
+    def redeem_reward_transaction(self, user_data, transaction_data, reward_id):
+        """
+        Mencatat penukaran reward ke ledger. Saldo, stok, dan batas per
+        pengguna dicek di dalam kunci, lalu stok dikurangi, counter
+        penukaran ditambah, dan transaksi ditulis dalam satu penyimpanan,
+        sehingga penukaran bersamaan tidak bisa membuat saldo minus atau
+        stok terjual melebihi jumlahnya.
+        Mengembalikan (alasan gagal atau None, sisa_stok, jumlah_ditukar).
+        """
+        with self._locked():
+            data = self._load_data()
+            reward = data.get('rewards', {}).get(reward_id)
+            if not reward:
+                return ALASAN_REWARD, None, 0
+            per_user = data.setdefault('reward_redemptions', {}).setdefault(reward_id, {})
+            ditukar = per_user.get(user_data['id'], 0)
+            stok = reward.get('stok')
+            batas = reward.get('batas_per_pengguna')
+            if stok is not None and stok <= 0:
+                return ALASAN_STOK, stok, ditukar
+            if batas is not None and ditukar >= batas:
+                return ALASAN_BATAS, stok, ditukar
+            saldo_fp = self._balance_fp(data, user_data['id'])
+            if saldo_fp + transaction_data['jumlah_poin_fp'] < 0:
+                return ALASAN_SALDO, stok, ditukar
+
+            if stok is not None:
+                stok -= 1
+                reward['stok'] = stok
+            per_user[user_data['id']] = ditukar + 1
+            self._append_ledger(data, transaction_data)
+
+            self._save_data(data)
+            return None, stok, ditukar + 1
+
+    def update_reward_stock(self, reward_id, stok, batas_per_pengguna):
+        """Mengatur stok dan batas penukaran per pengguna (None = tak terbatas)."""
+        with self._locked():
+            data = self._load_data()
+            reward = data.get('rewards', {}).get(reward_id)
+            if not reward:
+                return None
+            reward['stok'] = stok
+            reward['batas_per_pengguna'] = batas_per_pengguna
+            self._save_data(data)
+            return reward
+
+    def get_master_data(self):
+        """Jenis sampah & reward sebagai dict {id: record} (replikasi antar node)."""
         data = self._load_data()
-        return list(data.get('transactions', {}).values())
+        return {"waste_types": data.get('waste_types', {}), "rewards": data.get('rewards', {})}
+
+    def replace_master_data(self, waste_types, rewards):
+        """
+        Menimpa data master (jenis sampah & definisi reward) dengan salinan
+        dari node pusat. Stok reward tetap milik cabang ini (barang fisik
+        ada di cabang), jadi nilai 'stok' lokal dipertahankan. Mengembalikan
+        True jika ada perubahan.
+        """
+        with self._locked():
+            data = self._load_data()
+            local_rewards = data.get('rewards', {})
+            rewards = {
+                reward_id: dict(reward, stok=local_rewards[reward_id].get('stok'))
+                if reward_id in local_rewards else reward
+                for reward_id, reward in rewards.items()
+            }
+            if data.get('waste_types') == waste_types and local_rewards == rewards:
+                return False
+            data['waste_types'] = waste_types
+            data['rewards'] = rewards
+            self._save_data(data)
+            return True
 
-    def confirm_pickup_transaction(self, pickup_data, transaction_data, user_data):
+    def get_reward_inventory(self):
+        """Stok reward dan counter penukaran per pengguna (tanpa riwayat transaksi)."""
         data = self._load_data()
-        if 'pickups' not in data: data['pickups'] = {}
-        data['pickups'][pickup_data['id']] = pickup_data
-        
-        if 'id' not in transaction_data:
-            transaction_data['id'] = f"t{uuid.uuid4().hex[:6]}"
-        if 'transactions' not in data: data['transactions'] = {}
-        data['transactions'][transaction_data['id']] = transaction_data
-        
-        if 'users' not in data: data['users'] = {}
-        data['users'][user_data['id']] = user_data
-        
-        self._save_data(data)
-        return True
+        return {
+            "rewards": list(data.get('rewards', {}).values()),
+            "redemptions": data.get('reward_redemptions', {}),
+        }
+
+    def init_reward_inventory(self):
+        """
+        Seperti get_reward_inventory, tetapi pada start pertama counter
+        penukaran per pengguna dibangun dari transaksi redeem lama. Transaksi
+        lama belum punya 'reward_id' sehingga dicocokkan lewat nama reward.
+        """
+        with self._locked():
+            data = self._load_data()
+            if 'reward_redemptions' not in data:
+                rewards = data.get('rewards', {})
+                by_name = {f"Tukar: {r.get('nama')}": r['id'] for r in rewards.values()}
+                counts = {}
+                for transaction in data.get('transactions', {}).values():
+                    if transaction.get('tipe') != 'redeem_reward':
+                        continue
+                    reward_id = transaction.get('reward_id') or by_name.get(transaction.get('deskripsi'))
+                    if reward_id in rewards:
+                        per_user = counts.setdefault(reward_id, {})
+                        per_user[transaction['user_id']] = per_user.get(transaction['user_id'], 0) + 1
+                data['reward_redemptions'] = counts
+                self._save_data(data)
+            return {
+                "rewards": list(data.get('rewards', {}).values()),
+                "redemptions": data['reward_redemptions'],
+            }
+
+    def report_violation_transaction(self, pickup_data, user_data):
+        """
+        Menyimpan status pelanggaran penjemputan dan sanksi pengguna
+        dalam satu kali penulisan.
+        """
+        with self._locked():
+            data = self._load_data()
+            self._put_pickup(data, pickup_data)
 
-    def redeem_reward_transaction(self, user_data, transaction_data):
+            if 'users' not in data: data['users'] = {}
+            data['users'][user_data['id']] = user_data
+            self._touch_users(data)
+
+            self._save_data(data)
+            return True
+
+    def add_notification(self, notification_data):
+        with self._locked():
+            data = self._load_data()
+            if 'id' not in notification_data:
+                notification_data['id'] = f"n{uuid.uuid4().hex[:6]}"
+            if 'notifications' not in data: data['notifications'] = {}
+            data['notifications'][notification_data['id']] = notification_data
+            self._add_ref(data, notification_data.get('user_id'), 'notifications', notification_data['id'])
+            self._save_data(data)
+            return notification_data
+
+    def get_notifications_by_user_id(self, user_id):
+        data = self._load_data()
+        notifications = []
+        for notification in data.get('notifications', {}).values():
+            if notification['user_id'] == user_id:
+                notifications.append(notification)
+        return notifications
+
+    # --- LEDGER POIN (event sourcing) ---
+    # Saldo = snapshot per pengguna + tail (event setelah snapshot).
+    # Tail dilipat ke snapshot setiap `snapshot_every` event sehingga
+    # pembacaan saldo tidak bertambah mahal seiring riwayat bertambah.
+
+    snapshot_every = 50
+
+    def get_balance_fp(self, user_id):
+        """Saldo poin pengguna dalam satuan fixed-point (integer)."""
+        data = self._load_data()
+        return self._balance_fp(data, user_id)
+
+    def get_balances_fp(self, user_ids):
+        data = self._load_data()
+        return {user_id: self._balance_fp(data, user_id) for user_id in user_ids}
+
+    def get_ledger_data(self):
+        """
+        Data mentah ledger untuk rekonsiliasi. Hanya transaksi di database
+        utama; transaksi arsip dibaca per partisi lewat
+        `iter_archived_transactions`.
+        """
+        data = self._load_data()
+        return {
+            "transactions": data.get('transactions', {}),
+            "balance_snapshots": data.get('balance_snapshots', {}),
+            "ledger_tail": data.get('ledger_tail', {}),
+            "users": data.get('users', {}),
+        }
+
+    def iter_archived_transactions(self, exclude=()):
+        """
+        Transaksi di arsip bulanan satu per satu (partisi terlama lebih
+        dulu), kecuali id di `exclude` (yang masih ada di database utama).
+        """
+        for transaction in archive_store.iter_records('transactions'):
+            if transaction['id'] not in exclude:
+                yield transaction
+
+    def build_user_refs(self):
+        """
+        Migrasi satu kali: membangun indeks balik 'user_refs' dari seluruh
+        pickup, transaksi, dan notifikasi (termasuk arsip). Setelah itu
+        indeks dijaga setiap kali record ditulis. Mengembalikan jumlah
+        pengguna yang terindeks, atau None jika indeks sudah ada.
+        """
+        with self._locked():
+            data = self._load_data()
+            meta = data.setdefault('meta', {})
+            if meta.get('user_refs'):
+                return None
+            data['user_refs'] = {}
+            for pickup in list(archive_store.iter_records('pickups')) + list(data.get('pickups', {}).values()):
+                self._add_ref(data, pickup.get('user_id'), 'pickups', pickup['id'])
+                self._add_ref(data, pickup.get('pengepul_id'), 'tugas', pickup['id'])
+            for transaction in list(archive_store.iter_records('transactions')) + list(data.get('transactions', {}).values()):
+                self._add_ref(data, transaction.get('user_id'), 'transactions', transaction['id'])
+            for notification in data.get('notifications', {}).values():
+                self._add_ref(data, notification.get('user_id'), 'notifications', notification['id'])
+            meta['user_refs'] = True
+            self._save_data(data)
+            return len(data['user_refs'])
+
+    def get_integrity_data(self):
+        """
+        Data mentah untuk pemeriksaan integritas referensial: record hot &
+        arsip (ditandai 'arsip'), id pengguna aktif dan tombstone, id jenis
+        sampah, serta data ledger untuk membandingkan saldo.
+        """
         data = self._load_data()
+        records = {}
+        for kind in ('pickups', 'transactions'):
+            hot = data.get(kind, {})
+            records[kind] = [dict(record, arsip=True) for record in archive_store.iter_records(kind)
+                             if record['id'] not in hot]
+            records[kind].extend(hot.values())
+        records['notifications'] = list(data.get('notifications', {}).values())
+        return {
+            "records": records,
+            "users": set(data.get('users', {})),
+            "deleted_users": set(data.get('deleted_users', {})),
+            "waste_types": set(data.get('waste_types', {})),
+            "ledger": {key: data.get(key, {}) for key in ('transactions', 'balance_snapshots', 'ledger_tail')},
+        }
+
+    def repair_integrity(self, issues, balances):
+        """
+        Memperbaiki temuan pemeriksaan integritas dalam satu penulisan.
+        Setiap temuan diperiksa ulang di bawah kunci karena data bisa sudah
+        berubah sejak pemindaian:
+
+        - pickup menunggu milik pengguna yang tidak ada dihapus,
+        - pickup terbuka dengan pengepul yang tidak ada dilepas ke antrean,
+        - referensi lain ke pengguna yang tidak ada dibuatkan tombstone,
+        - saldo yang drift disetel ulang dari hasil replay riwayat
+          (`balances` = {user_id: saldo_fp}; hanya jika riwayat pengguna
+          itu tidak berubah sejak replay).
+
+        Jenis sampah yang tidak dikenal hanya dilaporkan. Mengembalikan
+        jumlah perbaikan per jenis.
+        """
+        with self._locked():
+            data = self._load_data()
+            users = data.get('users', {})
+            tombstones = data.setdefault('deleted_users', {})
+            pickups = data.get('pickups', {})
+            fixed = {"pickup_dihapus": 0, "tugas_dilepas": 0, "tombstone": 0, "saldo": 0}
+
+            def missing(user_id):
+                return user_id and user_id not in users and user_id not in tombstones
+
+            for issue in issues:
+                user_id = issue['ref']
+                if issue['jenis'] not in ('pengguna_hilang', 'pengepul_hilang') or not missing(user_id):
+                    continue
+                pickup = pickups.get(issue['id']) if issue['koleksi'] == 'pickups' else None
+                if pickup and pickup.get('status') == 'menunggu':
+                    if issue['jenis'] == 'pengguna_hilang' and pickup.get('user_id') == user_id:
+                        del pickups[issue['id']]
+                        fixed['pickup_dihapus'] += 1
+                        continue
+                    if issue['jenis'] == 'pengepul_hilang' and pickup.get('pengepul_id') == user_id:
+                        pickup['pengepul_id'] = None
+                        fixed['tugas_dilepas'] += 1
+                        continue
+                tombstones[user_id] = tombstone_of({"id": user_id, "role": None})
+                fixed['tombstone'] += 1
+
+            transactions = data.get('transactions', {})
+            for user_id, (saldo_fp, jumlah) in balances.items():
+                history = [t for t in transactions.values() if t.get('user_id') == user_id]
+                history.extend(archive_store.iter_records('transactions', user_id))
+                ids = {t['id'] for t in history}
+                if len(ids) != jumlah:
+                    continue  # ada transaksi baru sejak replay; periksa ulang
+                data.get('ledger_tail', {}).pop(user_id, None)
+                data.setdefault('balance_snapshots', {})[user_id] = {
+                    "saldo_fp": saldo_fp,
+                    "seq": max((t.get('seq', 0) for t in history), default=0),
+                    "jumlah_transaksi": jumlah,
+                }
+                fixed['saldo'] += 1
+
+            if any(fixed.values()):
+                self._save_data(data)
+            return fixed
+
+    def snapshot_all_balances(self):
+        """Melipat semua tail ke snapshot (dijalankan berkala)."""
+        with self._locked():
+            data = self._load_data()
+            user_ids = list(data.get('ledger_tail', {}).keys())
+            for user_id in user_ids:
+                self._fold_tail(data, user_id)
+            if user_ids:
+                self._save_data(data)
+            return len(user_ids)
+
+    def migrate_ledger(self, to_fixed):
+        """
+        Migrasi satu kali untuk transaksi lama: memberi nomor urut (seq) dan
+        nilai fixed-point, lalu membangun snapshot saldo dari seluruh riwayat.
+        """
+        with self._locked():
+            data = self._load_data()
+            transactions = data.get('transactions', {})
+            legacy = [t for t in transactions.values() if 'seq' not in t]
+            if not legacy:
+                return 0
+
+            meta = data.setdefault('meta', {})
+            legacy.sort(key=lambda t: (t.get('tanggal') or '', t['id']))
+            for transaction in legacy:
+                meta['ledger_seq'] = meta.get('ledger_seq', 0) + 1
+                transaction['seq'] = meta['ledger_seq']
+                transaction['jumlah_poin_fp'] = to_fixed(transaction.get('jumlah_poin', 0))
+                data.setdefault('ledger_tail', {}).setdefault(transaction['user_id'], []).append(transaction['id'])
+
+            for user_id in list(data.get('ledger_tail', {}).keys()):
+                self._fold_tail(data, user_id)
+            self._save_data(data)
+            return len(legacy)
+
+    @staticmethod
+    def _with_archive(kind, hot, include_archive):
+        # Record di database utama menang jika (setelah arsip gagal di tengah) ada duplikat
+        if not include_archive:
+            return list(hot.values())
+        archived = [record for record in archive_store.iter_records(kind) if record['id'] not in hot]
+        return archived + list(hot.values())
+
+    @staticmethod
+    def _by_ids(kind, hot, ids, user_id):
+        missing = [record_id for record_id in ids if record_id not in hot]
+        archived = archive_store.find(kind, missing, user_id) if missing else {}
+        return [hot.get(record_id) or archived[record_id]
+                for record_id in ids if record_id in hot or record_id in archived]
+
+    def _put_pickup(self, data, pickup_data):
+        data.setdefault('pickups', {})[pickup_data['id']] = pickup_data
+        self._add_ref(data, pickup_data.get('user_id'), 'pickups', pickup_data['id'])
+        self._add_ref(data, pickup_data.get('pengepul_id'), 'tugas', pickup_data['id'])
+
+    def _balance_fp(self, data, user_id):
+        snapshot = data.get('balance_snapshots', {}).get(user_id, {})
+        balance = snapshot.get('saldo_fp', 0)
+        transactions = data.get('transactions', {})
+        for transaction_id in data.get('ledger_tail', {}).get(user_id, []):
+            transaction = transactions.get(transaction_id)
+            if transaction:
+                balance += transaction['jumlah_poin_fp']
+        return balance
+
+    def _append_ledger(self, data, transaction_data):
+        meta = data.setdefault('meta', {})
+        meta['ledger_seq'] = meta.get('ledger_seq', 0) + 1
+        transaction_data['seq'] = meta['ledger_seq']
+
         if 'id' not in transaction_data:
             transaction_data['id'] = f"t{uuid.uuid4().hex[:6]}"
         if 'transactions' not in data: data['transactions'] = {}
         data['transactions'][transaction_data['id']] = transaction_data
-        
-        if 'users' not in data: data['users'] = {}
-        data['users'][user_data['id']] = user_data
-        
-        self._save_data(data)
-        return True
\ No newline at end of file
+        self._add_ref(data, transaction_data['user_id'], 'transactions', transaction_data['id'])
+
+        tail = data.setdefault('ledger_tail', {}).setdefault(transaction_data['user_id'], [])
+        tail.append(transaction_data['id'])
+        if len(tail) >= self.snapshot_every:
+            self._fold_tail(data, transaction_data['user_id'])
+
+    def _fold_tail(self, data, user_id):
+        tail = data.get('ledger_tail', {}).pop(user_id, [])
+        if not tail:
+            return
+        snapshots = data.setdefault('balance_snapshots', {})
+        snapshot = snapshots.setdefault(user_id, {"saldo_fp": 0, "seq": 0, "jumlah_transaksi": 0})
+        transactions = data.get('transactions', {})
+        for transaction_id in tail:
+            transaction = transactions.get(transaction_id)
+            if not transaction:
+                continue
+            snapshot['saldo_fp'] += transaction['jumlah_poin_fp']
+            snapshot['seq'] = max(snapshot['seq'], transaction['seq'])
+            snapshot['jumlah_transaksi'] += 1
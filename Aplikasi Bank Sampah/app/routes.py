@@ -1,7 +1,15 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
+import csv
+import io
+from flask import Blueprint, current_app, render_template, redirect, url_for, flash, request, abort, jsonify, Response, stream_with_context
 from flask_login import login_required, current_user
 from app.auth import role_required
 from app.services import PenggunaService, PengepulService, AdminService
+from app.archive import archive_store
+from app.backup import backup_manager
+from app.feed import task_feed
+from app.tasks import job_queue
+from app.ratelimit import login_guard
+from app.sharding import shard_router
 
 # Membuat Blueprint utama untuk aplikasi
 main_bp = Blueprint('main', __name__)
@@ -11,6 +19,17 @@ user_service = PenggunaService()
 collector_service = PengepulService()
 admin_service = AdminService()
 
+# Jumlah baris per halaman pada manajemen pengguna
+USERS_PER_PAGE = 25
+HISTORY_PER_PAGE = 20
+TRANSACTIONS_PER_PAGE = 50
+
+def flash_shard_failures():
+    """Peringatan jika laporan lintas shard tidak lengkap (ada node yang tidak bisa dihubungi)."""
+    failed = shard_router.failures()
+    if failed:
+        flash(f"Data dari shard {', '.join(failed)} tidak tersedia; laporan belum lengkap.", 'warning')
+
 # --- Rute Utama dan Dasbor ---
 
 @main_bp.route('/')
@@ -39,9 +58,12 @@ def dashboard():
         return render_template('dashboard_pengepul.html', title="Dasbor Pengepul", tasks=tasks)
         
     elif current_user.is_role('admin'):
-        # UPDATE: Mengambil data user agar fitur pantau pelanggaran di dashboard admin berfungsi
-        all_users = admin_service.get_all_user_accounts()
-        return render_template('dashboard_admin.html', title="Dasbor Admin", users=all_users)
+        # Daftar pantau pelanggaran diambil dari indeks pengguna yang terkena sanksi
+        sanctioned_users = admin_service.get_sanctioned_users()
+        leaderboards = admin_service.get_leaderboards()
+        flash_shard_failures()
+        return render_template('dashboard_admin.html', title="Dasbor Admin", users=sanctioned_users,
+                               leaderboards=leaderboards)
         
     else:
         # Jika peran tidak dikenali, logout saja
@@ -53,11 +75,11 @@ def dashboard():
 @login_required
 @role_required('pengguna')
 def schedule_pickup():
-    # --- LOGIKA UNTUK TESTING (Ubah True agar muncul di localhost) ---
-    is_banned = False           # Set True untuk tes tampilan Shadow Ban
-    needs_verify = True          # Set True untuk tes tampilan Upload Foto
-    ban_expiry = "2025-12-30"    # Contoh tanggal kadaluarsa ban
-    # -----------------------------------------------------------------
+    # Status sanksi diambil dari indeks sanksi (O(1) per request)
+    sanction = user_service.get_sanction_status(current_user.id)
+    is_banned = sanction['is_shadow_banned']
+    needs_verify = sanction['needs_extra_verification']
+    ban_expiry = sanction['ban_until']
 
     if request.method == 'POST':
         if is_banned:
@@ -89,6 +111,18 @@ def schedule_pickup():
                            needs_extra_verification=needs_verify,
                            ban_until=ban_expiry)
 
+@main_bp.route('/schedule_pickup/slots')
+@login_required
+@role_required('pengguna')
+def pickup_slots():
+    """
+    Ketersediaan slot penjemputan di area pengguna untuk satu tanggal (JSON).
+    """
+    slots = user_service.get_slot_availability(current_user.data, request.args.get('tanggal'))
+    if slots is None:
+        return jsonify({"error": "Tanggal tidak valid."}), 400
+    return jsonify({"tanggal": request.args.get('tanggal'), "slots": slots})
+
 @main_bp.route('/rewards')
 @login_required
 @role_required('pengguna')
@@ -96,8 +130,41 @@ def reward_catalog():
     """
     Menampilkan katalog reward yang bisa ditukar.
     """
-    rewards = user_service.get_rewards_catalog()
-    return render_template('reward_catalog.html', title="Katalog Reward", rewards=rewards)
+    rewards = user_service.get_rewards_catalog(current_user.id)
+    saldo = user_service.get_user_balance(current_user.id)
+    return render_template('reward_catalog.html', title="Katalog Reward", rewards=rewards, saldo=saldo)
+
+@main_bp.route('/history')
+@login_required
+@role_required('pengguna')
+def user_history():
+    """
+    Riwayat penjemputan atau transaksi poin, terbaru lebih dulu.
+    Halaman berikutnya diminta dengan parameter `cursor`.
+    """
+    jenis = request.args.get('jenis', 'pickups')
+    result, error = user_service.get_user_history(
+        current_user.id, jenis, request.args.get('cursor'), HISTORY_PER_PAGE
+    )
+    if error:
+        flash(error, 'danger')
+        return redirect(url_for('main.user_history'))
+    return render_template('history.html', title="Riwayat", history=result)
+
+@main_bp.route('/history/data')
+@login_required
+@role_required('pengguna')
+def user_history_data():
+    """
+    Versi JSON riwayat pengguna: ?jenis=pickups|transaksi&cursor=...&limit=...
+    """
+    limit = min(max(request.args.get('limit', HISTORY_PER_PAGE, type=int), 1), 100)
+    result, error = user_service.get_user_history(
+        current_user.id, request.args.get('jenis', 'pickups'), request.args.get('cursor'), limit
+    )
+    if error:
+        return jsonify({"error": error}), 400
+    return jsonify(result)
 
 @main_bp.route('/redeem_reward/<string:reward_id>', methods=['POST'])
 @login_required
@@ -163,6 +230,47 @@ def confirm_pickup(pickup_id):
                            pickup_id=pickup_id,
                            waste_types=waste_types)
 
+@main_bp.route('/claim_pickup/<string:pickup_id>', methods=['POST'])
+@login_required
+@role_required('pengepul')
+def claim_pickup(pickup_id):
+    """
+    Pengepul mengambil tugas penjemputan.
+    """
+    ok, message = collector_service.claim_pickup(pickup_id, current_user.id)
+    flash(message, 'success' if ok else 'danger')
+    return redirect(url_for('main.dashboard'))
+
+@main_bp.route('/collector/feed')
+@login_required
+@role_required('pengepul')
+def collector_feed():
+    """
+    Feed tugas langsung (Server-Sent Events) untuk area pengepul.
+    Klien yang tersambung ulang mengirim Last-Event-ID untuk event terlewat.
+    """
+    area = collector_service.get_collector_area(current_user.data)
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    subscription = task_feed.subscribe(area)
+    return Response(
+        stream_with_context(task_feed.stream(subscription, last_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@main_bp.route('/collector/tasks/<string:pickup_id>/card')
+@login_required
+@role_required('pengepul')
+def collector_task_card(pickup_id):
+    """
+    Potongan HTML satu kartu tugas untuk pembaruan dari feed.
+    204 berarti tugas tidak lagi ditampilkan untuk pengepul ini.
+    """
+    task = collector_service.get_collector_task(current_user.id, pickup_id)
+    if not task:
+        return '', 204
+    return render_template('collector_task_card.html', task=task)
+
 @main_bp.route('/report-violation/<string:pickup_id>', methods=['POST'])
 @login_required
 @role_required('pengepul')
@@ -190,8 +298,33 @@ def admin_manage_users():
     """
     Halaman admin untuk mengelola pengguna.
     """
-    users = admin_service.get_all_user_accounts()
-    return render_template('admin_manage_users.html', title="Manajemen Pengguna", users=users)
+    query = request.args.get('q', '')
+    page = request.args.get('page', 1, type=int)
+    result = admin_service.search_user_accounts(query, page, USERS_PER_PAGE)
+    return render_template('admin_manage_users.html', title="Manajemen Pengguna",
+                           users=result['users'], result=result, query=query)
+
+@main_bp.route('/admin/users/search')
+@login_required
+@role_required('admin')
+def admin_search_users():
+    """
+    Endpoint JSON untuk pencarian pengguna secara bertahap saat admin mengetik.
+    Mengembalikan data pengguna beserta potongan HTML baris tabel.
+    """
+    query = request.args.get('q', '')
+    page = request.args.get('page', 1, type=int)
+    result = admin_service.search_user_accounts(query, page, USERS_PER_PAGE)
+    return jsonify({
+        "users": [
+            {field: user.get(field) for field in ('id', 'nama', 'email', 'role', 'alamat', 'area_tugas')}
+            for user in result['users']
+        ],
+        "total": result['total'],
+        "page": result['page'],
+        "pages": result['pages'],
+        "html": render_template('admin_user_rows.html', users=result['users']),
+    })
 
 @main_bp.route('/admin/users/add', methods=['POST'])
 @login_required
@@ -214,6 +347,35 @@ def admin_add_user():
         
     return redirect(url_for('main.admin_manage_users'))
 
+@main_bp.route('/admin/users/import', methods=['POST'])
+@login_required
+@role_required('admin')
+def admin_import_users():
+    """
+    Rute untuk impor pengguna massal dari file CSV (kolom: nama, email,
+    password, role, alamat, area_tugas).
+    """
+    berkas = request.files.get('berkas')
+    if not berkas or not berkas.filename:
+        flash("Pilih file CSV terlebih dahulu.", 'danger')
+        return redirect(url_for('main.admin_manage_users'))
+    if (request.content_length or 0) > current_app.config['IMPORT_MAX_BYTES']:
+        flash("File CSV terlalu besar.", 'danger')
+        return redirect(url_for('main.admin_manage_users'))
+
+    report, error = admin_service.import_user_accounts(berkas.stream)
+    if error:
+        flash(error, 'danger')
+        return redirect(url_for('main.admin_manage_users'))
+
+    flash(f"{report['diimpor']} pengguna berhasil diimpor dalam {report['durasi_detik']} detik.", 'success')
+    # Hanya beberapa baris pertama yang ditampilkan; laporan lengkap lewat CLI
+    for item in report['ditolak'][:10]:
+        flash(f"Baris {item['baris']} ({item['email'] or '-'}): {item['alasan']}", 'danger')
+    if len(report['ditolak']) > 10:
+        flash(f"... dan {len(report['ditolak']) - 10} baris lain ditolak.", 'danger')
+    return redirect(url_for('main.admin_manage_users'))
+
 @main_bp.route('/admin/master_data', methods=['GET', 'POST'])
 @login_required
 @role_required('admin')
@@ -232,7 +394,16 @@ def admin_manage_master_data():
             nama = request.form.get('reward_nama')
             deskripsi = request.form.get('reward_deskripsi')
             poin = request.form.get('reward_poin')
-            ok, message = admin_service.add_new_reward(nama, deskripsi, poin)
+            stok = request.form.get('reward_stok')
+            batas = request.form.get('reward_batas')
+            ok, message = admin_service.add_new_reward(nama, deskripsi, poin, stok, batas)
+
+        elif form_type == 'reward_stock':
+            ok, message = admin_service.update_reward_stock(
+                request.form.get('reward_id'),
+                request.form.get('reward_stok'),
+                request.form.get('reward_batas')
+            )
         
         if ok:
             flash(message, 'success')
@@ -249,20 +420,124 @@ def admin_manage_master_data():
         rewards=data['rewards']
     )
 
+@main_bp.route('/admin/master_data/reprice', methods=['POST'])
+@login_required
+@role_required('admin')
+def admin_reprice_waste_types():
+    """
+    Simulasi atau penerapan harga baru jenis sampah dengan tanggal berlaku.
+    """
+    form_prices = {
+        key.split('harga_', 1)[-1]: value
+        for key, value in request.form.items() if key.startswith('harga_')
+    }
+    berlaku_mulai = request.form.get('berlaku_mulai')
+
+    if request.form.get('action') == 'apply':
+        sesuaikan_poin = request.form.get('sesuaikan_poin') == 'on'
+        result, message = admin_service.apply_waste_repricing(form_prices, berlaku_mulai, sesuaikan_poin)
+    else:
+        result, message = admin_service.simulate_waste_repricing(form_prices, berlaku_mulai)
+
+    flash(message, 'success' if result else 'danger')
+    if not result:
+        return redirect(url_for('main.admin_manage_master_data'))
+
+    data = admin_service.get_master_data()
+    return render_template(
+        'admin_manage_master_data.html',
+        title="Manajemen Data Master",
+        waste_types=data['waste_types'],
+        rewards=data['rewards'],
+        repricing=result,
+        form_prices=form_prices,
+        berlaku_mulai=berlaku_mulai
+    )
+
 @main_bp.route('/admin/transactions')
 @login_required
 @role_required('admin')
 def admin_monitor_transactions():
     """
-    Halaman admin untuk memonitor semua transaksi.
+    Halaman admin untuk memonitor semua transaksi, terbaru lebih dulu.
+    Halaman berikutnya diminta dengan parameter `cursor`.
     """
-    transactions = admin_service.get_all_transactions()
+    include_archive = request.args.get('arsip') == '1'
+    page, error = admin_service.get_transactions_page(include_archive, request.args.get('cursor'),
+                                                      TRANSACTIONS_PER_PAGE)
+    if error:
+        flash(error, 'danger')
+        return redirect(url_for('main.admin_monitor_transactions', arsip=1 if include_archive else None))
+    flash_shard_failures()
     return render_template(
         'admin_monitor_transactions.html',
         title="Monitor Transaksi",
-        transactions=transactions
+        transactions=page['items'],
+        next_cursor=page['next_cursor'],
+        include_archive=include_archive
     )
 
+@main_bp.route('/admin/transactions/export.csv')
+@login_required
+@role_required('admin')
+def admin_export_transactions():
+    """
+    Ekspor seluruh transaksi (termasuk arsip bulanan) sebagai CSV. Baris
+    dialirkan per shard dan per partisi arsip, tanpa memuat semuanya dulu.
+    """
+    transactions = admin_service.iter_all_transactions()
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['id', 'tanggal', 'user_id', 'nama_pengguna', 'tipe', 'deskripsi', 'jumlah_poin'])
+        for t in transactions:
+            writer.writerow([t['id'], t.get('tanggal'), t['user_id'], t.get('user_nama'),
+                             t.get('tipe'), t.get('deskripsi'), t.get('jumlah_poin')])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    return Response(stream_with_context(generate()), mimetype='text/csv',
+                    headers={"Content-Disposition": "attachment; filename=transaksi.csv"})
+
+@main_bp.route('/admin/analytics')
+@login_required
+@role_required('admin')
+def admin_analytics():
+    """
+    Dasbor analitik admin (grafik dari agregat kolom NumPy).
+    """
+    result, error = admin_service.get_analytics(request.args.get('mulai'), request.args.get('sampai'))
+    if error:
+        flash(error, 'danger')
+        result, _ = admin_service.get_analytics()
+    flash_shard_failures()
+    return render_template('admin_analytics.html', title="Analitik", analytics=result)
+
+@main_bp.route('/admin/analytics/data')
+@login_required
+@role_required('admin')
+def admin_analytics_data():
+    """
+    Agregat analitik dalam format JSON, misal ?mulai=2025-01-01&sampai=2025-12-31.
+    """
+    result, error = admin_service.get_analytics(request.args.get('mulai'), request.args.get('sampai'))
+    if error:
+        return jsonify({"error": error}), 400
+    return jsonify(result)
+
+@main_bp.route('/admin/metrics')
+@login_required
+@role_required('admin')
+def admin_metrics():
+    """
+    Metrik operasional dalam format JSON (misal: kedalaman antrean job).
+    """
+    return jsonify({"jobs": job_queue.stats(), "rate_limit": login_guard.stats(), "feed": task_feed.stats(),
+                    "archive": archive_store.stats(), "backup": backup_manager.stats()})
+
 @main_bp.route('/admin/users/edit/<string:user_id>', methods=['POST'])
 @login_required
 @role_required('admin')
@@ -288,9 +563,10 @@ def admin_edit_user(user_id):
 @role_required('admin')
 def admin_delete_user(user_id):
     """
-    Rute untuk menghapus akun pengguna secara permanen.
+    Rute untuk menghapus akun pengguna secara permanen. Field opsional
+    'mode' ('anonim'/'kaskade') menimpa USER_DELETE_MODE.
     """
-    ok, message = admin_service.delete_user_account(user_id)
+    ok, message = admin_service.delete_user_account(user_id, request.form.get('mode'))
     
     if ok:
         flash(message, 'success')
@@ -0,0 +1,167 @@
+import heapq
+import threading
+from datetime import date, datetime
+
+# Format tanggal yang pernah tersimpan di field 'ban_until'
+BAN_DATE_FORMATS = ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%Y/%m/%d')
+
+# Alasan penjadwalan pickup ditolak karena sanksi
+SANKSI_BAN = 'ban'
+SANKSI_FOTO = 'foto'
+
+
+def normalize_ban_date(value):
+    """
+    Mengubah nilai 'ban_until' (format campuran) menjadi string ISO
+    'YYYY-MM-DD'. Mengembalikan None jika kosong atau tidak dikenali.
+    """
+    if not value:
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m-%d')
+    for fmt in BAN_DATE_FORMATS:
+        try:
+            return datetime.strptime(str(value).strip(), fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return None
+
+
+def sanction_status(record, today=None):
+    """
+    Status sanksi dari record pengguna (atau entri indeks):
+    {'is_shadow_banned', 'needs_extra_verification', 'ban_until'}.
+    Ban yang sudah lewat tanggalnya dianggap tidak aktif walaupun sweep
+    belum berjalan.
+    """
+    today = today or date.today().strftime('%Y-%m-%d')
+    ban_until = normalize_ban_date(record.get('ban_until'))
+    is_banned = bool(record.get('is_shadow_banned')) and (ban_until is None or ban_until >= today)
+    return {
+        'is_shadow_banned': is_banned,
+        'needs_extra_verification': bool(record.get('needs_extra_verification')),
+        'ban_until': ban_until if is_banned else None,
+    }
+
+
+def pickup_block_reason(status, has_photo):
+    """SANKSI_BAN / SANKSI_FOTO jika pengguna tidak boleh menjadwalkan pickup, selain itu None."""
+    if status['is_shadow_banned']:
+        return SANKSI_BAN
+    if status['needs_extra_verification'] and not has_photo:
+        return SANKSI_FOTO
+    return None
+
+
+class SanctionIndex:
+    """
+    Indeks sanksi pengguna di memori.
+
+    - `_active` memetakan user_id ke status sanksinya sehingga pengecekan
+      per request cukup satu lookup dictionary (O(1)).
+    - `_expiry_heap` adalah min-heap (ban_until, user_id) sehingga sweep
+      berkala bisa mencabut semua ban yang kedaluwarsa sekaligus tanpa
+      memindai seluruh pengguna. Entri yang usang dilewati saat di-pop.
+
+    Indeks ini per proses. Sanksi yang dicatat worker lain baru terlihat
+    setelah sinkronisasi berkala (SANCTION_SYNC_INTERVAL), jadi keputusan
+    akhir penjadwalan pickup dicek ulang dari record pengguna di bawah
+    kunci database (DataRepository.book_pickup).
+    """
+    def __init__(self):
+        self._active = {}
+        self._expiry_heap = []
+        self._lock = threading.Lock()
+
+    def load(self, users):
+        """
+        Membangun ulang indeks dari daftar pengguna. Mengembalikan patch
+        {user_id: {'ban_until': ...}} untuk record yang formatnya perlu
+        dinormalisasi.
+        """
+        patches = {}
+        with self._lock:
+            self._active = {}
+            self._expiry_heap = []
+            for user in users:
+                normalized = normalize_ban_date(user.get('ban_until'))
+                if user.get('ban_until') != normalized:
+                    patches[user['id']] = {'ban_until': normalized}
+                    user['ban_until'] = normalized
+                entry = self._put(user)
+                if entry and entry['is_shadow_banned'] and entry['ban_until']:
+                    self._expiry_heap.append((entry['ban_until'], user['id']))
+            heapq.heapify(self._expiry_heap)
+        return patches
+
+    def init_app(self, app):
+        """
+        Membangun indeks dari database, menormalisasi format 'ban_until'
+        yang lama, lalu menjadwalkan sweep ban kedaluwarsa secara berkala.
+        """
+        from app.repository import UserRepository
+        from app.tasks import job_queue
+
+        user_repo = UserRepository()
+        patches = self.load(user_repo.get_all_users())
+        user_repo.patch_users(patches)
+        job_queue.enqueue('lift_expired_sanctions', durable=False)
+        job_queue.every(app.config['SANCTION_SWEEP_INTERVAL'], 'lift_expired_sanctions')
+        job_queue.every(app.config['SANCTION_SYNC_INTERVAL'], 'sync_sanctions')
+
+    def update_user(self, user):
+        """Memperbarui status sanksi satu pengguna setelah record berubah."""
+        with self._lock:
+            self._active.pop(user['id'], None)
+            entry = self._put(user)
+            if entry and entry['is_shadow_banned'] and entry['ban_until']:
+                heapq.heappush(self._expiry_heap, (entry['ban_until'], user['id']))
+
+    def remove_user(self, user_id):
+        with self._lock:
+            self._active.pop(user_id, None)
+
+    def get_status(self, user_id, today=None):
+        """
+        Status sanksi pengguna untuk satu request (lihat sanction_status).
+        """
+        entry = self._active.get(user_id)
+        if not entry:
+            return {'is_shadow_banned': False, 'needs_extra_verification': False, 'ban_until': None}
+        return sanction_status(entry, today)
+
+    def sanctioned_user_ids(self):
+        """Daftar ID pengguna yang sedang memiliki sanksi apa pun."""
+        with self._lock:
+            return list(self._active.keys())
+
+    def pop_expired(self, today=None):
+        """
+        Mengambil semua pengguna yang masa ban-nya sudah berakhir
+        (ban_until < hari ini). Kompleksitas O(k log n) untuk k ban kedaluwarsa.
+        """
+        today = today or date.today().strftime('%Y-%m-%d')
+        expired = []
+        with self._lock:
+            while self._expiry_heap and self._expiry_heap[0][0] < today:
+                ban_until, user_id = heapq.heappop(self._expiry_heap)
+                entry = self._active.get(user_id)
+                # Lewati entri usang (ban sudah diubah/dicabut sebelumnya)
+                if entry and entry['is_shadow_banned'] and entry['ban_until'] == ban_until:
+                    expired.append(user_id)
+        return expired
+
+    def _put(self, user):
+        entry = {
+            'is_shadow_banned': bool(user.get('is_shadow_banned')),
+            'needs_extra_verification': bool(user.get('needs_extra_verification')),
+            'ban_until': normalize_ban_date(user.get('ban_until')),
+        }
+        if not (entry['is_shadow_banned'] or entry['needs_extra_verification']):
+            return None
+        self._active[user['id']] = entry
+        return entry
+
+
+# Instance tunggal yang dipakai service dan job latar belakang
+sanction_index = SanctionIndex()
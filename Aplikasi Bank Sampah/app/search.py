@@ -0,0 +1,208 @@
+import bisect
+import math
+import threading
+from collections import defaultdict
+
+# Field pengguna yang bisa dicari oleh admin
+SEARCH_FIELDS = ('nama', 'email', 'role', 'alamat', 'area_tugas')
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _user_text(user):
+    return ' '.join(str(user.get(field) or '') for field in SEARCH_FIELDS).lower()
+
+
+def _sort_key(user):
+    return ((user.get('nama') or '').lower(), user['id'])
+
+
+class UserSearchIndex:
+    """
+    Indeks pencarian pengguna di memori untuk halaman admin.
+
+    - Indeks trigram (trigram -> set user_id) untuk pencarian substring.
+      Kandidat dari irisan posting list diverifikasi ulang dengan `in`.
+    - Daftar token terurut untuk pencarian prefix (kueri < 3 karakter)
+      menggunakan bisect.
+    - Daftar (nama, id) terurut sehingga hasil bisa langsung dipaginasi.
+
+    Indeks ini per proses. Sebelum mencari, `refresh` membandingkan versi
+    file database (stat) lalu penanda versi data pengguna (meta.users_version);
+    hanya jika pengguna benar-benar berubah (misal didaftarkan atau diubah di
+    worker lain) pengguna yang teksnya berbeda diperbarui. Penulisan lain
+    (pickup, notifikasi, job) tidak memicu pemuatan ulang pengguna.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._users_version = None
+        self._reset()
+
+    def init_app(self, app):
+        from app.repository import UserRepository
+
+        user_repo = UserRepository()
+        version = user_repo.database_version()
+        self._users_version, users = user_repo.get_users_if_changed(None)
+        self.load(users)
+        self._version = version
+
+    def refresh(self):
+        """Menyamakan indeks dengan database jika data pengguna sudah berubah."""
+        from app.repository import UserRepository
+
+        user_repo = UserRepository()
+        # Versi dibaca sebelum data, agar perubahan di antaranya tertangkap berikutnya
+        version = user_repo.database_version()
+        if version == self._version:
+            return
+        users_version, users = user_repo.get_users_if_changed(self._users_version)
+        if users is None:
+            self._version = version
+            return
+        with self._lock:
+            seen = set()
+            for user in users:
+                seen.add(user['id'])
+                if self._texts.get(user['id']) != _user_text(user) or self._sort_keys.get(user['id']) != _sort_key(user):
+                    self._remove(user['id'])
+                    self._add(user)
+            for user_id in set(self._texts) - seen:
+                self._remove(user_id)
+            self._version = version
+            self._users_version = users_version
+
+    def load(self, users):
+        with self._lock:
+            self._reset()
+            for user in users:
+                self._add(user, bulk=True)
+            # Pada pemuatan massal cukup diurutkan sekali di akhir
+            self._ordered.sort()
+            self._prefix_tokens.sort()
+
+    def upsert(self, user):
+        """Menambah atau memperbarui satu pengguna di indeks."""
+        with self._lock:
+            self._remove(user['id'])
+            self._add(user)
+
+    def upsert_many(self, users):
+        """Menambah banyak pengguna (impor massal); diurutkan sekali di akhir."""
+        with self._lock:
+            for user in users:
+                self._remove(user['id'])
+                self._add(user, bulk=True)
+            self._ordered.sort()
+            self._prefix_tokens.sort()
+
+    def remove(self, user_id):
+        with self._lock:
+            self._remove(user_id)
+
+    def search(self, query='', page=1, per_page=25):
+        """
+        Mencari pengguna berdasarkan prefix/substring lalu mengembalikan
+        satu halaman hasil: {'ids', 'total', 'page', 'pages'}.
+        Hasil diurutkan berdasarkan nama.
+        """
+        query = (query or '').strip().lower()
+        with self._lock:
+            if not query:
+                matches = [user_id for _, user_id in self._ordered]
+            else:
+                if len(query) < 3:
+                    candidates = self._prefix_candidates(query)
+                else:
+                    candidates = self._trigram_candidates(query)
+                matches = [user_id for user_id in candidates if query in self._texts[user_id]]
+                matches.sort(key=lambda user_id: self._sort_keys[user_id])
+
+        total = len(matches)
+        pages = max(1, math.ceil(total / per_page))
+        page = min(max(1, page), pages)
+        start = (page - 1) * per_page
+        return {
+            "ids": matches[start:start + per_page],
+            "total": total,
+            "page": page,
+            "pages": pages,
+        }
+
+    # --- Internal (dipanggil dengan lock sudah dipegang) ---
+
+    def _reset(self):
+        self._texts = {}
+        self._sort_keys = {}
+        self._tokens = {}
+        self._trigram_postings = defaultdict(set)
+        self._prefix_tokens = []
+        self._ordered = []
+
+    def _add(self, user, bulk=False):
+        insert = list.append if bulk else bisect.insort
+        user_id = user['id']
+        text = _user_text(user)
+        self._texts[user_id] = text
+        self._sort_keys[user_id] = _sort_key(user)
+        insert(self._ordered, self._sort_keys[user_id])
+
+        for trigram in _trigrams(text):
+            self._trigram_postings[trigram].add(user_id)
+
+        tokens = set(text.split())
+        self._tokens[user_id] = tokens
+        for token in tokens:
+            insert(self._prefix_tokens, (token, user_id))
+
+    def _remove(self, user_id):
+        text = self._texts.pop(user_id, None)
+        if text is None:
+            return
+
+        sort_key = self._sort_keys.pop(user_id)
+        i = bisect.bisect_left(self._ordered, sort_key)
+        if i < len(self._ordered) and self._ordered[i] == sort_key:
+            del self._ordered[i]
+
+        for trigram in _trigrams(text):
+            postings = self._trigram_postings.get(trigram)
+            if postings:
+                postings.discard(user_id)
+                if not postings:
+                    del self._trigram_postings[trigram]
+
+        for token in self._tokens.pop(user_id):
+            i = bisect.bisect_left(self._prefix_tokens, (token, user_id))
+            if i < len(self._prefix_tokens) and self._prefix_tokens[i] == (token, user_id):
+                del self._prefix_tokens[i]
+
+    def _prefix_candidates(self, query):
+        candidates = set()
+        i = bisect.bisect_left(self._prefix_tokens, (query, ''))
+        while i < len(self._prefix_tokens) and self._prefix_tokens[i][0].startswith(query):
+            candidates.add(self._prefix_tokens[i][1])
+            i += 1
+        return candidates
+
+    def _trigram_candidates(self, query):
+        # Mulai dari posting list terkecil agar irisan secepat mungkin
+        postings = sorted(
+            (self._trigram_postings.get(trigram, set()) for trigram in _trigrams(query)),
+            key=len
+        )
+        if not postings or not postings[0]:
+            return set()
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                break
+        return candidates
+
+
+# Instance tunggal yang dipakai service admin
+user_search_index = UserSearchIndex()
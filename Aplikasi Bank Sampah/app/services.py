@@ -1,13 +1,100 @@
+import heapq
 import os
-from datetime import datetime
+import urllib.parse
+from datetime import datetime, timedelta
+from decimal import Decimal
 from flask import current_app
 from werkzeug.utils import secure_filename
-from app.repository import UserRepository, DataRepository
+from app.analytics import analytics_store, merge_summaries
+from app.areas import area_of
+from app.feed import task_feed
+from app.history import history_index, encode_cursor, decode_cursor
+from app.inventory import reward_inventory, ALASAN_BATAS, ALASAN_REWARD, ALASAN_STOK
+from app.leaderboard import leaderboard
+from app.ledger import point_ledger, to_fixed, from_fixed
+from app.passwords import password_hasher, PasswordBusyError
+from app.pricing import repricing_engine, effective_price, parse_price
+from app.ratelimit import login_guard
+from app.repository import UserRepository, DataRepository, DELETE_MODES, MODE_KASKADE, transaction_key
+from app.sanctions import sanction_index, pickup_block_reason, SANKSI_BAN
+from app.slots import slot_planner
+from app.search import user_search_index
+from app.sharding import shard_router, ShardError
+from app.tasks import job_queue
+from app.user_import import user_importer, read_user_csv
 
 # Inisialisasi repositori
 user_repo = UserRepository()
 data_repo = DataRepository()
 
+def _attach_leaderboard_names(rows):
+    """Menambahkan nama pengguna ke baris leaderboard."""
+    users_map = {u['id']: u for u in user_repo.get_users_by_ids([row['user_id'] for row in rows])}
+    for row in rows:
+        row['nama'] = users_map.get(row['user_id'], {}).get('nama', 'N/A')
+
+# ====================================================================
+# LAPORAN ADMIN PER SHARD
+# Dijalankan di setiap node lewat shard_router.fan_out lalu digabung oleh
+# AdminService; parameter datang sebagai string dari query antar-node.
+# ====================================================================
+
+def _user_names():
+    """{user_id: nama} termasuk tombstone pengguna yang sudah dihapus."""
+    users_map = {u['id']: u for u in user_repo.get_all_users()}
+    users_map.update(user_repo.get_deleted_users())
+    return {user_id: user.get('nama', 'N/A') for user_id, user in users_map.items()}
+
+@shard_router.report('transactions')
+def _shard_transactions(arsip='0', sebelum=None, limit='50'):
+    """Satu halaman keyset transaksi shard ini (`sebelum` = cursor)."""
+    transactions = data_repo.get_transactions_page(decode_cursor(sebelum), int(limit), arsip == '1')
+    names = _user_names()
+    for t in transactions:
+        t['user_nama'] = names.get(t['user_id'], 'N/A')
+    return transactions
+
+@shard_router.report('sanctioned_users')
+def _shard_sanctioned_users():
+    users = user_repo.get_users_by_ids(sanction_index.sanctioned_user_ids())
+    for user in users:
+        user.pop('password', None)
+        user['sanksi'] = sanction_index.get_status(user['id'])
+    return users
+
+@shard_router.report('leaderboards')
+def _shard_leaderboards(k=10):
+    boards = []
+    for area in leaderboard.areas():
+        top_savers = leaderboard.top(area, k=int(k))
+        _attach_leaderboard_names(top_savers)
+        boards.append({"area": area, "top": top_savers})
+    return boards
+
+@shard_router.report('analytics')
+def _shard_analytics(mulai, sampai):
+    result = analytics_store.summary(mulai, sampai)
+    # Nama pengepul hanya diisi shard tempat akunnya disimpan
+    users_map = {u['id']: u for u in user_repo.get_users_by_ids(
+        [row['pengepul_id'] for row in result['pengepul'] if row['pengepul_id']])}
+    for row in result['pengepul']:
+        if row['pengepul_id'] in users_map:
+            row['nama'] = users_map[row['pengepul_id']].get('nama')
+    return result
+
+def _master_only_message():
+    """Pesan jika data master diubah dari node cabang (read-only)."""
+    if shard_router.is_master:
+        return None
+    return f"Data master hanya bisa diubah di node pusat ({shard_router.url_of(shard_router.master)})."
+
+def _wrong_shard_message(user):
+    """Pesan jika pengguna (menurut areanya) bukan milik shard node ini."""
+    if shard_router.owns(user):
+        return None
+    shard_id = shard_router.shard_for_user(user)
+    return f"Area {area_of(user)} dilayani cabang {shard_id}. Silakan daftar di {shard_router.url_of(shard_id)}."
+
 class AuthService:
     """
     Service untuk menangani logika terkait otentikasi.
@@ -19,18 +106,27 @@ class AuthService:
         # Cek apakah email sudah ada
         if user_repo.get_user_by_email(email):
             return None, "Email sudah terdaftar."
+
+        # Dengan sharding, pengguna disimpan di node cabang areanya
+        error = _wrong_shard_message({"alamat": alamat, "area_tugas": area_tugas if role == 'pengepul' else None})
+        if error:
+            return None, error
+        if shard_router.find_email(email):
+            return None, "Email sudah terdaftar."
         
-        # Menyimpan password sebagai plain text (Sesuai permintaan khusus)
-        password_plain = password
+        # Password disimpan sebagai hash ber-salt (lihat app/passwords.py)
+        try:
+            password_hash = password_hasher.hash(password)
+        except PasswordBusyError as e:
+            return None, str(e)
 
         # Siapkan data pengguna baru
         new_user_data = {
             "id": None, # Akan di-generate oleh repository
             "nama": nama,
             "email": email,
-            "password": password_plain,
+            "password": password_hash,
             "role": role,
-            "total_poin": 0,
             "alamat": alamat,
             "area_tugas": area_tugas if role == 'pengepul' else None,
             "is_shadow_banned": False, # Default: Tidak kena ban
@@ -41,21 +137,47 @@ class AuthService:
         # Simpan pengguna baru
         try:
             saved_user = user_repo.save_user(new_user_data)
+            user_search_index.upsert(saved_user)
+            if role == 'pengepul':
+                slot_planner.refresh_collectors(user_repo.get_all_users())
             return saved_user, "Registrasi berhasil."
         except Exception as e:
             return None, f"Terjadi kesalahan saat registrasi: {e}"
 
-    def authenticate_user(self, email, password):
+    def authenticate_user(self, email, password, ip=None):
         """
         Mengotentikasi pengguna untuk login.
         """
         user_data = user_repo.get_user_by_email(email)
         
         if not user_data:
+            # Email tak dikenal ikut dihitung di bucket IP (percobaan acak
+            # tetap memicu pengecekan ke shard lain)
+            if ip is not None:
+                login_guard.record_unknown_email(ip)
+            shard_id = shard_router.find_email(email)
+            if shard_id:
+                return None, f"Akun Anda terdaftar di cabang {shard_id}. Silakan login di {shard_router.url_of(shard_id)}."
             return None, "Email tidak ditemukan."
-            
-        if user_data.get('password') != password:
+
+        stored = user_data.get('password')
+        try:
+            valid = password_hasher.verify(stored, password)
+        except PasswordBusyError as e:
+            return None, str(e)
+
+        # Hanya password yang benar-benar salah yang dihitung untuk lockout
+        # (bukan email tak dikenal atau pool hashing yang sedang penuh)
+        if not valid:
+            login_guard.record_failure(email)
             return None, "Password salah."
+        login_guard.record_success(email)
+
+        # Upgrade transparan: password plain text / work factor lama di-hash
+        # ulang di latar belakang (tidak dijurnal agar password tidak tertulis).
+        if password_hasher.needs_rehash(stored):
+            job_queue.enqueue('rehash_password', durable=False,
+                              user_id=user_data['id'], password=password)
             
         return user_data, "Login berhasil."
 
@@ -68,28 +190,45 @@ class PenggunaService:
         Membuat jadwal penjemputan baru.
         Mendukung verifikasi tambahan melalui waste_photo.
         """
-        # Logika Tambahan: Jika foto wajib (needs_extra_verification) tapi tidak ada
-        user = user_repo.get_user_by_id(user_id)
-        if user.get('needs_extra_verification') and not waste_photo:
-            return None, "Anda wajib mengunggah foto sampah untuk verifikasi."
+        # Logika Tambahan: cek cepat sanksi dari indeks (shadow ban / wajib
+        # foto); dicek ulang dari record pengguna saat pickup disimpan
+        has_photo = bool(waste_photo and waste_photo.filename)
+        alasan = pickup_block_reason(sanction_index.get_status(user_id), has_photo)
+        if alasan:
+            return None, self._sanction_message(alasan)
+
+        try:
+            datetime.strptime(tanggal or '', '%Y-%m-%d')
+            datetime.strptime(waktu or '', '%H:%M')
+        except ValueError:
+            return None, "Tanggal atau waktu penjemputan tidak valid."
+
+        # Cek cepat kapasitas slot dari counter di memori. Counter worker ini
+        # bisa usang (pembatalan di worker lain), jadi slot yang tampak penuh
+        # dicek ulang ke counter tersimpan sebelum ditolak.
+        area = area_of({'alamat': lokasi})
+        if slot_planner.availability(area, tanggal, waktu)['sisa'] <= 0:
+            key = slot_planner.slot_key({"area": area, "tanggal": tanggal, "waktu": waktu})
+            slot_planner.set_count(key, data_repo.get_slot_counts().get(key, 0))
+            if slot_planner.availability(area, tanggal, waktu)['sisa'] <= 0:
+                return None, self._slot_full_message(area, tanggal, waktu)
 
         filename = None
+        photo_file = None
         # --- LOGIKA PENYIMPANAN FILE FISIK ---
         if waste_photo and waste_photo.filename != '':
             # 1. Amankan nama file dengan timestamp agar unik
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             filename = secure_filename(f"{timestamp}_{waste_photo.filename}")
-            
-            # 2. Tentukan path folder static/uploads/waste_photos
+
+            # 2. Simpan ke folder static/uploads/waste_photos sebelum pickup
+            #    di-commit, sehingga pickup tersimpan tidak pernah merujuk foto
+            #    yang belum ada. Foto dihapus lagi jika booking ditolak.
             upload_path = os.path.join(current_app.root_path, 'static', 'uploads', 'waste_photos')
-            
-            # 3. Buat folder jika belum ada
-            if not os.path.exists(upload_path):
-                os.makedirs(upload_path)
-            
-            # 4. Simpan file secara fisik ke server
+            photo_file = os.path.join(upload_path, filename)
             try:
-                waste_photo.save(os.path.join(upload_path, filename))
+                os.makedirs(upload_path, exist_ok=True)
+                waste_photo.save(photo_file)
             except Exception as e:
                 return None, f"Gagal menyimpan file foto: {e}"
 
@@ -101,33 +240,134 @@ class PenggunaService:
             "status": "menunggu",
             "pengepul_id": None,
             "notes": notes,
-            "photo_path": filename # Menyimpan nama file hasil proses ke database
+            "photo_path": filename, # Menyimpan nama file hasil proses ke database
+            "area": area
         }
         
+        slot_key = slot_planner.slot_key(pickup_data)
         try:
-            saved_pickup = data_repo.save_pickup(pickup_data)
-            return saved_pickup, "Jadwal berhasil dibuat."
+            # Pengecekan final kapasitas di bawah kunci database
+            saved_pickup, used, alasan = data_repo.book_pickup(pickup_data, slot_key, slot_planner.capacity(area),
+                                                               has_photo=has_photo)
         except Exception as e:
+            self._discard_photo(photo_file)
             return None, f"Gagal membuat jadwal: {e}"
+
+        if alasan:
+            # Sanksi dicatat worker lain; samakan indeks worker ini
+            self._discard_photo(photo_file)
+            sanction_index.update_user(user_repo.get_user_by_id(user_id))
+            return None, self._sanction_message(alasan)
+        slot_planner.set_count(slot_key, used)
+        if not saved_pickup:
+            self._discard_photo(photo_file)
+            return None, self._slot_full_message(area, tanggal, waktu)
+
+        history_index.add_pickup(saved_pickup)
+        task_feed.publish('task-added', saved_pickup)
+        job_queue.enqueue('audit_log', event='pickup_dijadwalkan',
+                          user_id=user_id, pickup_id=saved_pickup['id'])
+        return saved_pickup, "Jadwal berhasil dibuat."
             
+    @staticmethod
+    def _discard_photo(photo_file):
+        """Menghapus foto milik booking yang ditolak."""
+        if photo_file:
+            try:
+                os.remove(photo_file)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _sanction_message(alasan):
+        if alasan == SANKSI_BAN:
+            return "Akses penjemputan Anda sedang dibatasi."
+        return "Anda wajib mengunggah foto sampah untuk verifikasi."
+
+    def _slot_full_message(self, area, tanggal, waktu):
+        suggestions = slot_planner.suggest(area, tanggal, waktu)
+        if not suggestions:
+            return "Slot penjemputan pada waktu tersebut sudah penuh."
+        pilihan = ", ".join(f"{s['tanggal']} {s['jendela']}" for s in suggestions)
+        return f"Slot penjemputan pada waktu tersebut sudah penuh. Slot yang masih tersedia: {pilihan}."
+
+    def get_slot_availability(self, user, tanggal):
+        """Ketersediaan setiap jendela waktu pada satu tanggal di area pengguna."""
+        try:
+            datetime.strptime(tanggal or '', '%Y-%m-%d')
+        except ValueError:
+            return None
+        return slot_planner.day_availability(area_of(user), tanggal)
+
+    def get_sanction_status(self, user_id):
+        """
+        Mengambil status sanksi pengguna (O(1) dari indeks sanksi).
+        """
+        return sanction_index.get_status(user_id)
+
     def get_user_dashboard_data(self, user_id):
         """
         Mengambil data untuk dasbor pengguna.
         """
         user_data = user_repo.get_user_by_id(user_id)
-        pickups = data_repo.get_pickups_by_user_id(user_id)
-        pickups.sort(key=lambda x: x.get('tanggal'), reverse=True)
+        # Saldo selalu diturunkan dari ledger (snapshot + tail)
+        user_data['total_poin'] = point_ledger.get_balance(user_id)
+        # Lima penjemputan terbaru langsung dari indeks riwayat terurut
+        # (disamakan dulu dengan pickup yang dibuat worker lain)
+        history_index.refresh_user('pickups', user_id)
+        recent_pickups = data_repo.get_pickups_by_ids(history_index.latest('pickups', user_id, 5), user_id)
+        notifications = data_repo.get_notifications_by_user_id(user_id)
+        notifications.sort(key=lambda x: x.get('tanggal'), reverse=True)
+        
+        area = area_of(user_data)
+        top_savers = leaderboard.top(area, k=10)
+        _attach_leaderboard_names(top_savers)
         
         return {
             "user": user_data,
-            "recent_pickups": pickups[:5]
+            "recent_pickups": recent_pickups,
+            "notifications": notifications[:3],
+            "leaderboard": {
+                "area": area,
+                "bulan": leaderboard.current_period(),
+                "top": top_savers,
+                "my_rank": leaderboard.rank(user_id, area),
+            }
         }
 
-    def get_rewards_catalog(self):
+    def get_user_history(self, user_id, jenis='pickups', cursor=None, limit=20):
+        """
+        Satu halaman riwayat penjemputan atau transaksi poin (terbaru lebih
+        dulu) dengan keyset pagination. Record lama dibaca dari arsip
+        bulanan bila sudah dipindahkan. Mengembalikan (hasil, pesan_error).
+        """
+        if jenis not in ('pickups', 'transaksi'):
+            return None, "Jenis riwayat tidak dikenal."
+        history_index.refresh_user(jenis, user_id)
+        try:
+            page = history_index.page(jenis, user_id, cursor, limit)
+        except ValueError as e:
+            return None, str(e)
+
+        if jenis == 'pickups':
+            items = data_repo.get_pickups_by_ids(page['ids'], user_id)
+        else:
+            items = data_repo.get_transactions_by_ids(page['ids'], user_id)
+        return {"jenis": jenis, "items": items, "next_cursor": page['next_cursor']}, None
+
+    def get_user_balance(self, user_id):
+        """Saldo poin pengguna dari ledger."""
+        return point_ledger.get_balance(user_id)
+
+    def get_rewards_catalog(self, user_id=None):
         """
-        Mengambil daftar reward yang tersedia.
+        Mengambil daftar reward yang tersedia beserta sisa stok dan sisa
+        batas penukaran pengguna (dari counter memori, bukan riwayat).
         """
-        return data_repo.get_all_rewards()
+        rewards = data_repo.get_all_rewards()
+        for reward in rewards:
+            reward['ketersediaan'] = reward_inventory.availability(reward['id'], user_id)
+        return rewards
 
     def redeem_reward(self, user_id, reward_id):
         """
@@ -141,28 +381,56 @@ class PenggunaService:
         if not reward:
             return False, "Reward tidak ditemukan."
 
+        # Stok habis / batas tercapai ditolak tanpa mengunci database
+        alasan = reward_inventory.check(reward_id, user_id)
+        if alasan:
+            return False, self._redeem_failure_message(alasan)
+
         poin_dibutuhkan = reward.get('poin_dibutuhkan', 0)
-        poin_pengguna = user.get('total_poin', 0)
+        poin_pengguna_fp = point_ledger.get_balance_fp(user_id)
 
-        if poin_pengguna < poin_dibutuhkan:
+        if poin_pengguna_fp < to_fixed(poin_dibutuhkan):
             return False, "Poin Anda tidak cukup untuk menukar reward ini."
-            
-        user['total_poin'] = poin_pengguna - poin_dibutuhkan
         
         transaction_data = {
             "user_id": user['id'],
             "tanggal": datetime.now().strftime('%Y-%m-%d'),
             "tipe": "redeem_reward",
+            "reward_id": reward_id,
             "deskripsi": f"Tukar: {reward.get('nama')}",
-            "jumlah_poin": -poin_dibutuhkan
+            "jumlah_poin": -poin_dibutuhkan,
+            "jumlah_poin_fp": -to_fixed(poin_dibutuhkan)
         }
         
         try:
-            data_repo.redeem_reward_transaction(user, transaction_data)
-            return True, f"Reward '{reward.get('nama')}' berhasil ditukar!"
+            # Saldo, stok, dan batas dicek ulang di dalam kunci repository
+            alasan, stok, ditukar = data_repo.redeem_reward_transaction(user, transaction_data, reward_id)
         except Exception as e:
             return False, f"Gagal menyimpan transaksi redeem: {e}"
 
+        if alasan != ALASAN_REWARD:
+            reward_inventory.record(reward_id, user['id'], stok, ditukar)
+        if alasan:
+            return False, self._redeem_failure_message(alasan)
+
+        history_index.add_transaction(transaction_data)
+        analytics_store.record_transaction(transaction_data)
+        job_queue.enqueue('audit_log', event='reward_ditukar', user_id=user['id'],
+                          reward_id=reward_id, jumlah_poin=-poin_dibutuhkan, sisa_stok=stok)
+        job_queue.enqueue('notify_user', user_id=user['id'],
+                          pesan=f"Penukaran '{reward.get('nama')}' berhasil diproses.")
+        return True, f"Reward '{reward.get('nama')}' berhasil ditukar!"
+
+    @staticmethod
+    def _redeem_failure_message(alasan):
+        if alasan == ALASAN_STOK:
+            return "Stok reward ini sudah habis."
+        if alasan == ALASAN_BATAS:
+            return "Anda sudah mencapai batas penukaran untuk reward ini."
+        if alasan == ALASAN_REWARD:
+            return "Reward tidak ditemukan."
+        return "Poin Anda tidak cukup untuk menukar reward ini."
+
 class PengepulService:
     """
     Service untuk logika bisnis yang terkait dengan Pengepul.
@@ -171,14 +439,48 @@ class PengepulService:
         """
         Mengambil daftar tugas untuk pengepul.
         """
+        collector = user_repo.get_user_by_id(collector_id)
+        area = self.get_collector_area(collector)
         all_tasks = data_repo.get_pickups_by_collector_id(collector_id)
-        tasks = [
-            task for task in all_tasks 
-            if task['status'] == 'menunggu' or task.get('pengepul_id') == collector_id
-        ]
+        tasks = [task for task in all_tasks if self._is_visible_task(task, collector_id, area)]
         tasks.sort(key=lambda x: (x.get('tanggal'), x.get('waktu')))
         return tasks
 
+    def get_collector_task(self, collector_id, pickup_id):
+        """
+        Satu tugas untuk diperbarui lewat feed; None jika tugas tidak
+        (lagi) ditampilkan untuk pengepul ini.
+        """
+        pickup = data_repo.get_pickup_by_id(pickup_id)
+        if not pickup:
+            return None
+        area = self.get_collector_area(user_repo.get_user_by_id(collector_id))
+        return pickup if self._is_visible_task(pickup, collector_id, area) else None
+
+    @staticmethod
+    def get_collector_area(collector):
+        """Area tugas pengepul; None berarti semua area."""
+        if not collector or not collector.get('area_tugas'):
+            return None
+        return area_of(collector)
+
+    @staticmethod
+    def _is_visible_task(task, collector_id, area):
+        if task.get('pengepul_id') == collector_id:
+            return True
+        if task['status'] != 'menunggu' or task.get('pengepul_id'):
+            return False
+        task_area = task.get('area') or area_of({'alamat': task.get('lokasi')})
+        return area is None or task_area == area
+
+    def claim_pickup(self, pickup_id, collector_id):
+        """Pengepul mengambil tugas agar tidak dikerjakan pengepul lain."""
+        pickup = data_repo.claim_pickup(pickup_id, collector_id)
+        if not pickup:
+            return False, "Tugas sudah diambil pengepul lain atau sudah diproses."
+        task_feed.publish('task-claimed', pickup)
+        return True, "Tugas berhasil diambil."
+
     def get_waste_types_for_confirmation(self):
         """
         Mengambil jenis sampah untuk ditampilkan di form konfirmasi.
@@ -196,14 +498,21 @@ class PengepulService:
         if pickup['status'] == 'selesai':
             return None, "Penjemputan ini sudah diselesaikan."
 
+        if pickup.get('pengepul_id') not in (None, collector_id):
+            return None, "Tugas ini sudah diambil pengepul lain."
+
         user = user_repo.get_user_by_id(pickup['user_id'])
         if not user:
             return None, "Data pengguna tidak ditemukan."
 
-        all_waste_types = data_repo.get_all_waste_types()
-        waste_map = {wt['id']: wt for wt in all_waste_types}
+        # Harga yang berlaku hari ini dihitung sekali per jenis sampah
+        today = datetime.now().strftime('%Y-%m-%d')
+        waste_map = {wt['id']: wt for wt in data_repo.get_all_waste_types()}
+        price_map = {wt_id: effective_price(wt, today) for wt_id, wt in waste_map.items()}
 
-        total_poin = 0
+        total_poin_fp = 0
+        total_berat = 0.0
+        rincian = []
         deskripsi_transaksi = "Setor sampah ("
         
         for item in waste_inputs:
@@ -214,34 +523,51 @@ class PengepulService:
                 weight = 0.0
 
             if waste_type_id in waste_map and weight > 0:
-                waste_type = waste_map[waste_type_id]
-                poin = weight * waste_type['nilai_poin_per_kg']
-                total_poin += poin
-                deskripsi_transaksi += f"{waste_type['nama']}: {weight}kg, "
+                price = price_map[waste_type_id]
+                poin_fp = to_fixed(Decimal(str(weight)) * Decimal(str(price)))
+                total_poin_fp += poin_fp
+                total_berat += weight
+                rincian.append({"waste_type_id": waste_type_id, "berat": weight, "nilai_poin_per_kg": price})
+                deskripsi_transaksi += f"{waste_map[waste_type_id]['nama']}: {weight}kg, "
         
         deskripsi_transaksi = deskripsi_transaksi.rstrip(', ') + ")"
         
-        if total_poin == 0:
+        if total_poin_fp == 0:
             return None, "Tidak ada sampah yang diinput. Poin tidak ditambahkan."
 
+        total_poin = from_fixed(total_poin_fp)
         pickup['status'] = 'selesai'
         pickup['pengepul_id'] = collector_id
-        user['total_poin'] = user.get('total_poin', 0) + total_poin
         
         transaction_data = {
             "user_id": user['id'],
-            "tanggal": datetime.now().strftime('%Y-%m-%d'),
+            "tanggal": today,
             "tipe": "setor_sampah",
+            "pickup_id": pickup['id'],
+            "pengepul_id": collector_id,
             "deskripsi": deskripsi_transaksi,
-            "jumlah_poin": total_poin
+            "rincian": rincian,
+            "jumlah_poin": total_poin,
+            "jumlah_poin_fp": total_poin_fp
         }
         
         try:
-            data_repo.confirm_pickup_transaction(pickup, transaction_data, user)
-            return pickup, f"Konfirmasi berhasil. {total_poin} poin ditambahkan ke pengguna."
+            # Event poin dicatat ke ledger; saldo tidak lagi diubah langsung
+            if not data_repo.confirm_pickup_transaction(pickup, transaction_data):
+                return None, "Penjemputan ini sudah diselesaikan."
         except Exception as e:
             return None, f"Gagal menyimpan konfirmasi: {e}"
 
+        history_index.add_transaction(transaction_data)
+        analytics_store.record_transaction(transaction_data, pickup)
+        leaderboard.record(user, today, total_poin_fp, total_berat)
+        task_feed.publish('task-completed', pickup)
+        job_queue.enqueue('audit_log', event='pickup_dikonfirmasi', pickup_id=pickup_id,
+                          pengepul_id=collector_id, jumlah_poin=total_poin)
+        job_queue.enqueue('notify_user', user_id=user['id'],
+                          pesan=f"Setoran sampah dikonfirmasi. {total_poin} poin ditambahkan.")
+        return pickup, f"Konfirmasi berhasil. {total_poin} poin ditambahkan ke pengguna."
+
     def report_pickup_violation(self, pickup_id):
         """
         Logika untuk menangani laporan pelanggaran (misal: sampah tidak ada di lokasi).
@@ -259,17 +585,38 @@ class PengepulService:
         # 2. Ambil data user untuk memberikan sanksi
         user = user_repo.get_user_by_id(pickup['user_id'])
         if user:
+            user['jumlah_pelanggaran'] = user.get('jumlah_pelanggaran', 0) + 1
+
+            if user['jumlah_pelanggaran'] >= current_app.config['SHADOW_BAN_THRESHOLD']:
+                # Sanksi berulang: penjemputan dibatasi sementara (shadow ban)
+                ban_days = current_app.config['SHADOW_BAN_DAYS']
+                user['is_shadow_banned'] = True
+                user['ban_until'] = (datetime.now() + timedelta(days=ban_days)).strftime('%Y-%m-%d')
+                pesan = (f"Pelanggaran berulang. Penjemputan Anda dibatasi hingga {user['ban_until']}. "
+                         "Silakan antar sampah ke titik drop-off terdekat.")
+                hasil = f"{user['nama']} dibatasi penjemputannya hingga {user['ban_until']}."
+            else:
+                pesan = ("Sampah tidak ditemukan saat penjemputan. "
+                         "Jadwal berikutnya wajib disertai foto sampah.")
+                hasil = f"{user['nama']} kini wajib verifikasi foto untuk tugas selanjutnya."
+
             # Sanksi: Tugas berikutnya wajib unggah foto
             user['needs_extra_verification'] = True
             
             try:
-                # Simpan perubahan ke repository
-                user_repo.update_user(user['id'], user)
-                # Gunakan fungsi update yang ada di repository Anda
-                data_repo.update_pickup(pickup_id, pickup) 
-                return True, f"Laporan terkirim. {user['nama']} kini wajib verifikasi foto untuk tugas selanjutnya."
+                # Simpan status pickup dan sanksi user dalam satu penulisan
+                data_repo.report_violation_transaction(pickup, user)
             except Exception as e:
                 return False, f"Terjadi kesalahan database: {e}"
+
+            sanction_index.update_user(user)
+            analytics_store.record_pickup(pickup)
+            task_feed.publish('task-completed', pickup)
+            job_queue.enqueue('audit_log', event='pelanggaran_dilaporkan',
+                              pickup_id=pickup_id, user_id=user['id'],
+                              jumlah_pelanggaran=user['jumlah_pelanggaran'])
+            job_queue.enqueue('notify_user', user_id=user['id'], pesan=pesan)
+            return True, f"Laporan terkirim. {hasil}"
         
         return False, "User terkait tidak ditemukan."
 
@@ -281,6 +628,95 @@ class AdminService:
         """Mengambil semua akun pengguna."""
         return user_repo.get_all_users()
 
+    def create_user_account(self, nama, email, password, role, alamat='', area_tugas=None):
+        """
+        Menambah satu pengguna dari halaman admin. Memakai jalur yang sama
+        dengan impor CSV (validasi, hashing, & penyimpanan).
+        """
+        row = {"nama": nama, "email": email, "password": password, "role": role,
+               "alamat": alamat, "area_tugas": area_tugas}
+        try:
+            report = user_importer.import_rows([(1, row)], on_saved=self._index_new_users,
+                                               check=_wrong_shard_message,
+                                               extra_emails=self._remote_emails())
+        except Exception as e:
+            return False, f"Gagal menambah pengguna: {e}"
+        if report['ditolak']:
+            return False, report['ditolak'][0]['alasan']
+        return True, "Pengguna berhasil ditambahkan."
+
+    def import_user_accounts(self, stream):
+        """
+        Mengimpor pengguna dari CSV (lihat app/user_import.py).
+        Mengembalikan (laporan, pesan_error).
+        """
+        try:
+            return user_importer.import_rows(read_user_csv(stream), on_saved=self._index_new_users,
+                                             check=_wrong_shard_message, extra_emails=self._remote_emails()), None
+        except (ValueError, UnicodeDecodeError) as e:
+            return None, f"File CSV tidak valid: {e}"
+        except ShardError as e:
+            return None, f"Gagal memeriksa email di cabang lain: {e}"
+
+    @staticmethod
+    def _remote_emails():
+        """Email terdaftar di shard lain (email unik di semua cabang)."""
+        emails = set()
+        for shard_id in shard_router.remote_shards():
+            emails.update(shard_router.call(shard_id, '/emails'))
+        return emails
+
+    @staticmethod
+    def _index_new_users(users):
+        user_search_index.upsert_many(users)
+        if any(user['role'] == 'pengepul' for user in users):
+            slot_planner.refresh_collectors(user_repo.get_all_users())
+
+    def search_user_accounts(self, query='', page=1, per_page=25):
+        """
+        Mencari akun pengguna (nama, email, peran, alamat, area) lewat
+        indeks pencarian, lalu mengambil record untuk satu halaman saja.
+        """
+        # Pengguna yang ditambah/diubah di worker lain
+        user_search_index.refresh()
+        result = user_search_index.search(query, page, per_page)
+        return {
+            "users": user_repo.get_users_by_ids(result['ids']),
+            "total": result['total'],
+            "page": result['page'],
+            "pages": result['pages'],
+        }
+
+    def get_sanctioned_users(self):
+        """
+        Mengambil pengguna yang sedang terkena sanksi, langsung dari
+        indeks sanksi tanpa memindai seluruh akun (semua shard).
+        """
+        users = [user for part in shard_router.fan_out('sanctioned_users').values() for user in part]
+        users.sort(key=lambda x: x.get('nama') or '')
+        return users
+
+    def resolve_user_violation(self, user_id):
+        """Mencabut semua sanksi (shadow ban & wajib verifikasi foto) pengguna."""
+        try:
+            updated = user_repo.patch_users({user_id: {
+                "is_shadow_banned": False,
+                "needs_extra_verification": False,
+                "ban_until": None,
+                "jumlah_pelanggaran": 0
+            }})
+            if not updated:
+                return False, "Pengguna tidak ditemukan."
+
+            user = updated[0]
+            sanction_index.update_user(user)
+            job_queue.enqueue('audit_log', event='sanksi_dicabut', user_id=user_id)
+            job_queue.enqueue('notify_user', user_id=user_id,
+                              pesan="Sanksi akun Anda telah dicabut oleh admin.")
+            return True, f"Sanksi {user['nama']} berhasil dicabut."
+        except Exception as e:
+            return False, f"Gagal mencabut sanksi: {e}"
+
     def update_user_account(self, user_id, nama, email, role):
         """Memperbarui data akun pengguna."""
         try:
@@ -295,22 +731,51 @@ class AdminService:
             # Pastikan UserRepository memiliki fungsi update_user
             success = user_repo.update_user(user_id, user) 
             if success:
+                user_search_index.upsert(user)
+                slot_planner.refresh_collectors(user_repo.get_all_users())
                 return True, f"Data pengguna {nama} berhasil diperbarui."
             return False, "Gagal mengupdate data di database."
         except Exception as e:
             return False, f"Gagal memperbarui data: {e}"
 
-    def delete_user_account(self, user_id):
-        """Menghapus akun pengguna."""
+    def delete_user_account(self, user_id, mode=None):
+        """
+        Menghapus akun pengguna. `mode` 'anonim' atau 'kaskade' (default
+        USER_DELETE_MODE); lihat UserRepository.delete_user.
+        """
+        mode = mode or current_app.config['USER_DELETE_MODE']
+        if mode not in DELETE_MODES:
+            return False, "Mode penghapusan tidak dikenal."
         try:
-            # Pastikan UserRepository memiliki fungsi delete_user
-            success = user_repo.delete_user(user_id)
-            if success:
-                return True, "Pengguna berhasil dihapus."
+            summary = user_repo.delete_user(user_id, mode, slot_key=slot_planner.slot_key)
+            if summary:
+                for key, count in summary['slot'].items():
+                    slot_planner.set_count(key, count)
+                sanction_index.remove_user(user_id)
+                user_search_index.remove(user_id)
+                leaderboard.remove_user(user_id)
+                history_index.remove_user(user_id)
+                slot_planner.refresh_collectors(user_repo.get_all_users())
+                # Tugas yang dilepas kembali tampil di antrean pengepul lain
+                for pickup in summary['tugas_dilepas']:
+                    task_feed.publish('task-added', pickup)
+                for pickup in summary['menunggu_dihapus']:
+                    task_feed.publish('task-removed', pickup)
+                message = "Pengguna berhasil dihapus."
+                if mode == MODE_KASKADE:
+                    message += (f" {summary['pickup_dihapus']} pickup dan "
+                                f"{summary['transaksi_dihapus'] + summary['arsip_dihapus']} record riwayat ikut dihapus.")
+                return True, message
             return False, "Pengguna tidak ditemukan atau gagal dihapus."
         except Exception as e:
             return False, f"Gagal menghapus pengguna: {e}"
-        
+
+    def get_leaderboards(self, k=10):
+        """Top-K penabung bulan ini untuk setiap area (area dibagi per shard)."""
+        boards = [board for part in shard_router.fan_out('leaderboards', k=k).values() for board in part]
+        boards.sort(key=lambda board: board['area'])
+        return boards
+
     def get_master_data(self):
         """Mengambil data master."""
         return {
@@ -318,18 +783,83 @@ class AdminService:
             "rewards": data_repo.get_all_rewards()
         }
         
-    def get_all_transactions(self):
-        """Mengambil semua riwayat transaksi."""
-        transactions = data_repo.get_all_transactions()
-        users_map = {u['id']: u for u in user_repo.get_all_users()}
-        
-        for t in transactions:
-            t['user_nama'] = users_map.get(t['user_id'], {}).get('nama', 'N/A')
-            
-        transactions.sort(key=lambda x: x.get('tanggal'), reverse=True)
-        return transactions
+    def get_transactions_page(self, include_archive=False, cursor=None, limit=50):
+        """
+        Satu halaman transaksi dari semua shard (terbaru lebih dulu). Setiap
+        shard mengirim paling banyak limit + 1 baris setelah `cursor`, lalu
+        hasilnya digabung. Mengembalikan ({'items', 'next_cursor'}, pesan_error).
+        """
+        before = decode_cursor(cursor)
+        if cursor and (before is None or len(before) != 2 or not all(isinstance(v, str) for v in before)):
+            return None, "Cursor tidak valid."
+        parts = shard_router.fan_out('transactions', arsip='1' if include_archive else '0',
+                                     sebelum=cursor, limit=limit + 1)
+        merged = heapq.nlargest(limit + 1, (t for part in parts.values() for t in part), key=transaction_key)
+        items = merged[:limit]
+        next_cursor = encode_cursor(transaction_key(items[-1])) if len(merged) > limit else None
+        return {"items": items, "next_cursor": next_cursor}, None
+
+    def iter_all_transactions(self, page_size=1000):
+        """
+        Semua transaksi (termasuk arsip) untuk ekspor, dialirkan per shard:
+        shard lokal per partisi arsip, shard lain per halaman `page_size`.
+        Urutan hanya terurut di dalam satu shard. Shard yang gagal dilewati.
+        """
+        names = _user_names()
+        for t in data_repo.iter_transactions(include_archive=True):
+            t['user_nama'] = names.get(t['user_id'], 'N/A')
+            yield t
+        for shard_id in shard_router.remote_shards():
+            cursor = None
+            while True:
+                params = {'arsip': '1', 'limit': page_size + 1}
+                if cursor:
+                    params['sebelum'] = cursor
+                try:
+                    page = shard_router.call(shard_id, f"/report/transactions?{urllib.parse.urlencode(params)}")
+                except ShardError as e:
+                    current_app.logger.warning("Ekspor transaksi dari shard %s gagal: %s", shard_id, e)
+                    break
+                yield from page[:page_size]
+                if len(page) <= page_size:
+                    break
+                cursor = encode_cursor(transaction_key(page[page_size - 1]))
+
+    def get_analytics(self, mulai=None, sampai=None):
+        """
+        Ringkasan analitik (kg per jenis per hari, poin masuk vs keluar,
+        produktivitas pengepul) untuk rentang tanggal; default 30 hari
+        terakhir. Mengembalikan (hasil, pesan_error).
+        """
+        today = datetime.now()
+        sampai = sampai or today.strftime('%Y-%m-%d')
+        mulai = mulai or (today - timedelta(days=29)).strftime('%Y-%m-%d')
+        try:
+            datetime.strptime(mulai, '%Y-%m-%d')
+            datetime.strptime(sampai, '%Y-%m-%d')
+        except ValueError:
+            return None, "Format tanggal harus YYYY-MM-DD."
+        try:
+            parts = shard_router.fan_out('analytics', mulai=mulai, sampai=sampai)
+        except ValueError as e:
+            return None, str(e)
+        if not parts:
+            return None, "Tidak ada shard yang bisa dihubungi."
+        result = merge_summaries(parts.values())
+
+        waste_names = {wt['id']: wt['nama'] for wt in data_repo.get_all_waste_types()}
+        result['jenis'] = [{"id": wt_id, "nama": waste_names.get(wt_id, wt_id)} for wt_id in result.pop('jenis_ids')]
+        for row in result['pengepul']:
+            row.setdefault('nama', 'Tidak diketahui')
+        for key in ('poin_masuk', 'poin_keluar', 'penyesuaian'):
+            result[key] = [from_fixed(v) for v in result.pop(f"{key}_fp")]
+        for key in ('poin_masuk', 'poin_keluar'):
+            result['total'][key] = from_fixed(result['total'].pop(f"{key}_fp"))
+        return result, None
 
     def add_new_waste_type(self, nama, nilai_poin_per_kg):
+        if _master_only_message():
+            return False, _master_only_message()
         try:
             waste_data = {
                 "nama": nama,
@@ -340,14 +870,118 @@ class AdminService:
         except Exception as e:
             return False, f"Gagal menambahkan: {e}"
 
-    def add_new_reward(self, nama, deskripsi, poin_dibutuhkan):
+    def _parse_price_table(self, form_prices):
+        """Mengambil harga baru yang diisi dari form: {waste_type_id: harga}."""
+        table = {}
+        for waste_type_id, value in form_prices.items():
+            value = (value or '').strip()
+            if not value:
+                continue
+            table[waste_type_id] = parse_price(value)
+        return table
+
+    def simulate_waste_repricing(self, form_prices, berlaku_mulai=None):
+        """Simulasi 'bagaimana jika' harga baru atas riwayat setoran."""
+        try:
+            table = self._parse_price_table(form_prices)
+        except ValueError as e:
+            return None, f"Harga tidak valid: {e}"
+        if not table:
+            return None, "Isi minimal satu harga baru."
+        result = repricing_engine.simulate(table, berlaku_mulai or None)
+        self._decorate_repricing_result(result)
+        return result, f"Simulasi selesai untuk {result['jumlah_item']} item setoran."
+
+    def apply_waste_repricing(self, form_prices, berlaku_mulai, sesuaikan_poin=False):
+        """Menerapkan harga baru mulai tanggal berlaku."""
+        try:
+            table = self._parse_price_table(form_prices)
+            datetime.strptime(berlaku_mulai or '', '%Y-%m-%d')
+        except ValueError as e:
+            return None, f"Input tidak valid: {e}"
+        if not table:
+            return None, "Isi minimal satu harga baru."
+        if _master_only_message():
+            return None, _master_only_message()
+
+        ok, result = repricing_engine.apply(table, berlaku_mulai, sesuaikan_poin)
+        if not ok:
+            return None, result
+        # Ledger pengguna ada di shard masing-masing: harga yang sama
+        # diterapkan di setiap node cabang
+        failed = []
+        payload = {"harga": table, "berlaku_mulai": berlaku_mulai, "sesuaikan_poin": sesuaikan_poin}
+        for shard_id in shard_router.remote_shards():
+            try:
+                result['total_delta_fp'] += shard_router.call(shard_id, '/reprice', payload)['total_delta_fp']
+            except (ShardError, KeyError) as e:
+                current_app.logger.warning("Harga baru gagal diterapkan di shard %s: %s", shard_id, e)
+                failed.append(shard_id)
+        self._decorate_repricing_result(result)
+        job_queue.enqueue('audit_log', event='harga_sampah_diubah', harga=table,
+                          berlaku_mulai=berlaku_mulai, sesuaikan_poin=sesuaikan_poin,
+                          total_delta_poin=from_fixed(result['total_delta_fp']) if sesuaikan_poin else 0)
+        message = f"Harga baru berlaku mulai {berlaku_mulai}."
+        if failed:
+            message += f" Gagal diterapkan di shard {', '.join(failed)}; ulangi untuk shard tersebut."
+        return result, message
+
+    def _decorate_repricing_result(self, result):
+        """Menambahkan nama pengguna dan nilai poin tampilan ke hasil simulasi."""
+        rows = result['per_pengguna']
+        users_map = {u['id']: u for u in user_repo.get_users_by_ids([row['user_id'] for row in rows])}
+        for row in rows:
+            row['user_nama'] = users_map.get(row['user_id'], {}).get('nama', 'N/A')
+            row['delta_poin'] = from_fixed(row['delta_fp'])
+        for row in result['per_jenis']:
+            row['delta_poin'] = from_fixed(row['delta_fp'])
+        result['total_delta_poin'] = from_fixed(result['total_delta_fp'])
+
+    @staticmethod
+    def _parse_optional_count(value, label):
+        """'' -> None (tak terbatas); selain itu bilangan bulat >= 0."""
+        value = (str(value) if value is not None else '').strip()
+        if not value:
+            return None
+        count = int(value)
+        if count < 0:
+            raise ValueError(f"{label} tidak boleh negatif.")
+        return count
+
+    def add_new_reward(self, nama, deskripsi, poin_dibutuhkan, stok=None, batas_per_pengguna=None):
+        if _master_only_message():
+            return False, _master_only_message()
         try:
             reward_data = {
                 "nama": nama,
                 "deskripsi": deskripsi,
-                "poin_dibutuhkan": int(poin_dibutuhkan)
+                "poin_dibutuhkan": int(poin_dibutuhkan),
+                "stok": self._parse_optional_count(stok, "Stok"),
+                "batas_per_pengguna": self._parse_optional_count(batas_per_pengguna, "Batas per pengguna")
             }
             data_repo.save_reward(reward_data)
+            reward_inventory.set_reward(reward_data)
             return True, "Reward baru berhasil ditambahkan."
         except Exception as e:
-            return False, f"Gagal menambahkan: {e}"
\ No newline at end of file
+            return False, f"Gagal menambahkan: {e}"
+
+    def update_reward_stock(self, reward_id, stok, batas_per_pengguna):
+        """Mengisi ulang stok atau mengubah batas penukaran satu reward."""
+        try:
+            stok = self._parse_optional_count(stok, "Stok")
+            batas_per_pengguna = self._parse_optional_count(batas_per_pengguna, "Batas per pengguna")
+        except ValueError as e:
+            return False, f"Data tidak valid: {e}"
+
+        # Stok milik cabang masing-masing; batas per pengguna adalah data master
+        current = data_repo.get_reward_by_id(reward_id)
+        if current and current.get('batas_per_pengguna') != batas_per_pengguna and _master_only_message():
+            return False, _master_only_message()
+
+        reward = data_repo.update_reward_stock(reward_id, stok, batas_per_pengguna)
+        if not reward:
+            return False, "Reward tidak ditemukan."
+        reward_inventory.set_reward(reward)
+        job_queue.enqueue('audit_log', event='stok_reward_diubah', reward_id=reward_id,
+                          stok=stok, batas_per_pengguna=batas_per_pengguna)
+        return True, f"Stok reward '{reward.get('nama')}' berhasil diperbarui."
\ No newline at end of file
@@ -0,0 +1,336 @@
+import hmac
+import json
+import logging
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import wraps
+from flask import Blueprint, current_app, g, request, jsonify, abort
+from app.areas import area_of, normalize_area
+
+logger = logging.getLogger(__name__)
+
+# Endpoint antar-node; hanya menerima request dengan header token shard
+shard_bp = Blueprint('shard', __name__)
+TOKEN_HEADER = 'X-Shard-Token'
+
+
+class ShardError(Exception):
+    """Node lain tidak bisa dihubungi atau membalas error."""
+
+
+class ShardRouter:
+    """
+    Sharding data per cabang/area. Setiap node menyimpan satu shard
+    (database.json & folder instance sendiri) berisi pengguna di area
+    shard itu beserta pickup, transaksi, notifikasi, dan ledgernya.
+
+    Tabel routing (SHARD_ROUTING_FILE, JSON) sama untuk semua node:
+
+        {"pusat": "depok",
+         "default": "depok",
+         "shards": {"depok": {"url": "http://127.0.0.1:5001", "areas": ["Depok"]},
+                    "bogor": {"url": "http://127.0.0.1:5002", "areas": ["Bogor"]}}}
+
+    Area yang tidak tercantum masuk shard 'default'. Data master (jenis
+    sampah & reward) hanya diubah di node 'pusat' dan direplikasi
+    read-only ke node lain. Laporan admin lintas shard dijalankan paralel
+    di semua node (`fan_out`) lalu digabung.
+
+    Tanpa SHARD_ROUTING_FILE sharding nonaktif dan semua data lokal.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.shard_id = None
+        self.master = None
+        self.default = None
+        self.shards = {}
+        self.token = None
+        self.timeout = 10
+        self.email_timeout = 2
+        self.email_cache_ttl = 300
+        self._email_cache = {}
+        self._email_lock = threading.Lock()
+        self._areas = {}
+        self._reports = {}
+
+    def init_app(self, app):
+        path = app.config['SHARD_ROUTING_FILE']
+        if not path:
+            return
+        self.load(path)
+        self.shard_id = app.config['SHARD_ID']
+        if self.shard_id not in self.shards:
+            raise RuntimeError(f"SHARD_ID '{self.shard_id}' tidak ada di tabel routing {path}.")
+        self.token = app.config['SHARD_TOKEN']
+        if not self.token:
+            raise RuntimeError("SHARD_TOKEN wajib diisi jika sharding aktif.")
+        self.timeout = app.config['SHARD_TIMEOUT']
+        self.email_timeout = app.config['SHARD_EMAIL_TIMEOUT']
+        self.email_cache_ttl = app.config['SHARD_EMAIL_CACHE_TTL']
+        self.enabled = True
+
+        if not self.is_master:
+            from app.tasks import job_queue
+            job_queue.every(app.config['SHARD_SYNC_INTERVAL'], 'sync_master_data')
+
+    def load(self, path):
+        """Membaca tabel routing (tanpa mengaktifkan node; dipakai juga oleh split-shards)."""
+        with open(path, 'r') as f:
+            table = json.load(f)
+        self.shards = table['shards']
+        self.master = table.get('pusat') or next(iter(self.shards))
+        self.default = table.get('default') or self.master
+        self._areas = {normalize_area(area): shard_id
+                       for shard_id, shard in self.shards.items() for area in shard.get('areas', [])}
+        if self.master not in self.shards or self.default not in self.shards:
+            raise RuntimeError(f"Shard 'pusat'/'default' tidak ada di tabel routing {path}.")
+
+    # --- Routing ---
+
+    @property
+    def is_master(self):
+        return not self.enabled or self.shard_id == self.master
+
+    def shard_for_area(self, area):
+        return self._areas.get(normalize_area(area), self.default)
+
+    def shard_for_user(self, user):
+        return self.shard_for_area(area_of(user))
+
+    def owns(self, user):
+        """True jika pengguna (berdasarkan areanya) disimpan di node ini."""
+        return not self.enabled or self.shard_for_user(user) == self.shard_id
+
+    def url_of(self, shard_id):
+        return self.shards[shard_id]['url'].rstrip('/')
+
+    def remote_shards(self):
+        return [shard_id for shard_id in self.shards if shard_id != self.shard_id] if self.enabled else []
+
+    # --- Laporan lintas shard ---
+
+    def report(self, name):
+        """
+        Mendaftarkan fungsi laporan lokal. Fungsi menerima parameter string
+        (dari query) dan mengembalikan data yang bisa di-JSON-kan; node lain
+        memanggilnya lewat GET /internal/shard/report/<name>.
+        """
+        def decorator(f):
+            self._reports[name] = f
+            return f
+        return decorator
+
+    def fan_out(self, name, **params):
+        """
+        Menjalankan laporan `name` di semua shard secara paralel (shard
+        lokal langsung, shard lain lewat HTTP) dan mengembalikan
+        {shard_id: hasil}. Shard yang gagal dilewati dan dicatat di
+        `failures()` agar halaman admin bisa menampilkan peringatan.
+        """
+        local = self._reports[name]
+        params = {key: value for key, value in params.items() if value is not None}
+        if not self.enabled:
+            return {None: local(**params)}
+
+        query = urllib.parse.urlencode(params)
+        results, failed = {}, []
+        with ThreadPoolExecutor(max_workers=len(self.shards)) as pool:
+            futures = {
+                shard_id: pool.submit(self.call, shard_id, f"/report/{name}?{query}")
+                for shard_id in self.remote_shards()
+            }
+            results[self.shard_id] = local(**params)
+            for shard_id, future in futures.items():
+                try:
+                    results[shard_id] = future.result()
+                except ShardError as e:
+                    logger.warning("Laporan %s dari shard %s gagal: %s", name, shard_id, e)
+                    failed.append(shard_id)
+        if failed:
+            g.setdefault('shard_failures', []).extend(failed)
+        return results
+
+    def failures(self):
+        """Shard yang gagal dihubungi selama request ini."""
+        return sorted(set(g.get('shard_failures', [])))
+
+    def find_email(self, email):
+        """
+        Shard lain tempat email terdaftar, atau None (dipakai saat
+        login/registrasi). Semua shard ditanya paralel dengan timeout
+        pendek (SHARD_EMAIL_TIMEOUT); email yang ditemukan disimpan di cache
+        selama SHARD_EMAIL_CACHE_TTL detik. Hasil "tidak ada" tidak di-cache
+        agar registrasi di shard lain langsung terlihat.
+        """
+        shards = self.remote_shards()
+        if not shards:
+            return None
+        email = (email or '').strip().lower()
+        now = time.monotonic()
+        with self._email_lock:
+            shard_id, expires = self._email_cache.get(email, (None, 0))
+        if shard_id and expires > now:
+            return shard_id
+
+        path = f"/email?{urllib.parse.urlencode({'email': email})}"
+        found = None
+        pool = ThreadPoolExecutor(max_workers=len(shards))
+        try:
+            futures = {pool.submit(self.call, shard_id, path, timeout=self.email_timeout): shard_id
+                       for shard_id in shards}
+            for future in as_completed(futures):
+                try:
+                    if future.result()['ada']:
+                        found = futures[future]
+                        break
+                except ShardError as e:
+                    logger.warning("Cek email ke shard %s gagal: %s", futures[future], e)
+        finally:
+            # Jangan menunggu shard lain setelah email ditemukan
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        if found:
+            with self._email_lock:
+                if len(self._email_cache) >= 10000:
+                    self._email_cache = {key: entry for key, entry in self._email_cache.items()
+                                         if entry[1] > now}
+                self._email_cache[email] = (found, now + self.email_cache_ttl)
+        return found
+
+    def call(self, shard_id, path, payload=None, timeout=None):
+        """Request JSON ke endpoint /internal/shard di node lain."""
+        url = f"{self.url_of(shard_id)}/internal/shard{path}"
+        data = json.dumps(payload).encode() if payload is not None else None
+        req = urllib.request.Request(url, data=data, headers={
+            TOKEN_HEADER: self.token, 'Content-Type': 'application/json', 'Accept-Encoding': 'identity',
+        })
+        try:
+            with urllib.request.urlopen(req, timeout=timeout or self.timeout) as response:
+                return json.load(response)
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            raise ShardError(str(e)) from e
+
+
+def split_database(data, archived, router):
+    """
+    Membagi satu database (dan record arsipnya) menjadi database per shard
+    menurut tabel routing. Pengguna dibagi menurut areanya; pickup,
+    transaksi, notifikasi, saldo ledger, dan counter penukaran mengikuti
+    shard pemiliknya (record tanpa pemilik: menurut lokasi pickup atau
+    shard default). Data master, meta, dan tombstone disalin ke semua
+    shard; indeks balik 'user_refs' dibangun ulang oleh tiap node.
+
+    `archived` = {'pickups': [...], 'transactions': [...]}. Mengembalikan
+    {shard_id: (database, arsip)}.
+    """
+    users = data.get('users', {})
+    user_shard = {user_id: router.shard_for_user(user) for user_id, user in users.items()}
+
+    def owner_shard(user_id, fallback=None):
+        return user_shard.get(user_id) or fallback or router.default
+
+    def pickup_shard(pickup):
+        return owner_shard(pickup.get('user_id'), router.shard_for_area(area_of({'alamat': pickup.get('lokasi')})))
+
+    shared_keys = ('waste_types', 'rewards', 'deleted_users')
+    meta = {key: value for key, value in data.get('meta', {}).items() if key != 'user_refs'}
+    shards = {}
+    for shard_id in router.shards:
+        database = {key: json.loads(json.dumps(data.get(key, {}))) for key in shared_keys}
+        database.update({key: {} for key in ('users', 'pickups', 'transactions', 'notifications',
+                                              'balance_snapshots', 'ledger_tail', 'slot_counts',
+                                              'reward_redemptions')})
+        database['meta'] = dict(meta)
+        shards[shard_id] = (database, {"pickups": [], "transactions": []})
+
+    for user_id, user in users.items():
+        shards[user_shard[user_id]][0]['users'][user_id] = user
+    for pickup in data.get('pickups', {}).values():
+        shards[pickup_shard(pickup)][0]['pickups'][pickup['id']] = pickup
+    for kind in ('transactions', 'notifications'):
+        for record in data.get(kind, {}).values():
+            shards[owner_shard(record.get('user_id'))][0][kind][record['id']] = record
+    for kind in ('balance_snapshots', 'ledger_tail'):
+        for user_id, value in data.get(kind, {}).items():
+            shards[owner_shard(user_id)][0][kind][user_id] = value
+    for reward_id, per_user in data.get('reward_redemptions', {}).items():
+        for user_id, count in per_user.items():
+            shards[owner_shard(user_id)][0]['reward_redemptions'].setdefault(reward_id, {})[user_id] = count
+    for key, count in data.get('slot_counts', {}).items():
+        # Kunci slot: "area|tanggal|jendela"
+        shards[router.shard_for_area(key.split('|', 1)[0])][0]['slot_counts'][key] = count
+
+    for pickup in archived.get('pickups', []):
+        shards[pickup_shard(pickup)][1]['pickups'].append(pickup)
+    for transaction in archived.get('transactions', []):
+        shards[owner_shard(transaction.get('user_id'))][1]['transactions'].append(transaction)
+    return shards
+
+
+# Instance tunggal yang dipakai service & endpoint antar-node
+shard_router = ShardRouter()
+
+
+def shard_token_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = request.headers.get(TOKEN_HEADER, '')
+        if not shard_router.enabled or not hmac.compare_digest(token.encode(), shard_router.token.encode()):
+            abort(403)
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+@shard_bp.route('/report/<string:name>')
+@shard_token_required
+def shard_report(name):
+    report = shard_router._reports.get(name)
+    if report is None:
+        abort(404)
+    return jsonify(report(**request.args.to_dict()))
+
+
+@shard_bp.route('/email')
+@shard_token_required
+def shard_email():
+    from app.repository import UserRepository
+
+    email = (request.args.get('email') or '').lower()
+    return jsonify({"ada": email in UserRepository().get_emails()})
+
+
+@shard_bp.route('/emails')
+@shard_token_required
+def shard_emails():
+    from app.repository import UserRepository
+
+    return jsonify(sorted(UserRepository().get_emails()))
+
+
+@shard_bp.route('/master')
+@shard_token_required
+def shard_master_data():
+    """Salinan data master dari node pusat untuk direplikasi."""
+    from app.repository import DataRepository
+
+    if not shard_router.is_master:
+        abort(404)
+    return jsonify(DataRepository().get_master_data())
+
+
+@shard_bp.route('/reprice', methods=['POST'])
+@shard_token_required
+def shard_reprice():
+    """Menerapkan harga baru dari node pusat ke ledger shard ini."""
+    from app.pricing import repricing_engine
+
+    payload = request.get_json()
+    ok, result = repricing_engine.apply(payload['harga'], payload['berlaku_mulai'], payload['sesuaikan_poin'])
+    if not ok:
+        return jsonify({"error": result}), 409
+    current_app.logger.info("Harga baru dari pusat diterapkan mulai %s.", payload['berlaku_mulai'])
+    return jsonify({"total_delta_fp": result['total_delta_fp']})
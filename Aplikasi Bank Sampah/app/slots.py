@@ -0,0 +1,140 @@
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from app.areas import area_of
+
+
+class SlotPlanner:
+    """
+    Kapasitas slot penjemputan per (area, tanggal, jendela waktu).
+
+    - Jumlah pickup per slot disimpan sebagai counter di memori sehingga
+      pengecekan ketersediaan untuk form cukup satu lookup dictionary.
+    - Kapasitas slot = jumlah pengepul yang bertugas di area tersebut
+      (ditambah pengepul tanpa area tugas) x SLOT_PICKUPS_PER_COLLECTOR.
+    - Keputusan akhir saat booking diambil di repository di bawah kunci
+      database (counter 'slot_counts' ikut tersimpan), sehingga booking
+      bersamaan dari beberapa worker tidak bisa melebihi kapasitas.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._collectors = Counter()
+        self.window_minutes = 120
+        self.per_collector = 4
+        self.day_start = 6 * 60
+        self.day_end = 18 * 60
+        self.search_days = 7
+        self.suggestions = 3
+
+    def init_app(self, app):
+        from app.repository import UserRepository, DataRepository
+        from app.tasks import job_queue
+
+        self.window_minutes = app.config['SLOT_WINDOW_MINUTES']
+        self.per_collector = app.config['SLOT_PICKUPS_PER_COLLECTOR']
+        self.day_start = self._minutes(app.config['SLOT_DAY_START'])
+        self.day_end = self._minutes(app.config['SLOT_DAY_END'])
+        self.search_days = app.config['SLOT_SEARCH_DAYS']
+        self.suggestions = app.config['SLOT_SUGGESTIONS']
+
+        # Counter dibangun sekali dari pickup lama jika belum ada di database
+        counts = DataRepository().init_slot_counts(self.slot_key, datetime.now().strftime('%Y-%m-%d'))
+        self.load(counts, UserRepository().get_all_users())
+        job_queue.every(app.config['SLOT_PRUNE_INTERVAL'], 'prune_slot_counts')
+        job_queue.every(app.config['SLOT_SYNC_INTERVAL'], 'sync_slot_counts')
+
+    def load(self, counts, users):
+        with self._lock:
+            self._counts = Counter(counts)
+            self._collectors = Counter(
+                self._collector_area(user) for user in users if user.get('role') == 'pengepul'
+            )
+
+    def refresh_collectors(self, users):
+        """Dipanggil setelah data pengepul berubah (registrasi, edit, hapus)."""
+        with self._lock:
+            self._collectors = Counter(
+                self._collector_area(user) for user in users if user.get('role') == 'pengepul'
+            )
+
+    def window_of(self, waktu):
+        """'09:30' -> '08:00-10:00' (untuk jendela 120 menit)."""
+        start = (self._minutes(waktu) // self.window_minutes) * self.window_minutes
+        end = min(start + self.window_minutes, 24 * 60)
+        return f"{start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}"
+
+    def slot_key(self, pickup):
+        area = pickup.get('area') or area_of({'alamat': pickup.get('lokasi')})
+        return f"{area}|{pickup.get('tanggal')}|{self.window_of(pickup.get('waktu'))}"
+
+    def capacity(self, area):
+        # Area tanpa pengepul tetap menerima sedikit booking (minimal satu pengepul)
+        with self._lock:
+            collectors = self._collectors[area] + self._collectors[None]
+        return max(collectors, 1) * self.per_collector
+
+    def availability(self, area, tanggal, waktu):
+        """Sisa kapasitas satu slot (O(1))."""
+        key = f"{area}|{tanggal}|{self.window_of(waktu)}"
+        capacity = self.capacity(area)
+        with self._lock:
+            used = self._counts[key]
+        return {"jendela": self.window_of(waktu), "kapasitas": capacity,
+                "terisi": used, "sisa": max(capacity - used, 0)}
+
+    def day_availability(self, area, tanggal):
+        """Ketersediaan semua jendela waktu pada satu tanggal untuk form."""
+        return [self.availability(area, tanggal, self._clock(start)) for start in self._window_starts()]
+
+    def suggest(self, area, tanggal, waktu):
+        """
+        Slot terdekat yang masih tersedia: jendela lain di hari yang sama,
+        lalu hari-hari berikutnya.
+        """
+        suggestions = []
+        base = datetime.strptime(tanggal, '%Y-%m-%d')
+        current = self._minutes(waktu)
+        for offset in range(self.search_days + 1):
+            day = (base + timedelta(days=offset)).strftime('%Y-%m-%d')
+            starts = sorted(self._window_starts(), key=lambda start: abs(start - current))
+            for start in starts:
+                slot = self.availability(area, day, self._clock(start))
+                if slot['sisa'] > 0 and not (offset == 0 and slot['jendela'] == self.window_of(waktu)):
+                    suggestions.append({"tanggal": day, "waktu": self._clock(start), **slot})
+                    if len(suggestions) >= self.suggestions:
+                        return suggestions
+        return suggestions
+
+    def set_count(self, key, count):
+        """Menyamakan counter memori dengan nilai dari database."""
+        with self._lock:
+            self._counts[key] = count
+
+    def prune(self, keys):
+        with self._lock:
+            for key in keys:
+                self._counts.pop(key, None)
+
+    # --- Internal ---
+
+    @staticmethod
+    def _collector_area(user):
+        return area_of(user) if user.get('area_tugas') else None
+
+    @staticmethod
+    def _minutes(waktu):
+        hours, _, minutes = (waktu or '00:00').partition(':')
+        return int(hours) * 60 + int(minutes or 0)
+
+    @staticmethod
+    def _clock(minutes):
+        return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+    def _window_starts(self):
+        first = (self.day_start // self.window_minutes) * self.window_minutes
+        return range(first, self.day_end, self.window_minutes)
+
+
+# Instance tunggal yang dipakai service penjadwalan
+slot_planner = SlotPlanner()
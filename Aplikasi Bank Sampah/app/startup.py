@@ -0,0 +1,60 @@
+import gc
+import logging
+import time
+from datetime import date, timedelta
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up(app):
+    """
+    Menyiapkan semua yang biasanya baru dikerjakan pada request pertama:
+    mengompilasi seluruh template Jinja (hasilnya juga masuk bytecode
+    cache di disk) dan pencocok URL, membaca database dan indeks arsip
+    sekali agar sudah ada di page cache, serta membangun zone map kolom
+    analitik.
+
+    Pada mode preload gunicorn fungsi ini berjalan di master sebelum fork,
+    sehingga template terkompilasi dan indeks di memori dipakai bersama
+    oleh semua worker (copy-on-write). `gc.freeze()` memindahkan objek
+    yang sudah ada ke generasi permanen agar GC di worker tidak menyentuh
+    (dan menyalin) halaman memori tersebut.
+    """
+    from app.repository import DataRepository
+    from app.archive import archive_store
+    from app.analytics import analytics_store
+
+    started = time.perf_counter()
+    templates = app.jinja_env.list_templates()
+    for name in templates:
+        app.jinja_env.get_template(name)
+
+    app.url_map.update()
+
+    DataRepository()._load_data()
+    archive_store.read_index()
+    today = date.today()
+    analytics_store.summary((today - timedelta(days=29)).isoformat(), today.isoformat())
+
+    gc.collect()
+    gc.freeze()
+    logger.info("Warm-up selesai: %s template dalam %.0f ms.",
+                len(templates), (time.perf_counter() - started) * 1000)
+
+
+def after_fork(app):
+    """
+    Dipanggil di setiap worker gunicorn setelah fork (hook post_fork).
+    Thread tidak ikut tersalin saat fork dan koneksi SQLite tidak boleh
+    dipakai lintas proses, jadi antrean pekerjaan, poller feed, pool
+    hashing, dan penyimpanan pembatas laju dinyalakan ulang per worker.
+    """
+    from app.tasks import job_queue
+    from app.feed import task_feed
+    from app.passwords import password_hasher
+    from app.ratelimit import login_guard
+
+    job_queue.start()
+    task_feed.start()
+    password_hasher.init_app(app)
+    login_guard.init_app(app)
@@ -0,0 +1,191 @@
+import json
+from datetime import datetime, timedelta
+from flask import current_app
+from app.jobs import JobQueue
+from app.passwords import password_hasher
+from app.repository import UserRepository, DataRepository
+from app.sanctions import sanction_index
+
+# Antrean pekerjaan latar belakang, diinisialisasi di create_app()
+job_queue = JobQueue()
+
+user_repo = UserRepository()
+data_repo = DataRepository()
+
+# ====================================================================
+# HANDLER PEKERJAAN LATAR BELAKANG
+# ====================================================================
+
+@job_queue.task('audit_log')
+def audit_log(event, **details):
+    """
+    Menambahkan satu baris JSON ke file log audit.
+    """
+    entry = {"waktu": datetime.now().isoformat(timespec='seconds'), "event": event}
+    entry.update(details)
+    with open(current_app.config['AUDIT_LOG_FILE'], 'a') as f:
+        f.write(json.dumps(entry) + '\n')
+
+@job_queue.task('notify_user')
+def notify_user(user_id, pesan):
+    """
+    Menyimpan notifikasi untuk ditampilkan di dasbor pengguna.
+    """
+    data_repo.add_notification({
+        "user_id": user_id,
+        "pesan": pesan,
+        "tanggal": datetime.now().strftime('%Y-%m-%d %H:%M'),
+    })
+
+@job_queue.task('lift_expired_sanctions')
+def lift_expired_sanctions():
+    """
+    Sweep berkala: mencabut semua shadow ban yang sudah kedaluwarsa dalam
+    satu penulisan. Kedaluwarsa dicek ulang dari record tersimpan (indeks
+    worker ini bisa usang), sehingga ban yang diperpanjang worker lain
+    tetap berlaku. Kewajiban verifikasi foto tetap berlaku sampai
+    dipulihkan oleh admin.
+    """
+    today = datetime.now().strftime('%Y-%m-%d')
+    for user in user_repo.lift_expired_bans(sanction_index.pop_expired(today), today):
+        sanction_index.update_user(user)
+
+@job_queue.task('sync_sanctions')
+def sync_sanctions():
+    """Menyamakan indeks sanksi di memori dengan database (sanksi dari worker lain)."""
+    sanction_index.load(user_repo.get_all_users())
+
+@job_queue.task('rehash_password')
+def rehash_password(user_id, password):
+    """
+    Mengganti password plain text / hash dengan work factor lama
+    menjadi hash sesuai konfigurasi saat ini.
+    """
+    user_repo.patch_users({user_id: {"password": password_hasher.hash(password)}})
+
+@job_queue.task('snapshot_balances')
+def snapshot_balances():
+    """
+    Snapshot saldo berkala: melipat semua tail event ledger ke snapshot
+    per pengguna.
+    """
+    data_repo.snapshot_all_balances()
+
+
+@job_queue.task('roll_waste_prices')
+def roll_waste_prices():
+    """
+    Memajukan harga aktif jenis sampah (nilai_poin_per_kg) ke harga dari
+    riwayat harga yang sudah mulai berlaku hari ini.
+    """
+    from app.pricing import effective_price
+
+    today = datetime.now().strftime('%Y-%m-%d')
+    prices = {}
+    for waste_type in data_repo.get_all_waste_types():
+        if not waste_type.get('riwayat_harga'):
+            continue
+        price = effective_price(waste_type, today)
+        if price != waste_type.get('nilai_poin_per_kg'):
+            prices[waste_type['id']] = price
+    data_repo.patch_waste_prices(prices)
+
+
+@job_queue.task('prune_slot_counts')
+def prune_slot_counts():
+    """Membuang counter kapasitas slot penjemputan yang tanggalnya sudah lewat."""
+    from app.slots import slot_planner
+
+    expired = data_repo.prune_slot_counts(datetime.now().strftime('%Y-%m-%d'))
+    slot_planner.prune(expired)
+
+
+@job_queue.task('sync_slot_counts')
+def sync_slot_counts():
+    """
+    Menyamakan counter kapasitas slot & jumlah pengepul di memori dengan
+    database (booking, pembatalan, & perubahan pengepul dari worker lain).
+    """
+    from app.slots import slot_planner
+
+    slot_planner.load(data_repo.get_slot_counts(), user_repo.get_all_users())
+
+
+@job_queue.task('prune_rate_limits')
+def prune_rate_limits():
+    """Menghapus bucket pembatas laju & lockout login yang sudah kedaluwarsa."""
+    from app.ratelimit import login_guard
+
+    login_guard.prune()
+
+
+@job_queue.task('sync_reward_inventory')
+def sync_reward_inventory():
+    """Menyamakan stok reward di memori dengan database (perubahan dari worker lain)."""
+    from app.inventory import reward_inventory
+
+    reward_inventory.load(data_repo.get_reward_inventory())
+
+
+@job_queue.task('catch_up_analytics')
+def catch_up_analytics():
+    """
+    Mencatat transaksi ledger yang belum masuk kolom analitik (misalnya
+    worker berhenti setelah commit database, sebelum barisnya ditambahkan).
+    """
+    from app.analytics import analytics_store
+
+    analytics_store.catch_up()
+
+
+@job_queue.task('refresh_leaderboard')
+def refresh_leaderboard():
+    """
+    Menghitung ulang leaderboard bulan berjalan dari database, sehingga
+    setoran yang dikonfirmasi di worker lain ikut terhitung.
+    """
+    from app.leaderboard import leaderboard
+
+    bulan = leaderboard.current_period()
+    users = {u['id']: u for u in user_repo.get_all_users()}
+    leaderboard.reload_period(data_repo.get_month_transactions(bulan), users, data_repo.get_all_waste_types(),
+                              bulan)
+
+
+@job_queue.task('sync_master_data')
+def sync_master_data():
+    """
+    Replikasi data master (jenis sampah & reward) dari node pusat ke node
+    cabang. Stok reward tetap milik cabang.
+    """
+    from app.inventory import reward_inventory
+    from app.sharding import shard_router
+
+    master = shard_router.call(shard_router.master, '/master')
+    if data_repo.replace_master_data(master['waste_types'], master['rewards']):
+        reward_inventory.load(data_repo.get_reward_inventory())
+        current_app.logger.info("Data master disalin dari shard %s.", shard_router.master)
+
+
+@job_queue.task('archive_old_records')
+def archive_old_records(hari=None):
+    """Memindahkan pickup selesai & transaksi lama ke arsip bulanan."""
+    hari = hari or current_app.config['ARCHIVE_AFTER_DAYS']
+    cutoff = (datetime.now() - timedelta(days=hari)).strftime('%Y-%m-%d')
+    moved = data_repo.archive_old_records(cutoff)
+    current_app.logger.info("Arsip sebelum %s: %s pickup, %s transaksi", cutoff, moved['pickups'], moved['transactions'])
+    return moved
+
+
+@job_queue.task('backup_database')
+def backup_database(penuh=False):
+    """
+    Backup online database & arsip. Jadwal yang sama berjalan di setiap
+    worker; backup dilewati jika worker lain baru saja membuatnya.
+    """
+    from app.backup import backup_manager
+
+    entry = backup_manager.backup(full=penuh, min_interval=current_app.config['BACKUP_INTERVAL'] / 2)
+    if entry:
+        current_app.logger.info("Backup %s %s (%s byte)", entry['jenis'], entry['id'], entry['ukuran'])
+    return entry
@@ -0,0 +1,144 @@
+import csv
+import io
+import re
+import time
+from app.passwords import password_hasher
+from app.repository import UserRepository
+
+# Kolom CSV impor pengguna; baris pertama wajib berisi header
+KOLOM = ('nama', 'email', 'password', 'role', 'alamat', 'area_tugas')
+KOLOM_WAJIB = ('nama', 'email', 'password')
+ROLES = ('pengguna', 'pengepul', 'admin')
+EMAIL_PATTERN = re.compile(r'^[^@\s,;]+@[^@\s,;]+\.[^@\s,;]+$')
+
+
+def read_user_csv(stream):
+    """
+    Membaca CSV pengguna baris demi baris (tidak dimuat sekaligus ke
+    memori). `stream` boleh file teks atau biner (misal upload Flask).
+    Pemisah ',' atau ';' (ekspor Excel berbahasa Indonesia) dikenali dari
+    header. Menghasilkan (nomor_baris, dict_kolom); header yang tidak
+    lengkap menghasilkan ValueError.
+    """
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    header_line = stream.readline()
+    delimiter = ';' if header_line.count(';') > header_line.count(',') else ','
+    header = [name.strip().lower() for name in next(csv.reader([header_line], delimiter=delimiter), [])]
+    missing = [name for name in KOLOM_WAJIB if name not in header]
+    if missing:
+        raise ValueError(f"Kolom wajib tidak ada di header CSV: {', '.join(missing)}.")
+
+    for line_no, values in enumerate(csv.reader(stream, delimiter=delimiter), start=2):
+        if not any(value.strip() for value in values):
+            continue
+        yield line_no, {name: (value or '').strip() for name, value in zip(header, values) if name in KOLOM}
+
+
+def validate_row(row, known_emails):
+    """
+    Memeriksa satu baris dan mengembalikan (data_pengguna, pesan_error).
+    `known_emails` (huruf kecil) berisi email terdaftar dan email dari
+    baris sebelumnya, sehingga duplikat terdeteksi dalam satu lintasan.
+    """
+    nama, email, password = row.get('nama'), row.get('email', ''), row.get('password')
+    role = (row.get('role') or 'pengguna').lower()
+    if not nama:
+        return None, "Nama wajib diisi."
+    if not EMAIL_PATTERN.match(email):
+        return None, "Format email tidak valid."
+    if email.lower() in known_emails:
+        return None, "Email sudah terdaftar."
+    if not password:
+        return None, "Password wajib diisi."
+    if role not in ROLES:
+        return None, f"Peran '{role}' tidak dikenal."
+    area_tugas = row.get('area_tugas') or None
+    if role == 'pengepul' and not area_tugas:
+        return None, "Pengepul wajib memiliki area_tugas."
+
+    known_emails.add(email.lower())
+    return {
+        "id": None,
+        "nama": nama,
+        "email": email,
+        "password": password,
+        "role": role,
+        "alamat": row.get('alamat') or '',
+        "area_tugas": area_tugas if role == 'pengepul' else None,
+        "is_shadow_banned": False,
+        "needs_extra_verification": False,
+        "ban_until": None
+    }, None
+
+
+class UserImporter:
+    """
+    Impor pengguna massal: baris divalidasi dalam satu lintasan terhadap
+    indeks email, lalu yang valid disimpan per batch (satu penulisan
+    database per batch, bukan per pengguna).
+
+    Password impor di-hash paralel di IMPORT_HASH_WORKERS thread (setiap
+    baris dengan salt sendiri) dengan work factor normal, sehingga akun
+    impor sama kuatnya dengan akun yang mendaftar sendiri.
+    """
+    def __init__(self):
+        self.repo = UserRepository()
+        self.batch_size = 1000
+        self.workers = 1
+
+    def init_app(self, app):
+        self.batch_size = app.config['IMPORT_BATCH_SIZE']
+        self.workers = app.config['IMPORT_HASH_WORKERS']
+
+    def import_rows(self, rows, on_saved=None, method=None, check=None, extra_emails=()):
+        """
+        Mengimpor (nomor_baris, dict_kolom) dari `rows`. `on_saved(users)`
+        dipanggil setelah tiap batch tersimpan (memperbarui indeks di
+        memori). `check(user)` opsional mengembalikan pesan error tambahan
+        (misal area milik shard lain); `extra_emails` adalah email yang
+        terdaftar di tempat lain. Mengembalikan laporan {'diimpor',
+        'ditolak', 'durasi_detik'}; 'ditolak' berisi {'baris', 'email',
+        'alasan'} per baris.
+        """
+        started = time.perf_counter()
+        known_emails = self.repo.get_emails() | set(extra_emails)
+        report = {"diimpor": 0, "ditolak": []}
+        batch = []
+
+        def flush():
+            hashes = password_hasher.hash_many([user['password'] for _, user in batch],
+                                               method=method, workers=self.workers)
+            for (_, user), password_hash in zip(batch, hashes):
+                user['password'] = password_hash
+            saved, duplicates = self.repo.add_users([user for _, user in batch])
+            duplicates = set(duplicates)
+            for line_no, user in batch:
+                if user['email'] in duplicates:
+                    report['ditolak'].append({"baris": line_no, "email": user['email'],
+                                              "alasan": "Email sudah terdaftar."})
+            report['diimpor'] += len(saved)
+            if saved and on_saved:
+                on_saved(saved)
+            batch.clear()
+
+        for line_no, row in rows:
+            user, error = validate_row(row, known_emails)
+            if not error and check:
+                error = check(user)
+            if error:
+                report['ditolak'].append({"baris": line_no, "email": row.get('email', ''), "alasan": error})
+                continue
+            batch.append((line_no, user))
+            if len(batch) >= self.batch_size:
+                flush()
+        if batch:
+            flush()
+
+        report['ditolak'].sort(key=lambda item: item['baris'])
+        report['durasi_detik'] = round(time.perf_counter() - started, 3)
+        return report
+
+
+# Instance tunggal yang dipakai service & perintah CLI
+user_importer = UserImporter()
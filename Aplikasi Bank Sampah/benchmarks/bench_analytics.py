@@ -0,0 +1,93 @@
+"""
+Benchmark analitik admin: mengisi kolom memory-mapped dengan data
+setoran, poin, dan pickup sintetis beberapa tahun (urut waktu, seperti
+baris yang ditambahkan saat konfirmasi), lalu mengukur waktu query
+ringkasan satu tahun (tanpa membaca database).
+
+Cara pakai (dari folder proyek):
+    python benchmarks/bench_analytics.py --items 3000000 --collectors 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.analytics import AnalyticsStore, ColumnTable, TABLES, day_number, day_string  # noqa: E402
+
+
+def fill(store, n_items, n_collectors, n_types, years, seed=42):
+    """Menulis kolom sintetis langsung ke file (setara rebuild besar)."""
+    rng = np.random.default_rng(seed)
+    end_day = day_number('2025-12-31')
+    start_day = end_day - years * 365
+    n_pickups = n_items // 3
+    columns = {
+        'setoran': {
+            'day': rng.integers(start_day, end_day + 1, n_items, dtype=np.int32),
+            'jenis': rng.integers(0, n_types, n_items, dtype=np.int32),
+            'berat': rng.gamma(2.0, 1.5, n_items),
+            'pengepul': rng.integers(-1, n_collectors, n_items, dtype=np.int32),
+        },
+        'poin': {
+            'day': rng.integers(start_day, end_day + 1, n_pickups, dtype=np.int32),
+            'tipe': rng.choice(np.array([0, 0, 0, 1, 2], dtype=np.int8), n_pickups),
+            'poin_fp': rng.integers(-500000, 500000, n_pickups, dtype=np.int64),
+        },
+        'pickup': {
+            'day': rng.integers(start_day, end_day + 1, n_pickups, dtype=np.int32),
+            'pengepul': rng.integers(-1, n_collectors, n_pickups, dtype=np.int32),
+            'status': rng.choice(np.array([1] * 19 + [2], dtype=np.int8), n_pickups),
+        },
+    }
+    # Baris asli ditambahkan saat konfirmasi, jadi kurang lebih urut waktu
+    for values in columns.values():
+        order = np.argsort(values['day'], kind='stable')
+        for column in values:
+            values[column] = values[column][order]
+
+    with store._writing(reset=True) as meta:
+        meta['jenis'] = [f"wt{t}" for t in range(n_types)]
+        meta['pengepul'] = [f"u{c}" for c in range(n_collectors)]
+        for name, values in columns.items():
+            table = store._tables[name]
+            rows = len(values['day'])
+            meta['tables'][name]['capacity'] = table.ensure_capacity(rows)
+            meta['tables'][name]['rows'] = table.write(0, values)
+    return end_day
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=3_000_000, help='jumlah item setoran')
+    parser.add_argument('--collectors', type=int, default=500, help='jumlah pengepul')
+    parser.add_argument('--types', type=int, default=20, help='jumlah jenis sampah')
+    parser.add_argument('--years', type=int, default=5, help='rentang data (tahun)')
+    parser.add_argument('--repeat', type=int, default=3, help='jumlah pengulangan')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = AnalyticsStore()
+        store.directory = directory
+        store._tables = {name: ColumnTable(directory, name, columns) for name, columns in TABLES.items()}
+
+        started = time.perf_counter()
+        end_day = fill(store, args.items, args.collectors, args.types, args.years)
+        print(f"{args.items} item setoran, {args.collectors} pengepul, {args.years} tahun "
+              f"(ditulis dalam {time.perf_counter() - started:.2f} detik)")
+
+        mulai, sampai = day_string(end_day - 364), day_string(end_day)
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = store.summary(mulai, sampai)
+            elapsed = (time.perf_counter() - started) * 1000
+            print(f"ringkasan {mulai}..{sampai}: {elapsed:.1f} ms, {result['total']['kg']:.0f} kg, "
+                  f"{len(result['pengepul'])} pengepul")
+
+
+if __name__ == '__main__':
+    main()
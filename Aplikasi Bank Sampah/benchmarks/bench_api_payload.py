@@ -0,0 +1,68 @@
+"""
+Membandingkan ukuran respons halaman HTML dengan endpoint /api/v1 yang
+menyajikan data yang sama, tanpa kompresi dan dengan gzip/brotli
+(brotli hanya jika paket `brotli` terpasang).
+
+Proyek disalin ke folder sementara agar database asli tidak tersentuh;
+akun contoh (pengguna@gmail.com, pengepul@gmail.com) dipakai untuk login.
+
+Cara pakai (dari folder proyek):
+    python benchmarks/bench_api_payload.py
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (peran, email, password, [(label, url)])
+SCENARIOS = (
+    ('pengguna', 'pengguna@gmail.com', 'pengguna123', (
+        ('dasbor (HTML)', '/dashboard'),
+        ('api saldo', '/api/v1/balance'),
+        ('riwayat (HTML)', '/history'),
+        ('api pickups', '/api/v1/pickups'),
+        ('api pickups ?fields', '/api/v1/pickups?fields=id,tanggal,status'),
+        ('katalog (HTML)', '/rewards'),
+        ('api rewards', '/api/v1/rewards'),
+    )),
+    ('pengepul', 'pengepul@gmail.com', 'pengepul123', (
+        ('dasbor (HTML)', '/dashboard'),
+        ('api tasks', '/api/v1/tasks'),
+        ('api tasks ?fields', '/api/v1/tasks?fields=id,tanggal,waktu,lokasi,status'),
+    )),
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        shutil.copytree(os.path.join(PROJECT, 'app'), os.path.join(directory, 'app'),
+                        ignore=shutil.ignore_patterns('__pycache__'))
+        shutil.copy(os.path.join(PROJECT, 'database.json'), directory)
+        sys.path.insert(0, directory)
+        from app import create_app
+        from app.compression import brotli
+        from app.tasks import job_queue
+
+        app = create_app({'TESTING': True, 'PASSWORD_HASH_WORKERS': 1})
+        encodings = ['gzip'] + (['br'] if brotli is not None else [])
+        print(f"{'peran':<10}{'respons':<24}{'mentah':>9}" + ''.join(f"{e:>9}" for e in encodings) + "  (byte)")
+        for role, email, password, urls in SCENARIOS:
+            client = app.test_client()
+            client.post('/auth/login', data={'email': email, 'password': password})
+            for label, url in urls:
+                sizes = [len(client.get(url).data)]
+                sizes += [len(client.get(url, headers={'Accept-Encoding': e}).data) for e in encodings]
+                print(f"{role:<10}{label:<24}" + ''.join(f"{size:>9}" for size in sizes))
+        # Rehash password contoh berjalan di latar belakang; selesaikan
+        # sebelum folder sementara dihapus
+        job_queue.shutdown(wait=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark hashing password: mengukur jumlah login (verifikasi hash) per
+detik untuk setiap pengaturan work factor, memakai pool yang sama dengan
+aplikasi.
+
+Cara pakai (dari folder proyek):
+    python benchmarks/bench_password_hash.py --workers 4 --clients 16 --seconds 3
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.passwords import PasswordHasher  # noqa: E402
+
+# Pengaturan yang dibandingkan: (metode, nilai cost)
+SETTINGS = [
+    ('pbkdf2', 100000),
+    ('pbkdf2', 300000),
+    ('pbkdf2', 600000),
+    ('scrypt', (16384, 8, 1)),
+    ('scrypt', (32768, 8, 1)),
+]
+
+
+def make_hasher(method, cost, workers):
+    config = {
+        'PASSWORD_HASH_METHOD': method,
+        'PBKDF2_ITERATIONS': cost if method == 'pbkdf2' else 600000,
+        'SCRYPT_COST': cost if method == 'scrypt' else (32768, 8, 1),
+        'PASSWORD_HASH_WORKERS': workers,
+        'PASSWORD_HASH_QUEUE_FACTOR': 1000,
+        'PASSWORD_HASH_QUEUE_TIMEOUT': 60.0,
+    }
+    hasher = PasswordHasher()
+    hasher.init_app(SimpleNamespace(config=config))
+    return hasher
+
+
+def run(method, cost, workers, clients, seconds):
+    hasher = make_hasher(method, cost, workers)
+    stored = hasher.hash('rahasia123')
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        count = 0
+        while time.perf_counter() < deadline:
+            assert hasher.verify(stored, 'rahasia123')
+            count += 1
+        return count
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        total = sum(pool.map(lambda _: client(), range(clients)))
+    elapsed = time.perf_counter() - start
+    return total / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2,
+                        help='ukuran pool hashing (PASSWORD_HASH_WORKERS)')
+    parser.add_argument('--clients', type=int, default=16, help='jumlah login bersamaan')
+    parser.add_argument('--seconds', type=float, default=3.0, help='durasi per pengaturan')
+    args = parser.parse_args()
+
+    print(f"pool={args.workers} worker, {args.clients} klien bersamaan, {args.seconds}s per pengaturan")
+    print(f"{'metode':<10}{'cost':<20}{'login/detik':>12}")
+    for method, cost in SETTINGS:
+        rate = run(method, cost, args.workers, args.clients, args.seconds)
+        print(f"{method:<10}{str(cost):<20}{rate:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark simulasi harga: mengukur waktu simulasi tabel harga baru atas
+jutaan rincian setoran sintetis (kolom NumPy, tanpa membaca database).
+
+Cara pakai (dari folder proyek):
+    python benchmarks/bench_repricing.py --items 5000000 --users 200000 --types 20
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.pricing import LineItems, simulate_line_items  # noqa: E402
+
+
+def make_items(n_items, n_users, n_types, seed=42):
+    rng = np.random.default_rng(seed)
+    start_day = 19000  # sekitar 2022
+    return LineItems(
+        [f"wt{t}" for t in range(n_types)],
+        [f"u{u}" for u in range(n_users)],
+        rng.integers(0, n_types, n_items, dtype=np.int32),
+        rng.integers(0, n_users, n_items, dtype=np.int32),
+        rng.integers(start_day, start_day + 3 * 365, n_items, dtype=np.int32),
+        rng.gamma(2.0, 1.5, n_items),
+    )
+
+
+def make_histories(n_types, seed=7):
+    # Setiap jenis sampah punya beberapa perubahan harga musiman
+    rng = np.random.default_rng(seed)
+    histories = []
+    for _ in range(n_types):
+        history = [{"berlaku_mulai": "", "nilai_poin_per_kg": int(rng.integers(100, 1000))}]
+        for month in ("2022-07-01", "2023-01-01", "2023-07-01", "2024-01-01"):
+            history.append({"berlaku_mulai": month, "nilai_poin_per_kg": int(rng.integers(100, 1000))})
+        histories.append(history)
+    return histories
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=5_000_000, help='jumlah rincian setoran')
+    parser.add_argument('--users', type=int, default=200_000, help='jumlah pengguna')
+    parser.add_argument('--types', type=int, default=20, help='jumlah jenis sampah')
+    parser.add_argument('--repeat', type=int, default=3, help='jumlah pengulangan')
+    args = parser.parse_args()
+
+    items = make_items(args.items, args.users, args.types)
+    histories = make_histories(args.types)
+    table = np.full(args.types, np.nan)
+    table[::2] = 500  # separuh jenis sampah berganti harga
+    since_day = 19000 + 365
+
+    print(f"{args.items} item, {args.users} pengguna, {args.types} jenis sampah")
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        delta_fp, mask = simulate_line_items(items, histories, table, since_day)
+        per_user = np.bincount(items.user_idx, weights=delta_fp, minlength=args.users)
+        per_type = np.bincount(items.type_idx, weights=delta_fp, minlength=args.types)
+        elapsed = time.perf_counter() - started
+        print(f"simulasi: {elapsed:.3f} detik, {int(mask.sum())} item terdampak, "
+              f"total selisih {per_type.sum() / 100:.2f} poin, {np.count_nonzero(per_user)} pengguna")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark cold start: waktu impor modul, create_app(), dan request pertama
+di proses Python baru (seperti worker gunicorn yang baru di-spawn), untuk
+tiga keadaan:
+
+- bytecode cache Jinja kosong (worker pertama setelah deploy),
+- bytecode cache sudah terisi (worker hasil autoscale/recycle),
+- STARTUP_WARMUP=1 (template dikompilasi sebelum request; pada mode
+  preload gunicorn biaya ini dibayar sekali di master, bukan per worker).
+
+Proyek disalin ke folder sementara agar instance/ dan database asli tidak
+tersentuh.
+
+Cara pakai (dari folder proyek):
+    python benchmarks/bench_startup.py --repeat 3
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dijalankan di proses baru; mencetak hasil sebagai JSON
+PROBE = r'''
+import json, sys, time
+started = time.perf_counter()
+import app, app.auth
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+client = application.test_client()
+first = time.perf_counter()
+client.get('/auth/login')
+first_done = time.perf_counter()
+client.get('/auth/register')
+second_done = time.perf_counter()
+print(json.dumps({
+    "impor": (imported - started) * 1000,
+    "create_app": (created - imported) * 1000,
+    "request_1": (first_done - first) * 1000,
+    "request_2": (second_done - first_done) * 1000,
+    "oauth_dimuat": 'flask_dance' in sys.modules or 'requests' in sys.modules,
+}))
+'''
+
+
+def copy_project(target):
+    shutil.copytree(os.path.join(PROJECT, 'app'), os.path.join(target, 'app'),
+                    ignore=shutil.ignore_patterns('__pycache__'))
+    for name in ('run.py', 'database.json'):
+        shutil.copy(os.path.join(PROJECT, name), target)
+
+
+def probe(directory, **env):
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE], cwd=directory, capture_output=True, text=True,
+        env={**os.environ, **env}, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def import_cost(module):
+    """Biaya impor satu modul di proses baru (ms)."""
+    code = f"import time; t = time.perf_counter(); import {module}; print((time.perf_counter() - t) * 1000)"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    return float(result.stdout) if result.returncode == 0 else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=3, help='jumlah pengulangan per keadaan')
+    args = parser.parse_args()
+
+    oauth = import_cost('flask_dance.contrib.google')
+    if oauth is not None:
+        print(f"impor flask_dance.contrib.google (dihindari jika OAuth nonaktif): {oauth:.0f} ms")
+
+    with tempfile.TemporaryDirectory() as directory:
+        copy_project(directory)
+        cache_dir = os.path.join(directory, 'instance', 'jinja_cache')
+        scenarios = (
+            ('cache kosong', {}, True),
+            ('cache terisi', {}, False),
+            ('warm-up', {'STARTUP_WARMUP': '1'}, False),
+        )
+        print(f"{'keadaan':<14}{'impor':>9}{'create_app':>12}{'request 1':>11}{'request 2':>11}  (ms, median)")
+        for label, env, clear_cache in scenarios:
+            runs = []
+            for _ in range(args.repeat):
+                if clear_cache:
+                    shutil.rmtree(cache_dir, ignore_errors=True)
+                runs.append(probe(directory, **env))
+            median = {key: sorted(run[key] for run in runs)[len(runs) // 2]
+                      for key in ('impor', 'create_app', 'request_1', 'request_2')}
+            print(f"{label:<14}{median['impor']:>9.0f}{median['create_app']:>12.0f}"
+                  f"{median['request_1']:>11.1f}{median['request_2']:>11.1f}"
+                  f"{'  (OAuth dimuat)' if runs[0]['oauth_dimuat'] else ''}")
+
+
+if __name__ == '__main__':
+    main()
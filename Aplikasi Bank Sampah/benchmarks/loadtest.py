@@ -0,0 +1,439 @@
+"""
+Load test multi-peran: menjalankan aplikasi asli (dev server Flask atau
+gunicorn) atas salinan proyek di folder sementara, lalu menggerakkan banyak
+pengguna virtual secara bersamaan:
+
+- pengguna (rumah tangga): login, membuka /dashboard, menjadwalkan
+  /schedule_pickup dengan foto, dan menukar reward di /redeem_reward/<id>,
+- pengepul: memuat daftar tugas, mengambil tugas, dan mengirim
+  /confirm_pickup/<id>,
+- admin: membuka /admin/transactions.
+
+Setiap tahap (`--households 50,100,200`) melaporkan throughput, latensi
+p50/p95/p99 per rute, tingkat error, dan penolakan bisnis (slot penuh, poin
+tidak cukup, stok habis). Setelah server dihentikan, database diperiksa:
+konfirmasi/penukaran yang sudah dijawab berhasil tetapi tidak tercatat,
+selisih saldo ledger vs riwayat, saldo minus, dan stok yang terjual lebih
+dari jumlahnya dihitung sebagai pembaruan poin yang hilang. Kapasitas satu
+node adalah tahap terbesar dengan p95 <= --slo-p95 dan error < 1%.
+
+Cara pakai (dari folder proyek):
+    python benchmarks/loadtest.py --households 25,50,100 --duration 60
+    python benchmarks/loadtest.py --server gunicorn --workers 4 --households 100,200
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import re
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+import requests
+from werkzeug.security import generate_password_hash
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = 'loadtest123'
+SALDO_AWAL = 20000
+AREA_TEMPLATE = 'Area Uji {}'
+
+# Aplikasi yang dijalankan server; konfigurasi dari environment LOADTEST_CONFIG
+SERVER_MODULE = '''
+import json, os
+from app import create_app
+app = create_app(json.loads(os.environ['LOADTEST_CONFIG']))
+'''
+
+# Dijalankan di folder salinan setelah server berhenti; mencetak hasil sebagai JSON
+VERIFY = r'''
+import json, sys
+from app.ledger import point_ledger
+from app.repository import DataRepository
+
+expected = json.load(sys.stdin)
+report = point_ledger.reconcile(workers=1)
+with open('database.json') as f:
+    data = json.load(f)
+transactions = data.get('transactions', {}).values()
+setor = {t.get('pickup_id') for t in transactions if t.get('tipe') == 'setor_sampah'}
+tukar = {}
+for t in transactions:
+    if t.get('reward_id'):
+        tukar[t['user_id']] = tukar.get(t['user_id'], 0) + 1
+pickups = data.get('pickups', {})
+repo = DataRepository()
+print(json.dumps({
+    "konfirmasi_hilang": sum(1 for pid in expected['confirmed']
+                             if pid not in setor or pickups.get(pid, {}).get('status') != 'selesai'),
+    "penukaran_hilang": sum(max(n - tukar.get(uid, 0), 0) for uid, n in expected['redeemed'].items()),
+    "penukaran_tak_dijawab": sum(max(n - expected['redeemed'].get(uid, 0), 0) for uid, n in tukar.items()),
+    "selisih_ledger": len(report['drift']),
+    "saldo_minus": sum(1 for uid in expected['households'] if repo.get_balance_fp(uid) < 0),
+    "stok_minus": sum(1 for r in data.get('rewards', {}).values() if (r.get('stok') or 0) < 0),
+    "stok_terjual_lebih": sum(
+        1 for rid, awal in expected['stock'].items()
+        if awal - (data['rewards'][rid].get('stok') or 0)
+        != sum(1 for t in transactions if t.get('reward_id') == rid)
+    ),
+}))
+'''
+
+FLASH = re.compile(r'<div class="px-4 py-3 rounded-md\s+(?:[^"]*?)(bg-\w+)-100[^"]*"\s*role="alert">\s*'
+                   r'<span class="font-medium">(.*?)</span>', re.S)
+ROUTE_ID = re.compile(r'/(confirm_pickup|claim_pickup|redeem_reward)/[^/?]+')
+
+
+class Stats:
+    """Latensi per rute, error, dan penolakan bisnis untuk satu tahap."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = defaultdict(list)
+        self.errors = Counter()
+        self.outcomes = Counter()
+        self.confirmed = []
+        self.redeemed = Counter()
+
+    def request(self, route, elapsed, ok):
+        with self._lock:
+            self.latency[route].append(elapsed)
+            if not ok:
+                self.errors[route] += 1
+
+    def outcome(self, action, result):
+        with self._lock:
+            self.outcomes[(action, result)] += 1
+
+    def ack_confirm(self, pickup_id):
+        with self._lock:
+            self.confirmed.append(pickup_id)
+
+    def ack_redeem(self, user_id):
+        with self._lock:
+            self.redeemed[user_id] += 1
+
+
+class VirtualUser:
+    """Satu sesi browser: mencatat waktu setiap request, termasuk redirect."""
+    def __init__(self, base_url, stats, account, think):
+        self.base_url = base_url
+        self.stats = stats
+        self.account = account
+        self.think = think
+        self.session = requests.Session()
+
+    def call(self, method, path, **kwargs):
+        """Satu request + redirect lanjutan; mengembalikan (html, pesan flash)."""
+        route = f"{method} {ROUTE_ID.sub(lambda m: f'/{m.group(1)}/<id>', path.split('?')[0])}"
+        url = self.base_url + path
+        while True:
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, allow_redirects=False, timeout=30, **kwargs)
+            except requests.RequestException:
+                self.stats.request(route, time.perf_counter() - started, False)
+                return None, None
+            self.stats.request(route, time.perf_counter() - started, response.status_code < 400)
+            if response.status_code >= 400:
+                return None, None
+            if response.is_redirect:
+                url = requests.compat.urljoin(url, response.headers['Location'])
+                method, kwargs = 'GET', {}
+                route = f"GET {ROUTE_ID.sub(lambda m: f'/{m.group(1)}/<id>', requests.utils.urlparse(url).path)}"
+                continue
+            match = FLASH.search(response.text)
+            flash = (match.group(1) == 'bg-green', match.group(2).strip()) if match else None
+            return response.text, flash
+
+    def login(self):
+        _, flash = self.call('POST', '/auth/login',
+                             data={'email': self.account['email'], 'password': PASSWORD})
+        return bool(flash and flash[0])
+
+    def pause(self):
+        if self.think:
+            time.sleep(random.expovariate(1.0 / self.think))
+
+    def run(self, deadline):
+        if not self.login():
+            self.stats.outcome('login', 'gagal')
+            return
+        while time.time() < deadline:
+            self.step()
+            self.pause()
+
+
+class Household(VirtualUser):
+    def __init__(self, *args, photo=b''):
+        super().__init__(*args)
+        self.photo = photo
+
+    def step(self):
+        roll = random.random()
+        if roll < 0.5:
+            self.call('GET', '/dashboard')
+        elif roll < 0.75:
+            self.schedule()
+        else:
+            self.redeem()
+
+    def schedule(self):
+        self.call('GET', '/schedule_pickup')
+        tanggal = (date.today() + timedelta(days=random.randint(1, 30))).isoformat()
+        waktu = f"{random.randint(6, 17):02d}:{random.choice(('00', '30'))}"
+        _, flash = self.call('POST', '/schedule_pickup',
+                             data={'tanggal': tanggal, 'waktu': waktu, 'notes': 'load test'},
+                             files={'waste_photo': ('sampah.jpg', self.photo, 'image/jpeg')})
+        self.stats.outcome('jadwal', 'berhasil' if flash and flash[0] else 'ditolak')
+
+    def redeem(self):
+        html, _ = self.call('GET', '/rewards')
+        reward_ids = re.findall(r'/redeem_reward/([\w-]+)', html or '')
+        if not reward_ids:
+            return
+        _, flash = self.call('POST', f"/redeem_reward/{random.choice(reward_ids)}")
+        if flash and flash[0]:
+            self.stats.ack_redeem(self.account['id'])
+            self.stats.outcome('tukar', 'berhasil')
+        else:
+            self.stats.outcome('tukar', 'ditolak')
+
+
+class Collector(VirtualUser):
+    waste_types = None
+
+    def step(self):
+        html, _ = self.call('GET', '/dashboard')
+        if not html:
+            return
+        open_tasks = set(re.findall(r'/claim_pickup/([\w-]+)', html))
+        tasks = list(dict.fromkeys(re.findall(r'/confirm_pickup/([\w-]+)', html)))
+        if not tasks:
+            return
+        pickup_id = random.choice(tasks)
+        if pickup_id in open_tasks:
+            _, flash = self.call('POST', f"/claim_pickup/{pickup_id}")
+            if not (flash and flash[0]):
+                self.stats.outcome('ambil', 'ditolak')
+                return
+        form, _ = self.call('GET', f"/confirm_pickup/{pickup_id}")
+        if Collector.waste_types is None and form:
+            Collector.waste_types = re.findall(r'name="waste_weight_([\w-]+)"', form)
+        weights = {f"waste_weight_{wt}": f"{random.uniform(0.5, 5):.1f}"
+                   for wt in random.sample(Collector.waste_types or [], min(2, len(Collector.waste_types or [])))}
+        _, flash = self.call('POST', f"/confirm_pickup/{pickup_id}", data=weights)
+        if flash and 'berhasil' in flash[1]:
+            self.stats.ack_confirm(pickup_id)
+            self.stats.outcome('konfirmasi', 'berhasil')
+        else:
+            self.stats.outcome('konfirmasi', 'ditolak')
+
+
+class Admin(VirtualUser):
+    def step(self):
+        self.call('GET', '/admin/transactions')
+
+
+def seed(directory, households, collectors, admins, areas, iterations):
+    """Menambahkan akun uji, saldo awal, dan satu reward berstok terbatas."""
+    path = os.path.join(directory, 'database.json')
+    with open(path) as f:
+        data = json.load(f)
+    password = generate_password_hash(PASSWORD, method=f"pbkdf2:sha256:{iterations}")
+    accounts = {'pengguna': [], 'pengepul': [], 'admin': []}
+    today = date.today().isoformat()
+
+    def add(role, number, **extra):
+        user_id = f"u{uuid.uuid4().hex[:6]}"
+        user = {"id": user_id, "nama": f"Uji {role} {number}", "email": f"{role}{number}@loadtest.local",
+                "password": password, "role": role, "total_poin": 0, **extra}
+        data['users'][user_id] = user
+        accounts[role].append(user)
+        return user
+
+    for i in range(households):
+        user = add('pengguna', i, alamat=f"Jl. Uji No. {i}, {AREA_TEMPLATE.format(i % areas)}")
+        tx_id = f"t{uuid.uuid4().hex[:8]}"
+        data['transactions'][tx_id] = {"id": tx_id, "user_id": user['id'], "tanggal": today,
+                                       "tipe": "setor_sampah", "deskripsi": "Saldo awal load test",
+                                       "jumlah_poin": SALDO_AWAL}
+    for i in range(collectors):
+        add('pengepul', i, alamat='Gudang', area_tugas=AREA_TEMPLATE.format(i % areas))
+    for i in range(admins):
+        add('admin', i, alamat='Kantor')
+
+    reward_id = f"r{uuid.uuid4().hex[:6]}"
+    stock = {reward_id: max(households // 4, 1)}
+    data['rewards'][reward_id] = {"id": reward_id, "nama": "Voucher Uji (stok terbatas)",
+                                  "deskripsi": "Reward untuk load test.", "poin_dibutuhkan": 1000,
+                                  "stok": stock[reward_id], "batas_per_pengguna": None}
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+    return accounts, stock
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(directory, args, port):
+    config = {
+        # Semua pengguna virtual datang dari 127.0.0.1; pembatas laju dilonggarkan
+        "LOGIN_IP_RATE": [10 ** 6, 10 ** 6],
+        "LOGIN_EMAIL_RATE": [10 ** 6, 10 ** 6],
+        "PBKDF2_ITERATIONS": args.pbkdf2_iterations,
+    }
+    if args.server == 'gunicorn' and args.workers > 1:
+        config.update(FEED_BACKEND='sqlite', RATELIMIT_BACKEND='sqlite')
+    with open(os.path.join(directory, 'loadtest_app.py'), 'w') as f:
+        f.write(SERVER_MODULE)
+    env = {**os.environ, 'LOADTEST_CONFIG': json.dumps(config)}
+    if args.server == 'gunicorn':
+        command = ['gunicorn', '-c', 'gunicorn.conf.py', '-b', f"127.0.0.1:{port}",
+                   '-w', str(args.workers), '--threads', str(args.threads), 'loadtest_app:app']
+    else:
+        command = [sys.executable, '-c',
+                   f"from loadtest_app import app; app.run(port={port}, threaded=True)"]
+    process = subprocess.Popen(command, cwd=directory, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        try:
+            if requests.get(base_url + '/auth/login', timeout=1).ok:
+                return process, base_url
+        except requests.RequestException:
+            pass
+        if process.poll() is not None:
+            break
+        time.sleep(0.1)
+    process.kill()
+    raise SystemExit(f"Server {args.server} gagal dijalankan.")
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100), len(values) - 1)] * 1000 if values else 0.0
+
+
+def run_stage(base_url, accounts, households, args, photo):
+    stats = Stats()
+    users = [Household(base_url, stats, account, args.think, photo=photo)
+             for account in accounts['pengguna'][:households]]
+    users += [Collector(base_url, stats, account, args.think) for account in accounts['pengepul']]
+    users += [Admin(base_url, stats, account, args.think * 4) for account in accounts['admin']]
+    random.shuffle(users)
+
+    started = time.time()
+    deadline = started + args.duration
+    threads = []
+    for i, user in enumerate(users):
+        # Pengguna virtual masuk bertahap selama --ramp detik
+        delay = args.ramp * i / max(len(users), 1)
+        thread = threading.Thread(target=lambda u=user, d=delay: (time.sleep(d), u.run(deadline)), daemon=True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    return stats, time.time() - started
+
+
+def report(stats, elapsed, households):
+    total = sum(len(v) for v in stats.latency.values())
+    errors = sum(stats.errors.values())
+    print(f"\n=== {households} pengguna: {total} request dalam {elapsed:.0f} detik "
+          f"({total / elapsed:.1f} req/detik), error {errors / max(total, 1):.2%} ===")
+    print(f"{'rute':<34}{'jumlah':>8}{'req/s':>8}{'p50':>8}{'p95':>8}{'p99':>8}{'error':>8}  (ms)")
+    for route in sorted(stats.latency):
+        values = stats.latency[route]
+        print(f"{route:<34}{len(values):>8}{len(values) / elapsed:>8.1f}{percentile(values, 50):>8.0f}"
+              f"{percentile(values, 95):>8.0f}{percentile(values, 99):>8.0f}"
+              f"{stats.errors[route] / len(values):>8.1%}")
+    outcomes = ', '.join(f"{action} {result}: {count}" for (action, result), count in sorted(stats.outcomes.items()))
+    print(f"hasil aksi: {outcomes or '-'}")
+    all_values = list(itertools.chain.from_iterable(stats.latency.values()))
+    return percentile(all_values, 95), errors / max(total, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=('dev', 'gunicorn'), default='dev', help='server yang diuji')
+    parser.add_argument('--workers', type=int, default=2, help='jumlah worker gunicorn')
+    parser.add_argument('--threads', type=int, default=4, help='thread per worker gunicorn')
+    parser.add_argument('--households', default='25,50,100', help='jumlah pengguna per tahap, dipisah koma')
+    parser.add_argument('--collectors', type=int, default=5, help='jumlah pengepul')
+    parser.add_argument('--admins', type=int, default=1, help='jumlah admin')
+    parser.add_argument('--areas', type=int, default=5, help='jumlah area')
+    parser.add_argument('--duration', type=float, default=30, help='durasi tiap tahap (detik)')
+    parser.add_argument('--ramp', type=float, default=5, help='waktu masuk bertahap pengguna virtual (detik)')
+    parser.add_argument('--think', type=float, default=1.0, help='rata-rata jeda antar aksi (detik)')
+    parser.add_argument('--photo-kb', type=int, default=50, help='ukuran foto sampah (KB)')
+    parser.add_argument('--pbkdf2-iterations', type=int, default=600000, help='work factor hash password akun uji')
+    parser.add_argument('--slo-p95', type=float, default=500, help='batas p95 (ms) untuk menghitung kapasitas')
+    args = parser.parse_args()
+
+    stages = [int(n) for n in args.households.split(',')]
+    if args.server == 'gunicorn' and not shutil.which('gunicorn'):
+        raise SystemExit("gunicorn tidak ditemukan (pip install gunicorn).")
+    photo = os.urandom(args.photo_kb * 1024)
+
+    with tempfile.TemporaryDirectory() as directory:
+        shutil.copytree(PROJECT, directory, dirs_exist_ok=True,
+                        ignore=shutil.ignore_patterns('__pycache__', 'instance', 'benchmarks'))
+        accounts, stock = seed(directory, max(stages), args.collectors, args.admins,
+                               args.areas, args.pbkdf2_iterations)
+        process, base_url = start_server(directory, args, free_port())
+        print(f"Server {args.server} di {base_url}; {args.collectors} pengepul, {args.admins} admin, "
+              f"{args.areas} area")
+
+        capacity = None
+        confirmed, redeemed = [], Counter()
+        try:
+            for households in stages:
+                stats, elapsed = run_stage(base_url, accounts, households, args, photo)
+                p95, error_rate = report(stats, elapsed, households)
+                confirmed += stats.confirmed
+                redeemed.update(stats.redeemed)
+                if p95 <= args.slo_p95 and error_rate < 0.01:
+                    capacity = households
+        finally:
+            stop_server(process)
+
+        expected = {"confirmed": confirmed, "redeemed": redeemed, "stock": stock,
+                    "households": [a['id'] for a in accounts['pengguna']]}
+        result = subprocess.run([sys.executable, '-c', VERIFY], cwd=directory, input=json.dumps(expected),
+                                capture_output=True, text=True, check=True)
+        check = json.loads(result.stdout.strip().splitlines()[-1])
+
+    lost = check['konfirmasi_hilang'] + check['penukaran_hilang']
+    print("\n=== Pemeriksaan data ===")
+    for key, value in check.items():
+        print(f"{key:<24}{value:>8}")
+    print(f"pembaruan poin hilang   {lost:>8}")
+    if capacity:
+        print(f"\nKapasitas: {capacity} pengguna aktif (p95 <= {args.slo_p95:.0f} ms, error < 1%, "
+              f"jeda rata-rata {args.think} detik)")
+    else:
+        print(f"\nTidak ada tahap yang memenuhi p95 <= {args.slo_p95:.0f} ms dan error < 1%.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+"""
+Menjalankan beberapa node shard di satu mesin (dev server Flask atas
+salinan proyek di folder sementara) dan memeriksa bahwa laporan admin yang
+digabung dari semua shard sama dengan laporan satu node tanpa sharding.
+
+Langkah:
+1. database contoh ditambah --pengguna akun rumah tangga (tersebar di
+   --areas area, masing-masing dengan satu transaksi saldo awal),
+2. satu node tanpa sharding dijalankan untuk laporan acuan,
+3. database dibagi dengan `flask split-shards`: shard 'pusat' (data master,
+   admin, area tak terdaftar) dan (--shards - 1) cabang, area dibagi bergiliran;
+   area 'Depok' dari data contoh ikut ke cabang pertama,
+4. semua node dijalankan dengan SHARD_ID/SHARD_ROUTING_FILE/DATABASE_FILE/
+   INSTANCE_PATH masing-masing, lalu admin di node pusat membuka laporan
+   transaksi & analitik (fan-out paralel ke semua node) dan hasilnya
+   dibandingkan dengan acuan. Registrasi & login ke node yang salah juga
+   diperiksa.
+
+Cara pakai (dari folder proyek):
+    python benchmarks/shard_cluster.py --shards 3 --pengguna 2000
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date
+
+import requests
+from werkzeug.security import generate_password_hash
+
+from loadtest import free_port, stop_server
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADMIN = ('admin@gmail.com', 'admin123')
+PASSWORD = 'cluster123'
+TOKEN = uuid.uuid4().hex
+AREA_TEMPLATE = 'Area Uji {}'
+
+# Konfigurasi tiap node dari environment CLUSTER_CONFIG (selain variabel SHARD_*)
+SERVER_MODULE = '''
+import json, os
+from app import create_app
+app = create_app(json.loads(os.environ['CLUSTER_CONFIG']))
+'''
+
+# (label, url) laporan admin yang dibandingkan; yang kedua & ketiga fan-out ke semua shard
+REPORTS = (
+    ('dasbor admin', '/dashboard'),
+    ('ekspor transaksi', '/admin/transactions/export.csv'),
+    ('analitik', '/admin/analytics/data'),
+)
+
+
+def seed(directory, households, areas):
+    path = os.path.join(directory, 'database.json')
+    with open(path) as f:
+        data = json.load(f)
+    password = generate_password_hash(PASSWORD, method='pbkdf2:sha256:1000')
+    today = date.today().isoformat()
+    for i in range(households):
+        user_id = f"c{uuid.uuid4().hex[:10]}"
+        data['users'][user_id] = {
+            "id": user_id, "nama": f"Warga {i}", "email": f"warga{i}@cluster.test", "password": password,
+            "role": "pengguna", "alamat": f"Jl. Uji No. {i}, {AREA_TEMPLATE.format(i % areas)}",
+            "area_tugas": None, "is_shadow_banned": False, "needs_extra_verification": False, "ban_until": None,
+        }
+        tx_id = f"t{uuid.uuid4().hex[:10]}"
+        data['transactions'][tx_id] = {"id": tx_id, "user_id": user_id, "tanggal": today, "tipe": "setor_sampah",
+                                       "deskripsi": "Saldo awal uji shard", "jumlah_poin": 100 + i % 50}
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def routing_table(shards, areas):
+    """Shard 'pusat' + cabang1..N; area uji dibagi bergiliran ke cabang."""
+    table = {"pusat": "pusat", "default": "pusat",
+             "shards": {"pusat": {"url": f"http://127.0.0.1:{free_port()}", "areas": []}}}
+    for n in range(1, shards):
+        table['shards'][f"cabang{n}"] = {"url": f"http://127.0.0.1:{free_port()}", "areas": []}
+    branches = [shard_id for shard_id in table['shards'] if shard_id != 'pusat'] or ['pusat']
+    table['shards'][branches[0]]['areas'].append('Depok')
+    for i in range(areas):
+        table['shards'][branches[i % len(branches)]]['areas'].append(AREA_TEMPLATE.format(i))
+    return table
+
+
+def start_node(directory, port, env=None):
+    config = {"LOGIN_IP_RATE": [10 ** 6, 10 ** 6], "LOGIN_EMAIL_RATE": [10 ** 6, 10 ** 6]}
+    env = {**os.environ, **(env or {}), 'CLUSTER_CONFIG': json.dumps(config)}
+    process = subprocess.Popen([sys.executable, '-c', f"from cluster_app import app; app.run(port={port}, threaded=True)"],
+                               cwd=directory, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(600):
+        try:
+            if requests.get(base_url + '/auth/login', timeout=1).ok:
+                return process, base_url
+        except requests.RequestException:
+            pass
+        if process.poll() is not None:
+            break
+        time.sleep(0.1)
+    process.kill()
+    raise SystemExit(f"Node {env.get('SHARD_ID', 'tunggal')} gagal dijalankan.")
+
+
+def admin_session(base_url):
+    session = requests.Session()
+    session.post(base_url + '/auth/login', data={'email': ADMIN[0], 'password': ADMIN[1]})
+    return session
+
+
+def fetch_reports(base_url, repeat):
+    """Mengambil setiap laporan `repeat` kali; mengembalikan ({label: isi}, {label: [detik]})."""
+    session = admin_session(base_url)
+    contents, timings = {}, {}
+    for label, url in REPORTS:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = session.get(base_url + url)
+            timings.setdefault(label, []).append(time.perf_counter() - started)
+            response.raise_for_status()
+        contents[label] = response.text
+    return contents, timings
+
+
+def normalize(label, content):
+    """Bentuk pembanding yang tidak bergantung urutan & durasi."""
+    if label == 'ekspor transaksi':
+        return sorted(map(tuple, csv.reader(io.StringIO(content))))
+    if label == 'analitik':
+        result = json.loads(content)
+        result.pop('durasi_ms', None)
+        kg = dict(zip((jenis['id'] for jenis in result.pop('jenis')), result.pop('kg_per_jenis')))
+        result['pengepul'] = sorted(result['pengepul'], key=lambda row: row['pengepul_id'] or '')
+        return result, kg
+    return None
+
+
+def check_routing(master_url, table):
+    """Registrasi & login untuk area cabang ditolak di node pusat dan diarahkan ke cabang."""
+    branch = next((shard_id for shard_id in table['shards'] if shard_id != 'pusat'), None)
+    if branch is None:
+        return []
+    problems = []
+    area = table['shards'][branch]['areas'][-1]
+    session = requests.Session()
+    response = session.post(master_url + '/auth/register', data={
+        'nama': 'Warga Baru', 'email': 'baru@cluster.test', 'password': PASSWORD, 'confirm_password': PASSWORD,
+        'alamat': f"Jl. Baru 1, {area}",
+    })
+    if table['shards'][branch]['url'] not in response.text:
+        problems.append(f"registrasi area {area} di pusat tidak diarahkan ke {branch}")
+    response = session.post(master_url + '/auth/login', data={'email': 'warga0@cluster.test', 'password': PASSWORD})
+    if 'Warga 0' in response.text or table['shards'][branch]['url'] not in response.text:
+        problems.append(f"login warga cabang di pusat tidak diarahkan ke {branch}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shards', type=int, default=3, help="jumlah node (termasuk 'pusat')")
+    parser.add_argument('--pengguna', type=int, default=2000, help='jumlah akun rumah tangga tambahan')
+    parser.add_argument('--areas', type=int, default=6, help='jumlah area uji')
+    parser.add_argument('--ulang', type=int, default=5, help='pengulangan tiap laporan untuk pengukuran')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        shutil.copytree(PROJECT, directory, dirs_exist_ok=True,
+                        ignore=shutil.ignore_patterns('__pycache__', 'instance', 'benchmarks'))
+        with open(os.path.join(directory, 'cluster_app.py'), 'w') as f:
+            f.write(SERVER_MODULE)
+        seed(directory, args.pengguna, args.areas)
+
+        process, base_url = start_node(directory, free_port())
+        try:
+            baseline, baseline_timings = fetch_reports(base_url, args.ulang)
+        finally:
+            stop_server(process)
+
+        table = routing_table(args.shards, args.areas)
+        routing = os.path.join(directory, 'shards.json')
+        with open(routing, 'w') as f:
+            json.dump(table, f, indent=2)
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'run', 'split-shards',
+                        '--routing', routing, '--keluar', 'shards'], cwd=directory, check=True)
+
+        processes = []
+        try:
+            for shard_id, shard in table['shards'].items():
+                node_dir = os.path.join(directory, 'shards', shard_id)
+                processes.append(start_node(directory, int(shard['url'].rsplit(':', 1)[1]), {
+                    'SHARD_ID': shard_id, 'SHARD_ROUTING_FILE': routing, 'SHARD_TOKEN': TOKEN,
+                    'DATABASE_FILE': os.path.join(node_dir, 'database.json'),
+                    'INSTANCE_PATH': os.path.join(node_dir, 'instance'),
+                })[0])
+            master_url = table['shards']['pusat']['url']
+            sharded, sharded_timings = fetch_reports(master_url, args.ulang)
+            problems = check_routing(master_url, table)
+        finally:
+            for process in processes:
+                stop_server(process)
+
+    print(f"{args.shards} node, {args.pengguna} pengguna tambahan di {args.areas} area")
+    print(f"{'laporan':<20}{'1 node (ms)':>14}{'shard (ms)':>14}  hasil")
+    for label, _ in REPORTS:
+        expected, actual = normalize(label, baseline[label]), normalize(label, sharded[label])
+        status = 'sama' if expected == actual else 'BERBEDA'
+        if expected != actual:
+            problems.append(f"{label} berbeda dari acuan satu node")
+        print(f"{label:<20}{statistics.median(baseline_timings[label]) * 1000:>14.1f}"
+              f"{statistics.median(sharded_timings[label]) * 1000:>14.1f}  {status if expected is not None else '-'}")
+    for problem in problems:
+        print(f"MASALAH: {problem}")
+    if problems:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+# Konfigurasi gunicorn untuk startup cepat:
+#     gunicorn -c gunicorn.conf.py run:app
+#
+# Aplikasi dimuat sekali di master (preload): template dikompilasi dan data
+# di-warm-up sebelum fork, sehingga worker baru langsung siap dan berbagi
+# halaman memori itu secara copy-on-write. Thread latar belakang (antrean
+# pekerjaan, poller feed, pool hashing) dinyalakan di tiap worker lewat
+# hook post_fork.
+#
+# Worker memakai kelas 'gthread': feed tugas pengepul (/collector/feed) adalah
+# stream SSE tanpa akhir. Dengan worker sync satu dasbor pengepul menahan
+# seluruh worker dan dibunuh setelah `timeout`; dengan gthread setiap stream
+# hanya memakai satu thread, dan `timeout` hanya mengawasi heartbeat proses
+# worker (bukan lama request). Jumlah feed + request yang bisa dilayani
+# bersamaan = workers x threads.
+import multiprocessing
+import os
+
+os.environ.setdefault('STARTUP_PRELOAD', '1')
+
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+preload_app = True
+
+# Dengan beberapa worker, feed tugas & pembatas laju login harus berbagi
+# state lewat SQLite: id event feed per proses membuat replay Last-Event-ID
+# salah, dan bucket per proses melipatgandakan batas laju.
+if workers > 1:
+    os.environ.setdefault('FEED_BACKEND', 'sqlite')
+    os.environ.setdefault('RATELIMIT_BACKEND', 'sqlite')
+
+
+def post_fork(server, worker):
+    from app.startup import after_fork
+
+    after_fork(server.app.wsgi())